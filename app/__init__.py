@@ -4,6 +4,8 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_bcrypt import Bcrypt
 from app.common.custom_utils import create_logger
+from app.common.database import configure_engine, init_sqlite_pragmas, database_report
+from app.common.slow_queries import init_slow_query_log
 
 # Initialize Flask extensions
 db = SQLAlchemy()
@@ -11,23 +13,33 @@ migrate = None
 bcrypt = Bcrypt()
 login_manager = LoginManager()
 
-def create_app():
+def create_app(config=None):
     """
     Create and configure an instance of the Flask application.
 
     This function sets up the Flask app with necessary configurations, initializes
     Flask extensions, and registers blueprints for different modules.
 
+    Args:
+        config (dict, optional): Configuration values overriding the defaults.
+            They are applied before the extensions are initialized, so they
+            also affect the database engine. Without SQLALCHEMY_DATABASE_URI,
+            the DATABASE_URL environment variable or sqlite:///site.db is used.
+
     Returns:
         Flask: The configured Flask application instance.
     """
     app = Flask(__name__)
     app.config["SECRET_KEY"] = "remember_to_add_secret_key"
-    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///site.db"
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+    if config:
+        app.config.update(config)
+    configure_engine(app)
 
     # Initialize Flask extensions with the app
     db.init_app(app)
+    with app.app_context():
+        init_sqlite_pragmas(app, db.engine)
     global migrate
     migrate = Migrate(app, db)
 
@@ -48,22 +60,42 @@ def create_app():
     from app.driver import driver_bp
     app.register_blueprint(driver_bp, url_prefix="/driver")
 
-    from app.common.models import User
+    from app.common.reference import init_reference_cache, get_snapshot
+    init_reference_cache(app)
+
+    from app.common.changes import init_change_tracking
+    init_change_tracking()
+
+    from app.common.asset_status import init_asset_status
+    init_asset_status()
+
+    from app.dispatcher.trailer_index import init_trailer_index
+    init_trailer_index(app)
+
+    from app.common.instrumentation import init_instrumentation
+    with app.app_context():
+        init_instrumentation(app, db.engine)
 
     @login_manager.user_loader
     def load_user(user_id):
         """
         Load a user by their user ID.
 
+        The user comes from the identity cache, so most authenticated
+        requests do not query the user table.
+
         Args:
             user_id (int): The ID of the user to be loaded.
 
         Returns:
-            User: The user object corresponding to the provided user ID.
+            UserSnapshot: A read-only snapshot of the user, or None if the user does not exist.
         """
-        return User.query.get(int(user_id))
+        return get_snapshot("user", int(user_id))
 
     # Create a logger for the application
-    create_logger(app, "logs", "app.log")
+    create_logger(app, app.config.get("LOG_FOLDER", "logs"), "app.log")
+    with app.app_context():
+        init_slow_query_log(app, db.engine)
+        app.logger.info(f"Database settings: {database_report(app, db.engine)}")
 
     return app
@@ -0,0 +1,161 @@
+from sqlalchemy import bindparam, delete, event, insert, inspect, select, update
+from sqlalchemy.orm import Session
+from .models import AssetStatus, TransportationOrder, Trailer, User
+
+DRIVER = "driver"
+TRACTOR_HEAD = "tractor_head"
+TRAILER = "trailer"
+
+# The order columns holding the assets, named like the asset kinds.
+ASSET_KINDS = (DRIVER, TRACTOR_HEAD, TRAILER)
+
+class AssetBusyError(Exception):
+    """
+    Raised when an asset is assigned to an order while another active order holds it.
+
+    Attributes:
+        kind (str): The kind of the asset.
+        asset_id (int): The ID of the asset.
+        order_id (int): The ID of the order it was assigned to.
+    """
+    def __init__(self, kind, asset_id, order_id):
+        super().__init__(f"{kind} {asset_id} is already assigned to another active order than {order_id}")
+        self.kind = kind
+        self.asset_id = asset_id
+        self.order_id = order_id
+
+def _asset_kind(obj):
+    from app.dispatcher.models import TractorHead
+
+    if isinstance(obj, Trailer):
+        return TRAILER
+    if isinstance(obj, TractorHead):
+        return TRACTOR_HEAD
+    if isinstance(obj, User):
+        return DRIVER
+    return None
+
+def register_assets(connection, kind, ids):
+    """
+    Add free assets, e.g. after inserting them with a bulk statement.
+
+    Args:
+        connection (Connection): The connection making the changes.
+        kind (str): The kind of the assets.
+        ids (list): The IDs of the assets.
+    """
+    if ids:
+        connection.execute(insert(AssetStatus), [{"kind": kind, "asset_id": id, "current_order": None} for id in ids])
+
+def release_assets(connection, order_ids):
+    """
+    Free all assets held by orders.
+
+    Args:
+        connection (Connection): The connection making the changes.
+        order_ids (list): The IDs of the orders.
+    """
+    if order_ids:
+        table = AssetStatus.__table__
+        connection.execute(update(table).where(table.c.current_order.in_(order_ids)).values(current_order=None))
+
+def hold_assets(connection, holds):
+    """
+    Assign free assets to orders with a single executemany UPDATE.
+
+    Only assets without a current order are matched, so an asset taken by
+    another order in the meantime is never stolen from it.
+
+    Args:
+        connection (Connection): The connection making the changes.
+        holds (list): (order ID, kind, asset ID) tuples.
+
+    Raises:
+        AssetBusyError: If an asset is held by another order, or unknown. The
+            caller rolls back the transaction.
+    """
+    if not holds:
+        return
+    table = AssetStatus.__table__
+    statement = update(table).where(
+        table.c.kind == bindparam("b_kind"),
+        table.c.asset_id == bindparam("b_asset_id"),
+        table.c.current_order.is_(None)
+    ).values(current_order=bindparam("b_order_id"))
+    result = connection.execute(statement, [
+        {"b_order_id": order_id, "b_kind": kind, "b_asset_id": asset_id} for order_id, kind, asset_id in holds
+    ])
+    if result.rowcount == len(holds):
+        return
+    # Find the asset that was not free.
+    for order_id, kind, asset_id in holds:
+        current = connection.execute(
+            select(table.c.current_order).where(table.c.kind == kind, table.c.asset_id == asset_id)).first()
+        if current is None or current.current_order != order_id:
+            raise AssetBusyError(kind, asset_id, order_id)
+
+@event.listens_for(User.role, "set", active_history=True)
+def _keep_previous_role(target, value, oldvalue, initiator):
+    # Active history loads the old role of expired users, so flushes can tell whether they were drivers.
+    pass
+
+def _order_assets_changed(order):
+    state = inspect(order)
+    return any(state.attrs[name].history.has_changes() for name in (*ASSET_KINDS, "completed"))
+
+def _maintain_asset_status(session, flush_context):
+    releases = []
+    holds = []
+    added = []
+    removed = []
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, TransportationOrder):
+            if obj in session.deleted:
+                releases.append(obj.id)
+            elif obj in session.new or _order_assets_changed(obj):
+                # The order's assets are freed and the current ones held again.
+                if obj not in session.new:
+                    releases.append(obj.id)
+                if not obj.completed:
+                    holds.extend((obj.id, kind, getattr(obj, kind)) for kind in ASSET_KINDS
+                                 if getattr(obj, kind) is not None)
+            continue
+        kind = _asset_kind(obj)
+        if kind is None:
+            continue
+        if kind == DRIVER:
+            role = inspect(obj).attrs.role.history
+            if obj in session.dirty and not role.has_changes():
+                continue
+            was_asset = obj not in session.new and DRIVER in role.non_added()
+            is_asset = obj not in session.deleted and obj.role == DRIVER
+        else:
+            was_asset = obj not in session.new
+            is_asset = obj not in session.deleted
+        if is_asset and not was_asset:
+            added.append((kind, obj.id))
+        elif was_asset and not is_asset:
+            removed.append((kind, obj.id))
+
+    if not (releases or holds or added or removed):
+        return
+    connection = session.connection()
+    table = AssetStatus.__table__
+    for kind, asset_id in removed:
+        connection.execute(delete(table).where(table.c.kind == kind, table.c.asset_id == asset_id))
+    for kind, asset_id in added:
+        register_assets(connection, kind, [asset_id])
+    release_assets(connection, releases)
+    hold_assets(connection, holds)
+
+def init_asset_status():
+    """
+    Keep the asset status table current with the flushed changes.
+
+    Every flush adding or removing drivers, tractor heads and trailers adds
+    or removes their rows, and every flush creating, assigning, finishing or
+    deleting orders frees and holds their assets, in the same transaction.
+    A flush assigning a busy asset fails with AssetBusyError.
+    """
+    if not event.contains(Session, "after_flush", _maintain_asset_status):
+        event.listen(Session, "after_flush", _maintain_asset_status)
@@ -0,0 +1,341 @@
+import click
+import csv
+import io
+import json
+import os
+from itertools import islice
+from flask import current_app, jsonify, request
+from marshmallow import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from app import db
+from .changes import bump_change_counters, tracked_counter
+from .instrumentation import allow_repeated_queries
+from .reference import mark_bulk_changed
+
+DEFAULT_CHUNK_SIZE = 1000
+DEFAULT_MAX_REPORTED_ERRORS = 1000
+
+# File formats by file name extension.
+FORMATS = {
+    ".csv": "csv",
+    ".jsonl": "jsonl",
+    ".ndjson": "jsonl"
+}
+
+class ImportResult:
+    """
+    Outcome of a bulk import.
+
+    Attributes:
+        imported (int): The number of inserted rows.
+        ids (list): The IDs of the inserted rows.
+        failed (int): The number of rejected rows.
+        errors (list): Line numbers and error messages of the first rejected rows.
+        max_errors (int): The maximum number of reported errors.
+    """
+    def __init__(self, max_errors=DEFAULT_MAX_REPORTED_ERRORS):
+        self.imported = 0
+        self.ids = []
+        self.failed = 0
+        self.errors = []
+        self.max_errors = max_errors
+
+    def add_error(self, line, messages):
+        """
+        Record a rejected row.
+
+        Args:
+            line (int): The line number of the row in the file, or its position in a JSON array.
+            messages (dict): The error messages, keyed by field.
+        """
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append({"line": line, "errors": messages})
+
+    def to_dict(self):
+        """
+        Convert the result to a dictionary.
+
+        Returns:
+            dict: The numbers of imported and failed rows, the inserted IDs and the reported errors.
+        """
+        return {"imported": self.imported, "ids": self.ids, "failed": self.failed, "errors": self.errors}
+
+def detect_format(filename):
+    """
+    Guess the format of an import file from its name.
+
+    Args:
+        filename (str): The name of the file.
+
+    Returns:
+        str: "csv" or "jsonl", or None if the extension is unknown.
+    """
+    return FORMATS.get(os.path.splitext(filename or "")[1].lower())
+
+def read_rows(stream, format):
+    """
+    Parse an import file row by row, without reading it into memory.
+
+    Args:
+        stream (file): The file, opened in binary mode. The text is UTF-8,
+            optionally with a byte order mark.
+        format (str): "csv" (with a header row) or "jsonl" (one JSON object per line).
+
+    Yields:
+        tuple: The line number, the row as a dictionary and None, or the line
+            number, None and the error messages of a malformed line.
+    """
+    text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+    if format == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            if None in row:
+                yield reader.line_num, None, {"_row": ["Too many values."]}
+            else:
+                yield reader.line_num, row, None
+        return
+    for line, content in enumerate(text, start=1):
+        if not content.strip():
+            continue
+        try:
+            row = json.loads(content)
+        except json.JSONDecodeError as e:
+            yield line, None, {"_row": [f"Invalid JSON: {e.msg}."]}
+            continue
+        if isinstance(row, dict):
+            yield line, row, None
+        else:
+            yield line, None, {"_row": ["Not a JSON object."]}
+
+def read_json_rows(rows):
+    """
+    Number the rows of a JSON array like the lines of an import file.
+
+    Args:
+        rows (list): The parsed JSON array.
+
+    Yields:
+        tuple: The position of the row (from 1), the row as a dictionary and None,
+            or the position, None and the error messages of an item that is not an object.
+    """
+    for position, row in enumerate(rows, start=1):
+        if isinstance(row, dict):
+            yield position, row, None
+        else:
+            yield position, None, {"_row": ["Not a JSON object."]}
+
+class BulkImporter:
+    """
+    Imports rows of a model from CSV or JSON Lines files.
+
+    Rows are validated with the model's schema a chunk at a time and the
+    valid ones are inserted with a single executemany INSERT, committed per
+    chunk. Invalid rows are reported with their line numbers and skipped.
+
+    Subclasses can reject rows that need database lookups in check_rows()
+    and write records of the inserted rows in inserted().
+
+    Attributes:
+        model (Model): The model of the imported rows.
+        schema (Schema): The schema validating the rows.
+        unique (str): The name of a unique column; rows with values already in
+            the database or earlier in the file are rejected before inserting.
+        prepare (callable): Normalizes a validated row before it is inserted.
+    """
+    def __init__(self, model, schema, unique=None, prepare=None):
+        self.model = model
+        self.schema = schema
+        self.unique = unique
+        self.prepare = prepare
+
+    def run(self, stream, format, **options):
+        """
+        Import a file.
+
+        Args:
+            stream (file): The file, opened in binary mode.
+            format (str): "csv" or "jsonl".
+            **options: Options of import_rows().
+
+        Returns:
+            ImportResult: The numbers of imported and rejected rows and the errors.
+        """
+        return self.import_rows(read_rows(stream, format), **options)
+
+    def import_rows(self, rows, chunk_size=DEFAULT_CHUNK_SIZE, max_errors=DEFAULT_MAX_REPORTED_ERRORS, defaults=None):
+        """
+        Import parsed rows.
+
+        Args:
+            rows (iterable): (line number, row, error messages) tuples, as yielded by read_rows().
+            chunk_size (int): The number of rows validated and committed together.
+            max_errors (int): The maximum number of reported errors.
+            defaults (dict, optional): Values set on every row before validation,
+                overriding the values of the row.
+
+        Returns:
+            ImportResult: The numbers of imported and rejected rows and the errors.
+        """
+        result = ImportResult(max_errors)
+        rows = iter(rows)
+        seen = set()
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return result
+            self._import_chunk(chunk, seen, result, defaults or {})
+            # Rows of a chunk are rejected at different stages.
+            result.errors.sort(key=lambda error: error["line"])
+
+    def check_rows(self, rows, seen, result):
+        """
+        Reject validated rows that conflict with the database or earlier rows.
+
+        Rejects values of the unique column that are already in use, with a
+        single query per chunk.
+
+        Args:
+            rows (list): (line number, row) pairs of a chunk.
+            seen (set): Values of the unique column in earlier rows of the import.
+            result (ImportResult): The result to record rejected rows in.
+
+        Returns:
+            list: The (line number, row) pairs to insert.
+        """
+        if not self.unique:
+            return rows
+        column = getattr(self.model, self.unique)
+        existing = set(db.session.scalars(select(column).where(column.in_([row[self.unique] for _, row in rows]))))
+        unique = []
+        for line, row in rows:
+            value = row[self.unique]
+            if value in existing or value in seen:
+                result.add_error(line, {self.unique: [f"{value} is already in use."]})
+            else:
+                seen.add(value)
+                unique.append((line, row))
+        return unique
+
+    def inserted(self, ids):
+        """
+        Called with the IDs of inserted rows, before they are committed.
+
+        Args:
+            ids (list): The IDs of the rows.
+        """
+
+    def _import_chunk(self, chunk, seen, result, defaults):
+        lines, data = [], []
+        for line, row, errors in chunk:
+            if errors:
+                result.add_error(line, errors)
+            else:
+                lines.append(line)
+                data.append({**row, **defaults})
+        try:
+            loaded, errors = self.schema.load(data, many=True), {}
+        except ValidationError as e:
+            loaded, errors = e.valid_data, e.messages
+
+        valid = []
+        for index, (line, row) in enumerate(zip(lines, loaded)):
+            if index in errors:
+                result.add_error(line, errors[index])
+            else:
+                valid.append((line, self.prepare(row) if self.prepare else row))
+        valid = self.check_rows(valid, seen, result)
+        if not valid:
+            return
+
+        try:
+            self._insert([row for _, row in valid], result)
+        except IntegrityError:
+            # A row clashed with one inserted in the meantime; find it row by row.
+            db.session.rollback()
+            for line, row in valid:
+                try:
+                    self._insert([row], result)
+                except IntegrityError as e:
+                    db.session.rollback()
+                    result.add_error(line, {"_row": [str(e.orig)]})
+
+    def _insert(self, rows, result):
+        ids = db.session.scalars(insert(self.model).returning(self.model.id), rows).all()
+        # Bulk statements bypass the flush events keeping caches and change counters current.
+        mark_bulk_changed(db.session, self.model, ids)
+        counter = tracked_counter(self.model)
+        if counter:
+            bump_change_counters(db.session.connection(), counter)
+        self.inserted(ids)
+        db.session.commit()
+        result.imported += len(ids)
+        result.ids.extend(ids)
+
+def import_upload(importer, defaults=None):
+    """
+    Import the rows sent with the current request.
+
+    The rows are either a JSON array in the request body or a file uploaded
+    in the "file" field. The format of the file is taken from the "format"
+    form field or the file name. The IMPORT_CHUNK_SIZE and
+    IMPORT_MAX_REPORTED_ERRORS settings configure the import.
+
+    Args:
+        importer (BulkImporter): The importer of the rows.
+        defaults (dict, optional): Values set on every row, overriding the values of the row.
+
+    Returns:
+        Response: JSON with the numbers of imported and rejected rows, the inserted IDs and
+            the errors, or an error with status 400 if there are no rows or the format is unknown.
+    """
+    if request.is_json:
+        data = request.get_json(silent=True)
+        if not isinstance(data, list):
+            return jsonify(error="Expected a JSON array of rows."), 400
+        rows = read_json_rows(data)
+    else:
+        upload = request.files.get("file")
+        if upload is None:
+            return jsonify(error="No file uploaded."), 400
+        format = request.form.get("format") or detect_format(upload.filename)
+        if format not in FORMATS.values():
+            return jsonify(error="Unknown file format, expected CSV or JSON Lines."), 400
+        rows = read_rows(upload.stream, format)
+    # Every chunk runs the same statements.
+    allow_repeated_queries()
+    result = importer.import_rows(
+        rows,
+        chunk_size=current_app.config.get("IMPORT_CHUNK_SIZE", DEFAULT_CHUNK_SIZE),
+        max_errors=current_app.config.get("IMPORT_MAX_REPORTED_ERRORS", DEFAULT_MAX_REPORTED_ERRORS),
+        defaults=defaults
+    )
+    return jsonify(result.to_dict())
+
+def register_import_command(cli, name, importer, help):
+    """
+    Add a command importing a file with an importer to a command group.
+
+    Args:
+        cli (AppGroup): The command group, e.g. the CLI of a blueprint.
+        name (str): The name of the command.
+        importer (BulkImporter): The importer of the rows.
+        help (str): The help text of the command.
+    """
+    @cli.command(name, help=help)
+    @click.argument("file", type=click.File("rb"))
+    @click.option("--format", type=click.Choice(sorted(set(FORMATS.values()))),
+                  help="The file format; guessed from the file name by default.")
+    @click.option("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, show_default=True,
+                  help="The number of rows committed together.")
+    def import_file(file, format, chunk_size):
+        format = format or detect_format(file.name)
+        if format is None:
+            raise click.BadParameter("Unknown file format, use --format.", param_hint="FILE")
+        result = importer.run(file, format, chunk_size=chunk_size)
+        for error in result.errors:
+            click.echo(f"Line {error['line']}: {json.dumps(error['errors'])}", err=True)
+        if result.failed > len(result.errors):
+            click.echo(f"... and {result.failed - len(result.errors)} more errors", err=True)
+        click.echo(f"Imported {result.imported} rows, rejected {result.failed}.")
@@ -0,0 +1,306 @@
+import threading
+import time
+from datetime import datetime, timezone
+from flask import Response, request
+from sqlalchemy import event, func, insert, inspect, select, update
+from sqlalchemy.orm import Session
+from app import db
+from .models import ChangeCounter, OrderChange, TransportationOrder, User, Trailer
+
+ORDERS = "transportation_order"
+REFERENCE_DATA = "reference_data"
+
+# Counter bumped by flushes changing each model.
+_tracked_models = {}
+
+# Functions called with the counter versions of committed transactions.
+_commit_listeners = []
+
+# Wakes requests waiting for the order feed when this process commits to it.
+# Changes committed by other processes are picked up by polling.
+_order_feed_condition = threading.Condition()
+
+def track_changes(model, counter):
+    """
+    Bump a change counter whenever a flush inserts, updates or deletes rows of a model.
+
+    Args:
+        model (Model): The tracked model.
+        counter (str): The name of the counter.
+    """
+    _tracked_models[model] = counter
+
+def on_counters_committed(listener):
+    """
+    Call a function whenever a session commits changes of tracked models.
+
+    The listener gets the session and, for every counter the flushes of the
+    transaction bumped, the versions before and after the transaction. As
+    SQLite writes one transaction at a time, a local copy of data at the
+    version before can be brought to the version after by applying only the
+    session's own changes. Counters bumped directly with
+    bump_change_counters() are not reported.
+
+    Args:
+        listener (callable): Called with the session and a dict of (before, after) version pairs.
+    """
+    if listener not in _commit_listeners:
+        _commit_listeners.append(listener)
+
+def tracked_counter(model):
+    """
+    Get the change counter a model is tracked by.
+
+    Args:
+        model (Model): The model.
+
+    Returns:
+        str: The name of the counter, or None if the model is not tracked.
+    """
+    return _tracked_models.get(model)
+
+def init_change_tracking():
+    """
+    Track the orders and the reference data shown along with them.
+    """
+    from app.planner.models import Company
+    from app.dispatcher.models import TractorHead
+
+    track_changes(TransportationOrder, ORDERS)
+    for model in (Company, TractorHead, Trailer, User):
+        track_changes(model, REFERENCE_DATA)
+
+def bump_change_counters(connection, *names):
+    """
+    Bump change counters on a connection, within its current transaction.
+
+    Bulk statements that bypass the ORM must call this themselves. The new
+    version is read back with a SELECT after the UPDATE rather than with
+    RETURNING, which older SQLite versions and MySQL do not support. The
+    UPDATE locks the counter's row, so no other transaction bumps it in between.
+
+    Args:
+        connection (Connection): The connection making the changes.
+        *names (str): The names of the counters.
+
+    Returns:
+        dict: The new versions of the counters, keyed by name.
+    """
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    table = ChangeCounter.__table__
+    versions = {}
+    for name in set(names):
+        result = connection.execute(
+            update(table).where(table.c.name == name).values(version=table.c.version + 1, changed_at=now))
+        if result.rowcount:
+            versions[name] = connection.execute(select(table.c.version).where(table.c.name == name)).scalar_one()
+        else:
+            connection.execute(insert(table).values(name=name, version=1, changed_at=now))
+            versions[name] = 1
+    return versions
+
+def record_bumped_counters(session, versions):
+    """
+    Report counters bumped in the current transaction of a session to on_counters_committed() listeners.
+
+    Flushes report their bumps themselves. Bulk statements that bypass the
+    ORM may report theirs, along with the changes the listeners follow;
+    otherwise the listeners see the counters jump and reload their data.
+
+    Args:
+        session (Session): The session making the changes.
+        versions (dict): The new versions of the counters, as returned by bump_change_counters().
+    """
+    bumped = session.info.setdefault("bumped_counters", {})
+    for name, version in versions.items():
+        # The versions before and after the changes of the transaction.
+        bumped[name] = (bumped.get(name, (version - 1,))[0], version)
+
+def record_order_changes(session, changes):
+    """
+    Append entries to the order feed, within the current transaction of a session.
+
+    Waiting requests of this process are woken when the session commits.
+    Bulk statements that bypass the ORM must call this themselves.
+
+    Args:
+        session (Session): The session making the changes.
+        changes (list): (order ID, action) pairs, in the order they happened.
+    """
+    if not changes:
+        return
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    session.connection().execute(insert(OrderChange), [
+        {"order_id": order_id, "action": action, "changed_at": now} for order_id, action in changes
+    ])
+    session.info["order_feed_written"] = True
+
+def notify_order_feed():
+    """
+    Wake the requests of this process waiting for order changes.
+    """
+    with _order_feed_condition:
+        _order_feed_condition.notify_all()
+
+def _order_action(session, order):
+    if order in session.new:
+        return "created"
+    if order in session.deleted:
+        return "deleted"
+    if not session.is_modified(order, include_collections=False):
+        return None
+    if True in inspect(order).attrs.completed.history.added:
+        return "completed"
+    return "updated"
+
+@event.listens_for(Session, "after_flush")
+def _record_flushed_changes(session, flush_context):
+    counters = set()
+    order_changes = []
+    for obj in session.new | session.dirty | session.deleted:
+        counter = _tracked_models.get(type(obj))
+        if counter is None:
+            continue
+        if isinstance(obj, TransportationOrder):
+            action = _order_action(session, obj)
+            if action:
+                order_changes.append((obj.id, action))
+                counters.add(counter)
+        elif obj in session.new or obj in session.deleted or session.is_modified(obj, include_collections=False):
+            counters.add(counter)
+    if counters:
+        record_bumped_counters(session, bump_change_counters(session.connection(), *counters))
+    if order_changes:
+        record_order_changes(session, sorted(order_changes))
+
+@event.listens_for(Session, "after_commit")
+def _notify_committed_changes(session):
+    if session.info.pop("order_feed_written", False):
+        notify_order_feed()
+    bumped = session.info.pop("bumped_counters", None)
+    if bumped:
+        for listener in _commit_listeners:
+            listener(session, bumped)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_changes(session):
+    session.info.pop("order_feed_written", None)
+    session.info.pop("bumped_counters", None)
+
+def get_change_counters(*names):
+    """
+    Read change counters with a single query.
+
+    Args:
+        *names (str): The names of the counters.
+
+    Returns:
+        tuple: The versions of the counters in the given order (0 for counters
+            never bumped) and the UTC time of the latest change, or None.
+    """
+    table = ChangeCounter.__table__
+    rows = {name: (version, changed_at) for name, version, changed_at in
+            db.session.execute(select(table.c.name, table.c.version, table.c.changed_at).where(table.c.name.in_(names)))}
+    versions = tuple(rows.get(name, (0, None))[0] for name in names)
+    changes = [changed_at for _, changed_at in rows.values() if changed_at is not None]
+    last_modified = max(changes).replace(tzinfo=timezone.utc, microsecond=0) if changes else None
+    return versions, last_modified
+
+def last_order_change():
+    """
+    Get the position of the latest entry of the order feed.
+
+    Returns:
+        int: The position, or 0 if the feed is empty.
+    """
+    return db.session.scalar(select(func.max(OrderChange.seq))) or 0
+
+def get_order_changes(since, limit=None):
+    """
+    Get the entries of the order feed after a position.
+
+    Args:
+        since (int): The position of the last entry the client has seen.
+        limit (int, optional): The maximum number of entries.
+
+    Returns:
+        list: The entries, oldest first.
+    """
+    query = select(OrderChange).where(OrderChange.seq > since).order_by(OrderChange.seq).limit(limit)
+    return db.session.scalars(query).all()
+
+def wait_for_order_changes(since, timeout, poll_interval, limit=None):
+    """
+    Wait until the order feed has entries after a position, or the timeout expires.
+
+    Commits of this process wake the waiting request at once; the feed is
+    read again every poll_interval seconds to notice the commits of other
+    processes. Each read runs in a new transaction, which is ended after an
+    empty read, so a waiting request holds neither a pooled connection nor
+    a database snapshot. The transaction reading the returned entries is
+    left open, so the caller can read the orders from the same snapshot.
+
+    Args:
+        since (int): The position of the last entry the client has seen.
+        timeout (float): The maximum time to wait, in seconds.
+        poll_interval (float): The time between reads of the feed, in seconds.
+        limit (int, optional): The maximum number of entries.
+
+    Returns:
+        list: The entries, oldest first; empty if the timeout expired.
+    """
+    deadline = time.monotonic() + timeout
+    # End the previous read transaction, which would keep seeing the old snapshot.
+    db.session.rollback()
+    while True:
+        changes = get_order_changes(since, limit)
+        if changes:
+            return changes
+        # Give the connection back to the pool while waiting; the next read begins a new transaction.
+        db.session.rollback()
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return changes
+        with _order_feed_condition:
+            _order_feed_condition.wait(min(poll_interval, remaining))
+
+def not_modified(etag, last_modified):
+    """
+    Answer a conditional GET without building the response, if the client is up to date.
+
+    If-None-Match takes precedence over If-Modified-Since, as in HTTP.
+
+    Args:
+        etag (str): The strong ETag of the current representation, unquoted.
+        last_modified (datetime): The time of the last change, or None.
+
+    Returns:
+        Response: A 304 response, or None if the client has to get the full response.
+    """
+    if request.if_none_match:
+        fresh = request.if_none_match.contains(etag)
+    else:
+        fresh = bool(last_modified and request.if_modified_since and request.if_modified_since >= last_modified)
+    if not fresh:
+        return None
+    return cache_validators(Response(status=304), etag, last_modified)
+
+def cache_validators(response, etag, last_modified):
+    """
+    Add the validators a client needs for its next conditional GET.
+
+    Args:
+        response (Response): The response.
+        etag (str): The strong ETag of the representation, unquoted.
+        last_modified (datetime): The time of the last change, or None.
+
+    Returns:
+        Response: The same response.
+    """
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = last_modified
+    # Clients may keep the response but have to revalidate it on every use.
+    response.cache_control.no_cache = True
+    response.cache_control.private = True
+    return response
@@ -0,0 +1,30 @@
+from app import db
+from .models import User, Trailer
+from .reference import get_reference_cache
+
+# The keys below are invalidated together with the trailer and driver
+# snapshots, see init_reference_cache().
+
+def trailer_type_choices():
+    """
+    Get the trailer types of the existing trailers.
+
+    Returns:
+        list: Sorted trailer types.
+    """
+    return get_reference_cache().get("trailer_types", lambda: [
+        trailer_type for (trailer_type,) in db.session.query(Trailer.type).distinct().order_by(Trailer.type)
+    ])
+
+def driver_choices():
+    """
+    Get (id, name) pairs of all drivers.
+
+    Returns:
+        list: (id, "first name last name") tuples sorted by name.
+    """
+    return get_reference_cache().get("drivers", lambda: [
+        (id, f"{first_name} {last_name}") for id, first_name, last_name in
+        db.session.query(User.id, User.first_name, User.last_name)
+        .filter(User.role == "driver").order_by(User.last_name, User.first_name)
+    ])
@@ -0,0 +1,37 @@
+from flask import flash, render_template
+from sqlalchemy.orm.exc import StaleDataError
+
+CONFLICT_MESSAGE = "Someone else has changed this in the meantime. Check the current data and try again."
+
+def check_version(obj, version):
+    """
+    Check that a client edited the current version of a row.
+
+    Forms of versioned rows send back the version they were rendered with.
+    The version check of the UPDATE only covers changes made after the row
+    was loaded by this request, so changes made while the form was open
+    have to be detected here.
+
+    Args:
+        obj (VersionedMixin): The row being changed.
+        version (int): The version submitted by the client; None skips the check.
+
+    Raises:
+        StaleDataError: If the row has been changed since the client loaded it.
+    """
+    if version is not None and version != obj.version:
+        raise StaleDataError(f"{type(obj).__name__} {obj.id} is at version {obj.version}, not {version}")
+
+def render_conflict(template, **context):
+    """
+    Render a form again after a conflicting change, with status 409 Conflict.
+
+    Args:
+        template (str): The template of the form.
+        **context: The template context, with the form filled from the current row.
+
+    Returns:
+        tuple: The rendered template and the status code.
+    """
+    flash(CONFLICT_MESSAGE, "warning")
+    return render_template(template, **context), 409
@@ -1,34 +1,243 @@
+import atexit
+import json
 import os
 import logging
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from flask import has_request_context, request
 from marshmallow import ValidationError
 
-def create_logger(app, log_folder, log_file_name):
+DEFAULT_LOG_MAX_BYTES = 10 * 1024 * 1024
+DEFAULT_LOG_ROTATE_INTERVAL = 24 * 60 * 60
+DEFAULT_LOG_BACKUP_COUNT = 7
+
+# Queue handlers of the log files opened by this process, keyed by file path.
+_log_handlers = {}
+_log_handlers_lock = threading.Lock()
+
+class SizeAndTimeRotatingFileHandler(RotatingFileHandler):
+    """
+    File handler rotating the log when it grows too big or gets too old.
+
+    Rotated files are numbered like with RotatingFileHandler (app.log.1,
+    app.log.2, ...), so a size rotation and a time rotation close to each
+    other cannot overwrite one another.
+
+    Attributes:
+        interval (int): The number of seconds between time rotations, 0 disables them.
+        rollover_at (float): The time of the next time rotation.
+    """
+    def __init__(self, filename, max_bytes, interval, backup_count):
+        super().__init__(filename, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8", delay=True)
+        self.interval = interval
+        self.rollover_at = time.time() + interval if interval else None
+
+    def shouldRollover(self, record):
+        """
+        Check whether the log has to be rotated before writing a record.
+
+        Args:
+            record (LogRecord): The record to be written.
+
+        Returns:
+            bool: True if the log is too old or would grow too big.
+        """
+        if self.rollover_at is not None and time.time() >= self.rollover_at:
+            if os.path.exists(self.baseFilename) and os.path.getsize(self.baseFilename) > 0:
+                return True
+            self.rollover_at = time.time() + self.interval
+        return super().shouldRollover(record)
+
+    def doRollover(self):
+        """
+        Rotate the log and schedule the next time rotation.
+        """
+        super().doRollover()
+        if self.interval:
+            self.rollover_at = time.time() + self.interval
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats log records as single-line JSON objects.
+
+    Fields passed with extra={"data": {...}} are added to the object.
+    """
+    def format(self, record):
+        """
+        Format a record as JSON.
+
+        Args:
+            record (LogRecord): The record to be formatted.
+
+        Returns:
+            str: The JSON object of the record.
+        """
+        data = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "module": record.module,
+            "function": record.funcName,
+            "line": record.lineno,
+            "thread": record.threadName
+        }
+        if getattr(record, "request", None):
+            data["request"] = record.request
+        if getattr(record, "data", None):
+            data.update(record.data)
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exception"] = record.exc_text
+        return json.dumps(data, default=str)
+
+class RequestQueueHandler(QueueHandler):
+    """
+    Queue handler passing records to the background writer.
+
+    The message, the traceback and the current request are rendered on the
+    calling thread, as the objects they refer to may not be used from the
+    writer thread. Nothing is written to disk on the calling thread.
+    """
+    def prepare(self, record):
+        """
+        Prepare a record for the queue.
+
+        Args:
+            record (LogRecord): The record to be queued.
+
+        Returns:
+            LogRecord: A copy of the record with the message and traceback rendered.
+        """
+        message = record.getMessage()
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = logging.Formatter().formatException(record.exc_info)
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = message
+        record.args = None
+        record.exc_info = None
+        record.exc_text = exc_text
+        if has_request_context():
+            record.request = {"method": request.method, "path": request.path, "endpoint": request.endpoint}
+        return record
+
+def get_log_level(app):
+    """
+    Get the log level of the application's environment.
+
+    The LOG_LEVEL setting wins; otherwise tests log warnings, debug mode logs
+    everything and other environments log from INFO up.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Returns:
+        str: The name of the log level.
+    """
+    if app.config.get("LOG_LEVEL"):
+        return app.config["LOG_LEVEL"]
+    if app.testing:
+        return "WARNING"
+    return "DEBUG" if app.debug else "INFO"
+
+def create_logger(app, log_folder, log_file_name, logger=None):
     """
     Create a logger for the Flask application.
 
-    This function creates a logging handler that writes log messages to a file.
-    It sets the log level to DEBUG and defines a log message format.
+    Records are put on a queue and written as JSON lines by a background
+    thread, so logging never blocks a request on disk I/O. The log file is
+    opened once per process: further applications logging to the same file
+    share its handler instead of adding another one. The file is rotated
+    after LOG_MAX_BYTES bytes or LOG_ROTATE_INTERVAL seconds, keeping
+    LOG_BACKUP_COUNT old files; these settings are taken from the first
+    application opening the file. The level of the application logger
+    comes from get_log_level().
 
     Args:
         app (Flask): The Flask application instance.
         log_folder (str): The folder where the log file will be stored.
         log_file_name (str): The name of the log file.
+        logger (Logger, optional): The logger writing to the file, the application logger by default.
+
+    Returns:
+        None
+    """
+    log_path = os.path.abspath(os.path.join(log_folder, log_file_name))
+
+    with _log_handlers_lock:
+        handler = _log_handlers.get(log_path)
+        if handler is None:
+            os.makedirs(log_folder, exist_ok=True)
+            file_handler = SizeAndTimeRotatingFileHandler(
+                log_path,
+                max_bytes=app.config.get("LOG_MAX_BYTES", DEFAULT_LOG_MAX_BYTES),
+                interval=app.config.get("LOG_ROTATE_INTERVAL", DEFAULT_LOG_ROTATE_INTERVAL),
+                backup_count=app.config.get("LOG_BACKUP_COUNT", DEFAULT_LOG_BACKUP_COUNT)
+            )
+            file_handler.setFormatter(JsonFormatter())
+            log_queue = queue.SimpleQueue()
+            handler = RequestQueueHandler(log_queue)
+            handler.listener = QueueListener(log_queue, file_handler)
+            handler.listener.start()
+            _log_handlers[log_path] = handler
+
+    if logger is None:
+        logger = app.logger
+        logger.setLevel(get_log_level(app))
+    if handler not in logger.handlers:
+        logger.addHandler(handler)
+
+def close_logger(app, log_folder, log_file_name, logger=None):
+    """
+    Detach a log file from the application and close it.
+
+    Records still in the queue are written before the file is closed.
+
+    Args:
+        app (Flask): The Flask application instance.
+        log_folder (str): The folder where the log file is stored.
+        log_file_name (str): The name of the log file.
+        logger (Logger, optional): The logger writing to the file, the application logger by default.
 
     Returns:
         None
     """
-    if not os.path.exists(log_folder):
-        os.makedirs(log_folder)
+    with _log_handlers_lock:
+        handler = _log_handlers.pop(os.path.abspath(os.path.join(log_folder, log_file_name)), None)
+    if handler is not None:
+        (logger or app.logger).removeHandler(handler)
+        handler.listener.stop()
+        for file_handler in handler.listener.handlers:
+            file_handler.close()
 
-    log_path = os.path.join(log_folder, log_file_name)
+@atexit.register
+def close_all_loggers():
+    """
+    Detach every log file opened by this process from its loggers and close it.
 
-    handler = logging.FileHandler(log_path)
-    handler.setLevel(logging.DEBUG)
-    formatter = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-    handler.setFormatter(formatter)
+    Records still in the queues are written before the files are closed.
+    Runs at exit; tests also call it so no handler outlives its application.
 
-    app.logger.addHandler(handler)
-    app.logger.setLevel(logging.DEBUG)
+    Returns:
+        None
+    """
+    with _log_handlers_lock:
+        handlers = list(_log_handlers.values())
+        _log_handlers.clear()
+    loggers = [logging.getLogger()] + [logger for logger in logging.Logger.manager.loggerDict.values()
+                                       if isinstance(logger, logging.Logger)]
+    for handler in handlers:
+        for logger in loggers:
+            if handler in logger.handlers:
+                logger.removeHandler(handler)
+        handler.listener.stop()
+        for file_handler in handler.listener.handlers:
+            file_handler.close()
 
 def not_blank(value):
     """
@@ -0,0 +1,187 @@
+import os
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+DEFAULT_DATABASE_URI = "sqlite:///site.db"
+
+# Config keys of the pool settings and the engine options they map to.
+POOL_SETTINGS = {
+    "DATABASE_POOL_SIZE": "pool_size",
+    "DATABASE_MAX_OVERFLOW": "max_overflow",
+    "DATABASE_POOL_RECYCLE": "pool_recycle",
+    "DATABASE_POOL_TIMEOUT": "pool_timeout",
+    "DATABASE_POOL_PRE_PING": "pool_pre_ping"
+}
+
+# Config keys of the SQLite pragmas, their pragma names and defaults. WAL lets
+# readers run while a writer commits, synchronous=NORMAL is safe with WAL and
+# avoids a sync on every commit, and busy_timeout makes a blocked writer wait
+# for the lock instead of failing with "database is locked" right away.
+SQLITE_PRAGMAS = {
+    "SQLITE_JOURNAL_MODE": ("journal_mode", "WAL"),
+    "SQLITE_SYNCHRONOUS": ("synchronous", "NORMAL"),
+    "SQLITE_BUSY_TIMEOUT": ("busy_timeout", 5000),
+    "SQLITE_MMAP_SIZE": ("mmap_size", 256 * 1024 * 1024)
+}
+
+def parse_bool(value):
+    """
+    Parse a boolean setting given as text.
+
+    Args:
+        value (str): "1", "true", "yes" or "on" for True, "0", "false", "no" or "off" for False.
+
+    Returns:
+        bool: The value.
+
+    Raises:
+        ValueError: If the text is not a boolean.
+    """
+    text = value.strip().lower()
+    if text in ("1", "true", "yes", "on"):
+        return True
+    if text in ("0", "false", "no", "off"):
+        return False
+    raise ValueError(f"Not a boolean: {value}")
+
+# Settings that can also be given as environment variables of the same name, with their types.
+ENVIRONMENT_SETTINGS = {
+    "DATABASE_POOL_SIZE": int,
+    "DATABASE_MAX_OVERFLOW": int,
+    "DATABASE_POOL_RECYCLE": int,
+    "DATABASE_POOL_TIMEOUT": float,
+    "DATABASE_POOL_PRE_PING": parse_bool,
+    "SQLITE_JOURNAL_MODE": str,
+    "SQLITE_SYNCHRONOUS": str,
+    "SQLITE_BUSY_TIMEOUT": int,
+    "SQLITE_MMAP_SIZE": int
+}
+
+def load_environment_settings(app):
+    """
+    Read the pool and SQLite settings from environment variables.
+
+    Settings given in the configuration win over the environment. An empty
+    variable configures None, which leaves a pool setting at the engine's
+    default and keeps a pragma from being applied.
+
+    Args:
+        app (Flask): The Flask application instance.
+
+    Raises:
+        ValueError: If a variable does not hold a value of its type.
+    """
+    for key, parse in ENVIRONMENT_SETTINGS.items():
+        if key in app.config or key not in os.environ:
+            continue
+        value = os.environ[key]
+        try:
+            app.config[key] = parse(value) if value.strip() else None
+        except ValueError as e:
+            raise ValueError(f"Invalid {key} environment variable: {value}") from e
+
+def is_sqlite_memory(url):
+    """
+    Check whether a database URL points to an in-memory SQLite database.
+
+    Args:
+        url (URL): The database URL.
+
+    Returns:
+        bool: True for in-memory SQLite databases.
+    """
+    return url.get_backend_name() == "sqlite" and (
+        url.database in (None, "", ":memory:") or url.query.get("mode") == "memory"
+    )
+
+def configure_engine(app):
+    """
+    Set up the database URI and engine options from the configuration.
+
+    The URI is taken from the DATABASE_URL environment variable unless it is
+    configured explicitly, and the pool and SQLite settings are read from the
+    environment with load_environment_settings(). Pool settings are passed
+    to the engine, except for in-memory SQLite databases, which use a single
+    shared connection.
+
+    Must be called before the database extension is initialized.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    app.config.setdefault("SQLALCHEMY_DATABASE_URI", os.environ.get("DATABASE_URL", DEFAULT_DATABASE_URI))
+    load_environment_settings(app)
+    url = make_url(app.config["SQLALCHEMY_DATABASE_URI"])
+    options = dict(app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {}))
+    if not is_sqlite_memory(url):
+        for key, option in POOL_SETTINGS.items():
+            if app.config.get(key) is not None:
+                options.setdefault(option, app.config[key])
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = options
+
+def sqlite_pragmas(app, url):
+    """
+    Get the pragmas to apply to new SQLite connections.
+
+    A pragma configured as None is not applied. The journal mode is left
+    alone for in-memory databases, which cannot use WAL.
+
+    Args:
+        app (Flask): The Flask application instance.
+        url (URL): The database URL.
+
+    Returns:
+        dict: Pragma values keyed by pragma name.
+    """
+    pragmas = {}
+    for key, (pragma, default) in SQLITE_PRAGMAS.items():
+        value = app.config.get(key, default)
+        if value is not None:
+            pragmas[pragma] = value
+    if is_sqlite_memory(url):
+        pragmas.pop("journal_mode", None)
+    return pragmas
+
+def init_sqlite_pragmas(app, engine):
+    """
+    Apply the configured pragmas to every new connection of a SQLite engine.
+
+    Args:
+        app (Flask): The Flask application instance.
+        engine (Engine): The engine of the application.
+    """
+    if engine.dialect.name != "sqlite":
+        return
+    pragmas = sqlite_pragmas(app, engine.url)
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma, value in pragmas.items():
+            cursor.execute(f"PRAGMA {pragma}={value}")
+        cursor.close()
+
+def database_report(app, engine):
+    """
+    Describe the effective settings of an engine.
+
+    The password of the URL is hidden. For SQLite the pragmas are read back
+    from a connection, so the report shows what the database actually uses.
+
+    Args:
+        app (Flask): The Flask application instance.
+        engine (Engine): The engine of the application.
+
+    Returns:
+        dict: The effective settings.
+    """
+    report = {
+        "url": engine.url.render_as_string(hide_password=True),
+        "pool": type(engine.pool).__name__,
+        "engine_options": app.config["SQLALCHEMY_ENGINE_OPTIONS"]
+    }
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as connection:
+            for pragma, _ in SQLITE_PRAGMAS.values():
+                report[pragma] = connection.exec_driver_sql(f"PRAGMA {pragma}").scalar()
+    return report
@@ -0,0 +1,218 @@
+import hmac
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from flask import Response, abort, current_app, g, has_request_context, request
+from sqlalchemy import event
+from app.common.database import parse_bool
+
+METRICS_PREFIX = "freighthub"
+DEFAULT_N_PLUS_ONE_THRESHOLD = 5
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class RequestMetrics:
+    """
+    Aggregated request and SQL metrics of one process, labeled by endpoint and blueprint.
+
+    Attributes:
+        buckets (tuple): Upper bounds of the request duration histogram, in seconds.
+    """
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._requests = defaultdict(int)
+        self._durations = defaultdict(float)
+        self._histograms = defaultdict(lambda: [0] * len(buckets))
+        self._queries = defaultdict(int)
+        self._query_durations = defaultdict(float)
+        self._n_plus_one = defaultdict(int)
+
+    def record(self, labels, duration, queries, query_duration, n_plus_one):
+        """
+        Add one request to the metrics.
+
+        Args:
+            labels (tuple): The (endpoint, blueprint) of the request.
+            duration (float): The time spent on the request, in seconds.
+            queries (int): The number of SQL statements executed.
+            query_duration (float): The time spent executing them, in seconds.
+            n_plus_one (int): The number of statements repeated over the N+1 threshold.
+        """
+        with self._lock:
+            self._requests[labels] += 1
+            self._durations[labels] += duration
+            histogram = self._histograms[labels]
+            for i, bound in enumerate(self.buckets):
+                if duration <= bound:
+                    histogram[i] += 1
+            self._queries[labels] += queries
+            self._query_durations[labels] += query_duration
+            if n_plus_one:
+                self._n_plus_one[labels] += n_plus_one
+
+    def render(self, caches=None):
+        """
+        Render the metrics in the Prometheus text exposition format.
+
+        Args:
+            caches (dict, optional): Stats of caches to include, keyed by cache name.
+
+        Returns:
+            str: The metrics.
+        """
+        with self._lock:
+            requests = dict(self._requests)
+            durations = dict(self._durations)
+            histograms = {labels: list(counts) for labels, counts in self._histograms.items()}
+            queries = dict(self._queries)
+            query_durations = dict(self._query_durations)
+            n_plus_one = dict(self._n_plus_one)
+
+        lines = []
+
+        def metric(name, kind, help_text, samples):
+            lines.append(f"# HELP {METRICS_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {METRICS_PREFIX}_{name} {kind}")
+            for suffix, labels, value in samples:
+                lines.append(f"{METRICS_PREFIX}_{name}{suffix}{{{_format_labels(labels)}}} {value}")
+
+        def by_request(values):
+            return [("", {"endpoint": endpoint, "blueprint": blueprint}, value)
+                    for (endpoint, blueprint), value in sorted(values.items())]
+
+        metric("requests_total", "counter", "Handled requests.", by_request(requests))
+        histogram_samples = []
+        for (endpoint, blueprint), counts in sorted(histograms.items()):
+            labels = {"endpoint": endpoint, "blueprint": blueprint}
+            for bound, count in zip(self.buckets, counts):
+                histogram_samples.append(("_bucket", {**labels, "le": repr(bound)}, count))
+            histogram_samples.append(("_bucket", {**labels, "le": "+Inf"}, requests[(endpoint, blueprint)]))
+            histogram_samples.append(("_sum", labels, durations[(endpoint, blueprint)]))
+            histogram_samples.append(("_count", labels, requests[(endpoint, blueprint)]))
+        metric("request_duration_seconds", "histogram", "Time spent handling requests.", histogram_samples)
+        metric("sql_queries_total", "counter", "SQL statements executed by requests.", by_request(queries))
+        metric("sql_duration_seconds_total", "counter", "Time spent executing SQL statements.",
+               by_request(query_durations))
+        metric("n_plus_one_total", "counter", "Statements repeated over the N+1 threshold in one request.",
+               by_request(n_plus_one))
+        for name, help_text in (("hits", "Cache lookups served from the cache."),
+                                ("misses", "Cache lookups loaded from the database."),
+                                ("evictions", "Cache entries evicted because the cache was full.")):
+            metric(f"cache_{name}_total", "counter", help_text,
+                   [("", {"cache": cache}, stats[name]) for cache, stats in sorted((caches or {}).items())])
+        metric("cache_entries", "gauge", "Entries in the cache.",
+               [("", {"cache": cache}, stats["size"]) for cache, stats in sorted((caches or {}).items())])
+        return "\n".join(lines) + "\n"
+
+def _format_labels(labels):
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+    return ",".join(f'{name}="{escape(value)}"' for name, value in labels.items())
+
+# Start times are keyed by execution context, so a failed statement cannot shift them onto the next one.
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start_times", {})[context] = time.perf_counter()
+
+def _handle_error(exception_context):
+    if exception_context.connection is not None:
+        exception_context.connection.info.get("query_start_times", {}).pop(exception_context.execution_context, None)
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = conn.info.get("query_start_times", {}).pop(context, None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    if has_request_context() and "request_statements" in g:
+        g.request_query_duration += elapsed
+        g.request_statements[statement] += 1
+
+def allow_repeated_queries():
+    """
+    Do not report repeated statements of the current request as N+1 queries.
+
+    For views that poll on purpose, like long-poll endpoints.
+    """
+    g.request_repeats_queries = True
+
+def _start_request():
+    g.request_start = time.perf_counter()
+    g.request_statements = Counter()
+    g.request_query_duration = 0.0
+
+def _finish_request(response):
+    if "request_start" not in g or request.endpoint == "static":
+        return response
+    duration = time.perf_counter() - g.pop("request_start")
+    statements = g.pop("request_statements")
+    query_duration = g.pop("request_query_duration")
+    queries = sum(statements.values())
+    endpoint = request.endpoint or "unknown"
+
+    threshold = current_app.config.get("N_PLUS_ONE_THRESHOLD", DEFAULT_N_PLUS_ONE_THRESHOLD)
+    repeated = {}
+    if not g.pop("request_repeats_queries", False):
+        repeated = {statement: count for statement, count in statements.items() if count > threshold}
+    for statement, count in repeated.items():
+        current_app.logger.warning("Possible N+1 query in %s: executed %s times: %s", endpoint, count, statement)
+
+    current_app.extensions["request_metrics"].record(
+        (endpoint, request.blueprint or ""), duration, queries, query_duration, len(repeated))
+    if current_app.config.get("SERVER_TIMING"):
+        response.headers.add("Server-Timing", f"app;dur={duration * 1000:.1f}")
+        response.headers.add("Server-Timing", f'db;dur={query_duration * 1000:.1f};desc="{queries} queries"')
+    return response
+
+def metrics():
+    """
+    Expose the collected metrics in the Prometheus text format.
+
+    With the METRICS_TOKEN setting, the scraper must send the token as a
+    bearer token.
+
+    Returns:
+        Response: The metrics of this process.
+    """
+    token = current_app.config.get("METRICS_TOKEN")
+    if token:
+        authorization = request.authorization
+        sent = authorization.token if authorization and authorization.type == "bearer" else None
+        if not sent or not hmac.compare_digest(sent.encode(), token.encode()):
+            abort(401)
+    caches = {name: current_app.extensions[name].stats() for name in ("reference_cache", "identity_cache")
+              if name in current_app.extensions}
+    body = current_app.extensions["request_metrics"].render(caches)
+    return Response(body, mimetype="text/plain; version=0.0.4")
+
+def init_instrumentation(app, engine):
+    """
+    Time requests, count their SQL statements and expose the numbers on /metrics.
+
+    Requests are labeled by endpoint and blueprint. A statement executed more
+    than N_PLUS_ONE_THRESHOLD times in one request is logged as a possible
+    N+1 query. With the SERVER_TIMING setting, the request and SQL times are
+    also sent in the Server-Timing header. The /metrics endpoint is only
+    exposed with the METRICS_ENABLED setting, protected by METRICS_TOKEN if it
+    is set. Both are also read from environment variables of the same name,
+    for deployments that do not pass a configuration.
+
+    Args:
+        app (Flask): The Flask application instance.
+        engine (Engine): The engine of the application.
+
+    Raises:
+        ValueError: If the METRICS_ENABLED environment variable is not a boolean.
+    """
+    if "METRICS_ENABLED" not in app.config:
+        app.config["METRICS_ENABLED"] = parse_bool(os.environ.get("METRICS_ENABLED") or "false")
+    if "METRICS_TOKEN" not in app.config:
+        app.config["METRICS_TOKEN"] = os.environ.get("METRICS_TOKEN") or None
+    app.extensions["request_metrics"] = RequestMetrics()
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+        event.listen(engine, "handle_error", _handle_error)
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+    if app.config["METRICS_ENABLED"]:
+        app.add_url_rule("/metrics", "metrics", metrics)
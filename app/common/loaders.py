@@ -0,0 +1,34 @@
+from sqlalchemy.orm import joinedload, selectinload
+from .models import TransportationOrder
+
+def order_list_options():
+    """
+    Loader options for order lists showing the loading and delivery companies.
+
+    Companies repeat across many orders, so they are fetched with one
+    SELECT ... WHERE id IN (...) per relationship instead of one per row.
+
+    Returns:
+        list: Loader options to pass to Query.options().
+    """
+    return [
+        selectinload(TransportationOrder.loading_company),
+        selectinload(TransportationOrder.delivery_company)
+    ]
+
+def order_board_options():
+    """
+    Loader options for the dispatcher's board of active orders.
+
+    Besides the companies, the board shows the assigned driver, tractor head
+    and trailer. Each of them belongs to at most one active order, so they
+    are joined into the main query.
+
+    Returns:
+        list: Loader options to pass to Query.options().
+    """
+    return order_list_options() + [
+        joinedload(TransportationOrder.assigned_driver),
+        joinedload(TransportationOrder.assigned_tractor_head),
+        joinedload(TransportationOrder.assigned_trailer)
+    ]
@@ -1,7 +1,37 @@
-from datetime import date
+from datetime import date, datetime, timezone
 from flask_login import UserMixin
+from sqlalchemy.orm import declared_attr
 from app import db
 
+def utcnow():
+    """
+    Get the current UTC time as stored in the database.
+
+    Returns:
+        datetime: The current UTC time, without time zone.
+    """
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+class VersionedMixin:
+    """
+    Adds optimistic concurrency control and a modification time to a model.
+
+    Every UPDATE and DELETE of a row checks that its version is still the one
+    the row was loaded with, and increments it. If another transaction has
+    changed the row in the meantime, no row matches and SQLAlchemy raises
+    StaleDataError instead of silently overwriting the other change.
+
+    Attributes:
+        version (int): The number of times the row was written, starting at 1.
+        updated_at (datetime): The UTC time of the last write.
+    """
+    version = db.Column(db.Integer, nullable=False, default=1, server_default="1")
+    updated_at = db.Column(db.DateTime, nullable=False, default=utcnow, onupdate=utcnow, index=True)
+
+    @declared_attr.directive
+    def __mapper_args__(cls):
+        return {"version_id_col": cls.version}
+
 class User(db.Model, UserMixin):
     """
     Represents a user in the system.
@@ -34,7 +64,7 @@ class User(db.Model, UserMixin):
         """
         return f"{self.first_name} {self.last_name} - {self.email}, {self.phone_number}"
 
-class TransportationOrder(db.Model):
+class TransportationOrder(VersionedMixin, db.Model):
     """
     Represents a transportation order in the system.
 
@@ -52,6 +82,27 @@ class TransportationOrder(db.Model):
         driver (int): The ID of the assigned driver.
         completed (bool): Whether the order has been completed.
     """
+    __table_args__ = (
+        # Order lists filter on the completion state and sort by a date column.
+        db.Index("ix_transportation_order_completed_creation_date", "completed", "creation_date"),
+        db.Index("ix_transportation_order_completed_planned_delivery_date", "completed", "planned_delivery_date"),
+        # Archive filters narrow the completed orders before sorting by creation date.
+        db.Index("ix_transportation_order_completed_trailer_type", "completed", "trailer_type", "creation_date"),
+        db.Index("ix_transportation_order_completed_loading_place", "completed", "loading_place", "creation_date"),
+        db.Index("ix_transportation_order_completed_delivery_place", "completed", "delivery_place", "creation_date"),
+        db.Index("ix_transportation_order_completed_load_weight", "completed", "load_weight"),
+        # Driver pages filter on the driver and the completion state.
+        db.Index("ix_transportation_order_driver_completed", "driver", "completed", "planned_delivery_date"),
+        # Availability checks only look at assets of active orders. A driver has at most one
+        # active order, which the driver app polls for.
+        db.Index("ix_transportation_order_open_driver", "driver", unique=True,
+                 sqlite_where=db.text("completed = 0"), postgresql_where=db.text("NOT completed")),
+        db.Index("ix_transportation_order_open_tractor_head", "tractor_head",
+                 sqlite_where=db.text("completed = 0"), postgresql_where=db.text("NOT completed")),
+        db.Index("ix_transportation_order_open_trailer", "trailer",
+                 sqlite_where=db.text("completed = 0"), postgresql_where=db.text("NOT completed"))
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     creation_date = db.Column(db.Date, default=date.today, nullable=False)
     created_by = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
@@ -93,7 +144,7 @@ class TransportationOrder(db.Model):
             f"Completed: {self.completed}"
         )
 
-class Trailer(db.Model):
+class Trailer(VersionedMixin, db.Model):
     """
     Represents a trailer in the system.
 
@@ -102,6 +153,10 @@ class Trailer(db.Model):
         type (str): The type of the trailer.
         registration_number (str): The unique registration number of the trailer.
     """
+    __table_args__ = (
+        # Trailer choices filter on the type and look for capacities over the load weight.
+        db.Index("ix_trailer_type_max_load_capacity", "type", "max_load_capacity"),
+    )
     id = db.Column(db.Integer, primary_key=True)
     type = db.Column(db.String(16), nullable=False)
     max_load_capacity = db.Column(db.Integer, nullable=False)
@@ -115,3 +170,89 @@ class Trailer(db.Model):
             str: A string representation of the trailer's details.
         """
         return f"{self.type} {self.max_load_capacity} {self.registration_number}"
+
+class ChangeCounter(db.Model):
+    """
+    Counts committed changes of a group of tables.
+
+    The counters are bumped in the same transaction as the changes, so a
+    client can tell whether data it has seen is still current by reading a
+    single row instead of the data itself.
+
+    Attributes:
+        name (str): The name of the group of tables.
+        version (int): The number of flushes that changed the group.
+        changed_at (datetime): The UTC time of the last change.
+    """
+    name = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    changed_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        """
+        Returns a string representation of the counter.
+
+        Returns:
+            str: The name and version of the counter.
+        """
+        return f"{self.name} {self.version}"
+
+class OrderChange(db.Model):
+    """
+    An entry of the append-only feed of transportation order changes.
+
+    Attributes:
+        seq (int): The position of the entry in the feed.
+        order_id (int): The ID of the changed order. It is not a foreign key,
+            so entries of deleted orders are kept.
+        action (str): One of "created", "updated", "completed" and "deleted".
+        changed_at (datetime): The UTC time of the change.
+    """
+    # Positions are never reused, even after the newest entries are deleted.
+    __table_args__ = {"sqlite_autoincrement": True}
+
+    seq = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(16), nullable=False)
+    changed_at = db.Column(db.DateTime, nullable=False)
+
+    def __repr__(self):
+        """
+        Returns a string representation of the feed entry.
+
+        Returns:
+            str: The position, action and order of the entry.
+        """
+        return f"{self.seq} {self.action} {self.order_id}"
+
+class AssetStatus(db.Model):
+    """
+    The active order a driver, tractor head or trailer is assigned to.
+
+    A projection of the active transportation orders with one row per asset,
+    kept current by app.common.asset_status. The primary key gives an asset
+    one current order at most, and the unique constraint gives an order one
+    asset of each kind at most.
+
+    Attributes:
+        kind (str): "driver", "tractor_head" or "trailer".
+        asset_id (int): The ID of the user, tractor head or trailer.
+        current_order (int): The ID of the active order of the asset, or None if it is free.
+    """
+    __table_args__ = (
+        # Also serves the availability lists, which look for free assets of a kind.
+        db.UniqueConstraint("kind", "current_order", name="uq_asset_status_kind_current_order"),
+    )
+    kind = db.Column(db.String(16), primary_key=True)
+    asset_id = db.Column(db.Integer, primary_key=True)
+    current_order = db.Column(db.Integer, db.ForeignKey("transportation_order.id", ondelete="SET NULL"),
+                              nullable=True)
+
+    def __repr__(self):
+        """
+        Returns a string representation of the asset status.
+
+        Returns:
+            str: The asset and its current order.
+        """
+        return f"{self.kind} {self.asset_id}: {self.current_order}"
@@ -0,0 +1,168 @@
+import base64
+import binascii
+import json
+from datetime import date, datetime
+from flask import abort, current_app, request, url_for
+from sqlalchemy import tuple_
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+class KeysetPage:
+    """
+    Represents one page of a keyset-paginated query.
+
+    Attributes:
+        items (list): The rows of the page.
+        per_page (int): The maximum number of rows on a page.
+        next_cursor (str): Cursor of the following page, None on the last page.
+        prev_cursor (str): Cursor of the preceding page, None on the first page.
+    """
+    def __init__(self, items, per_page, next_cursor=None, prev_cursor=None):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+
+    @property
+    def next_url(self):
+        """
+        Build the URL of the following page.
+
+        Returns:
+            str: The URL of the following page, or None on the last page.
+        """
+        return _page_url(after=self.next_cursor) if self.next_cursor else None
+
+    @property
+    def prev_url(self):
+        """
+        Build the URL of the preceding page.
+
+        Returns:
+            str: The URL of the preceding page, or None on the first page.
+        """
+        return _page_url(before=self.prev_cursor) if self.prev_cursor else None
+
+def _page_url(**cursor):
+    """
+    Build a URL of the current endpoint with the given cursor.
+
+    Query arguments other than the cursors (e.g. filters and page size) are kept.
+
+    Args:
+        **cursor: Either the "after" or the "before" cursor.
+
+    Returns:
+        str: The URL of the requested page.
+    """
+    args = {key: value for key, value in request.args.items() if key not in ("after", "before")}
+    args.update(request.view_args or {})
+    args.update(cursor)
+    return url_for(request.endpoint, **args)
+
+def encode_cursor(values):
+    """
+    Encode key values of a row into an opaque URL-safe cursor.
+
+    Args:
+        values (list): The key values of the row.
+
+    Returns:
+        str: The encoded cursor.
+    """
+    values = [value.isoformat() if isinstance(value, (date, datetime)) else value for value in values]
+    return base64.urlsafe_b64encode(json.dumps(values).encode("utf-8")).decode("ascii")
+
+def decode_cursor(cursor, keys):
+    """
+    Decode a cursor back into key values matching the given columns.
+
+    Args:
+        cursor (str): The encoded cursor.
+        keys (list): The columns the cursor was built from.
+
+    Returns:
+        list: The key values, converted to the columns' Python types.
+
+    Raises:
+        ValueError: If the cursor is malformed.
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except (binascii.Error, UnicodeError, json.JSONDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not isinstance(values, list) or len(values) != len(keys):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    decoded = []
+    for key, value in zip(keys, values):
+        python_type = key.type.python_type
+        if python_type in (date, datetime):
+            if not isinstance(value, str):
+                raise ValueError(f"Invalid cursor: {cursor}")
+            value = python_type.fromisoformat(value)
+        elif not isinstance(value, python_type):
+            raise ValueError(f"Invalid cursor: {cursor}")
+        decoded.append(value)
+    return decoded
+
+def get_page_size():
+    """
+    Get the page size requested with the "per_page" query argument.
+
+    The size is clamped to the MAX_PAGE_SIZE setting of the application.
+
+    Returns:
+        int: The number of rows on a page.
+    """
+    default = current_app.config.get("PAGE_SIZE", DEFAULT_PAGE_SIZE)
+    maximum = current_app.config.get("MAX_PAGE_SIZE", MAX_PAGE_SIZE)
+    per_page = request.args.get("per_page", default, type=int)
+    return max(1, min(per_page, maximum))
+
+def paginate(query, keys):
+    """
+    Paginate a query by the "after"/"before" cursors of the current request.
+
+    Rows are ordered by the given key columns, which must be unique together
+    (usually a date column followed by the primary key). Instead of OFFSET,
+    each page continues from the key values of the previous page's boundary
+    row, so the cost of a page does not depend on its position.
+
+    Args:
+        query (Query): The query to paginate, without ORDER BY.
+        keys (list): The columns the rows are ordered by.
+
+    Returns:
+        KeysetPage: The requested page.
+    """
+    per_page = get_page_size()
+    try:
+        after = request.args.get("after")
+        after = decode_cursor(after, keys) if after else None
+        before = request.args.get("before")
+        before = decode_cursor(before, keys) if before else None
+    except ValueError:
+        abort(400)
+
+    if before:
+        rows = query.filter(tuple_(*keys) < tuple_(*before)).order_by(
+            *[key.desc() for key in keys]).limit(per_page + 1).all()
+        has_prev, has_next = len(rows) > per_page, True
+        rows = rows[:per_page][::-1]
+    else:
+        if after:
+            query = query.filter(tuple_(*keys) > tuple_(*after))
+        rows = query.order_by(*keys).limit(per_page + 1).all()
+        has_prev, has_next = after is not None, len(rows) > per_page
+        rows = rows[:per_page]
+
+    def cursor_of(row):
+        return encode_cursor([getattr(row, key.key) for key in keys])
+
+    return KeysetPage(
+        items=rows,
+        per_page=per_page,
+        next_cursor=cursor_of(rows[-1]) if rows and has_next else None,
+        prev_cursor=cursor_of(rows[0]) if rows and has_prev else None
+    )
@@ -0,0 +1,461 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+from flask import abort, current_app
+from flask_login import UserMixin
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from app import db
+from .models import User, Trailer
+
+DEFAULT_CACHE_SIZE = 10000
+DEFAULT_CACHE_TTL = 300
+DEFAULT_IDENTITY_CACHE_SIZE = 1000
+DEFAULT_IDENTITY_CACHE_TTL = 30
+DEFAULT_INVALIDATION_FILE_MAX_BYTES = 1024 * 1024
+
+# Invalidated key dropping every cached value, e.g. after missed invalidations.
+ALL_KEYS = "*"
+
+# Immutable copies of reference rows. They are safe to share between requests
+# and threads because they are not attached to any session.
+CompanySnapshot = namedtuple("CompanySnapshot", [
+    "id", "company_name", "country", "town", "postal_code", "street", "street_number", "phone_number"
+])
+TractorHeadSnapshot = namedtuple("TractorHeadSnapshot", ["id", "brand", "registration_number"])
+TrailerSnapshot = namedtuple("TrailerSnapshot", ["id", "type", "max_load_capacity", "registration_number"])
+DriverSnapshot = namedtuple("DriverSnapshot", ["id", "username", "first_name", "last_name", "phone_number", "email"])
+
+class UserSnapshot(namedtuple("UserSnapshot", ["id", "username", "first_name", "last_name", "phone_number", "email", "role"]),
+                   UserMixin):
+    """
+    Read-only copy of a logged in user, without the password hash.
+
+    It is what Flask-Login's current_user holds, so authenticated requests do
+    not have to load the user row. Routes changing a user load the row itself.
+    """
+    __slots__ = ()
+
+ReferenceSource = namedtuple("ReferenceSource", ["model", "snapshot", "criteria", "dependents", "cache"])
+
+_sources = {}
+
+class LocalInvalidation:
+    """
+    Invalidation backend of a single process.
+
+    Invalidations only affect the cache of the process making the change.
+    """
+    def publish(self, keys):
+        """
+        Share invalidated keys with other processes.
+
+        Args:
+            keys (list): The invalidated cache keys.
+        """
+
+    def poll(self):
+        """
+        Get keys invalidated by other processes since the last poll.
+
+        Returns:
+            list: The invalidated cache keys.
+        """
+        return []
+
+class FileInvalidation:
+    """
+    Invalidation backend sharing invalidations between processes through a file.
+
+    Every invalidation is appended to the file as one JSON line. Each process
+    remembers how far it has read the file and applies the lines written by
+    the other processes before its next cache lookup.
+
+    Once the file grows over max_bytes, the process publishing replaces it
+    with an empty one. The other processes notice the new file by its inode
+    and, as they cannot know which lines they missed, drop their whole cache.
+
+    Attributes:
+        path (str): The path of the shared file.
+        max_bytes (int): The size after which the file is replaced.
+    """
+    def __init__(self, path, max_bytes=DEFAULT_INVALIDATION_FILE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._token = uuid.uuid4().hex
+        self._lock = threading.Lock()
+        with open(path, "a", encoding="utf-8"):
+            pass
+        stat = os.stat(path)
+        self._inode = stat.st_ino
+        self._offset = stat.st_size
+
+    def _source(self):
+        # The process ID tells apart workers forked after the backend was created.
+        return f"{os.getpid()}:{self._token}"
+
+    def publish(self, keys):
+        """
+        Share invalidated keys with other processes.
+
+        Args:
+            keys (list): The invalidated cache keys.
+        """
+        line = json.dumps({"source": self._source(), "keys": sorted(set(keys))}) + "\n"
+        with open(self.path, "a", encoding="utf-8") as file:
+            file.write(line)
+            size = file.tell()
+        if size > self.max_bytes:
+            self._rotate()
+
+    def _rotate(self):
+        # Replacing the file is atomic, so readers see either the old file or the new one.
+        temporary_path = f"{self.path}.{self._token}.tmp"
+        with open(temporary_path, "w", encoding="utf-8"):
+            pass
+        os.replace(temporary_path, self.path)
+
+    def poll(self):
+        """
+        Get keys invalidated by other processes since the last poll.
+
+        Returns:
+            list: The invalidated cache keys.
+        """
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return []
+        keys = []
+        with self._lock:
+            if stat.st_ino != self._inode or stat.st_size < self._offset:
+                # The file was replaced or truncated; lines of the old one may have been missed.
+                self._inode = stat.st_ino
+                self._offset = 0
+                keys.append(ALL_KEYS)
+            elif stat.st_size == self._offset:
+                return []
+            with open(self.path, "rb") as file:
+                file.seek(self._offset)
+                data = file.read()
+            # A line may still be in the middle of being written.
+            end = data.rfind(b"\n") + 1
+            self._offset += end
+        source = self._source()
+        for line in data[:end].splitlines():
+            record = json.loads(line)
+            if record["source"] != source:
+                keys.extend(record["keys"])
+        return keys
+
+class ReferenceCache:
+    """
+    Process-wide cache of rarely changing reference data.
+
+    Entries expire after a TTL and the least recently used ones are evicted
+    when the cache is full. Every invalidation bumps a generation number, so
+    values loaded while the data was being changed are returned but not stored.
+    Lookups may also pass the version of the reference data change counter
+    they read: when it moved since the last such lookup, the whole cache is
+    dropped, so a change committed by another process is never served under
+    a newer version.
+
+    Attributes:
+        max_size (int): The maximum number of entries.
+        ttl (float): The number of seconds an entry is kept.
+        backend: The backend sharing invalidations with other processes.
+        hits (int): The number of lookups served from the cache.
+        misses (int): The number of lookups that had to be loaded.
+        evictions (int): The number of entries evicted because the cache was full.
+    """
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL, backend=None, clock=time.monotonic):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.backend = backend or LocalInvalidation()
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, loader):
+        """
+        Get a cached value, loading it on a miss.
+
+        Args:
+            key (str): The cache key.
+            loader (callable): Function loading the value from the database.
+
+        Returns:
+            The cached or freshly loaded value.
+        """
+        return self.get_many([key], lambda keys: {key: loader()})[key]
+
+    def get_many(self, keys, loader, version=None):
+        """
+        Get cached values of several keys, loading all missing ones with one call.
+
+        Args:
+            keys (list): The cache keys.
+            loader (callable): Function taking the missing keys and returning
+                a dict of their values. Keys without a value are not cached.
+            version (int, optional): The version of the reference data change
+                counter the caller read; the cache is dropped if it is newer
+                than the one of the previous lookup passing a version.
+
+        Returns:
+            dict: The values found, keyed by cache key.
+        """
+        self._drop(self.backend.poll())
+        now = self._clock()
+        values = {}
+        missing = []
+        with self._lock:
+            if version is not None and (self._version is None or version > self._version):
+                self._entries.clear()
+                self._generation += 1
+                self._version = version
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] > now:
+                    self._entries.move_to_end(key)
+                    values[key] = entry[0]
+                else:
+                    self._entries.pop(key, None)
+                    missing.append(key)
+            self.hits += len(values)
+            self.misses += len(missing)
+            generation = self._generation
+        if missing:
+            loaded = loader(missing)
+            with self._lock:
+                if generation == self._generation:
+                    expires_at = self._clock() + self.ttl
+                    for key, value in loaded.items():
+                        self._entries[key] = (value, expires_at)
+                        self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_size:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+            values.update(loaded)
+        return values
+
+    def invalidate(self, *keys):
+        """
+        Drop cached values in this process and tell the other processes to drop them.
+
+        Args:
+            *keys (str): The keys to drop; "<namespace>:*" drops a whole namespace.
+        """
+        if keys:
+            self._drop(keys)
+            self.backend.publish(keys)
+
+    def _drop(self, keys):
+        if not keys:
+            return
+        with self._lock:
+            for key in keys:
+                if key == ALL_KEYS:
+                    self._entries.clear()
+                elif key.endswith(":" + ALL_KEYS):
+                    prefix = key[:-len(ALL_KEYS)]
+                    for cached_key in [cached_key for cached_key in self._entries if cached_key.startswith(prefix)]:
+                        del self._entries[cached_key]
+                else:
+                    self._entries.pop(key, None)
+            self._generation += 1
+
+    def stats(self):
+        """
+        Get the counters of the cache.
+
+        Returns:
+            dict: The hits, misses, evictions, current size and maximum size.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._entries),
+                "max_size": self.max_size
+            }
+
+def register_reference_source(namespace, model, snapshot, criteria=None, dependents=(), cache="reference_cache"):
+    """
+    Cache snapshots of a model's rows under "<namespace>:<id>" keys.
+
+    Inserting, updating or deleting a row invalidates its snapshot and the
+    dependent keys once the change is committed.
+
+    Args:
+        namespace (str): The prefix of the cache keys.
+        model (Model): The model whose rows are cached.
+        snapshot (type): The namedtuple type of the snapshots; its fields are model columns.
+        criteria (ColumnElement, optional): Condition rows must meet to be cached.
+        dependents (tuple): Keys of values derived from the model's rows, e.g. form choices.
+        cache (str): The name of the application extension holding the snapshots.
+    """
+    if namespace in _sources:
+        return
+    _sources[namespace] = ReferenceSource(model, snapshot, criteria, dependents, cache)
+
+    def changed(mapper, connection, target):
+        mark_changed(object_session(target), f"{namespace}:{target.id}", *dependents, cache=cache)
+
+    for name in ("after_insert", "after_update", "after_delete"):
+        event.listen(model, name, changed)
+
+def init_reference_cache(app):
+    """
+    Create the reference and identity caches of an application.
+
+    The reference cache is configured with the REFERENCE_CACHE_SIZE and
+    REFERENCE_CACHE_TTL settings. The identity cache holds the snapshots of
+    logged in users for IDENTITY_CACHE_TTL seconds, so changes made outside
+    of the application reach them quickly; IDENTITY_CACHE_SIZE bounds it.
+    Without the REFERENCE_CACHE_INVALIDATION_FILE setting, invalidations of
+    both caches are not shared with other processes. The file is replaced
+    once it grows over REFERENCE_CACHE_INVALIDATION_MAX_BYTES.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    from app.planner.models import Company
+    from app.dispatcher.models import TractorHead
+
+    register_reference_source("company", Company, CompanySnapshot)
+    register_reference_source("tractor_head", TractorHead, TractorHeadSnapshot)
+    register_reference_source("trailer", Trailer, TrailerSnapshot, dependents=("trailer_types",))
+    register_reference_source("driver", User, DriverSnapshot, criteria=User.role == "driver", dependents=("drivers",))
+    register_reference_source("user", User, UserSnapshot, cache="identity_cache")
+
+    invalidation_file = app.config.get("REFERENCE_CACHE_INVALIDATION_FILE")
+    max_bytes = app.config.get("REFERENCE_CACHE_INVALIDATION_MAX_BYTES", DEFAULT_INVALIDATION_FILE_MAX_BYTES)
+    app.extensions["reference_cache"] = ReferenceCache(
+        max_size=app.config.get("REFERENCE_CACHE_SIZE", DEFAULT_CACHE_SIZE),
+        ttl=app.config.get("REFERENCE_CACHE_TTL", DEFAULT_CACHE_TTL),
+        backend=FileInvalidation(invalidation_file, max_bytes) if invalidation_file else None
+    )
+    app.extensions["identity_cache"] = ReferenceCache(
+        max_size=app.config.get("IDENTITY_CACHE_SIZE", DEFAULT_IDENTITY_CACHE_SIZE),
+        ttl=app.config.get("IDENTITY_CACHE_TTL", DEFAULT_IDENTITY_CACHE_TTL),
+        backend=FileInvalidation(invalidation_file, max_bytes) if invalidation_file else None
+    )
+
+def get_reference_cache():
+    """
+    Get the reference cache of the current application.
+
+    Returns:
+        ReferenceCache: The cache.
+    """
+    return current_app.extensions["reference_cache"]
+
+def get_snapshots(namespace, ids, version=None):
+    """
+    Get snapshots of rows by ID, loading only those not cached yet with a single query.
+
+    Args:
+        namespace (str): The namespace the model was registered with.
+        ids (list): The IDs of the rows.
+        version (int, optional): The version of the reference data change counter
+            the caller read, e.g. for an ETag; cached snapshots older than it are
+            not returned.
+
+    Returns:
+        dict: Snapshots of the existing rows keyed by their IDs.
+    """
+    source = _sources[namespace]
+
+    def load(keys):
+        query = db.session.query(*[getattr(source.model, field) for field in source.snapshot._fields]).filter(
+            source.model.id.in_([int(key.rsplit(":", 1)[1]) for key in keys]))
+        if source.criteria is not None:
+            query = query.filter(source.criteria)
+        return {f"{namespace}:{row.id}": source.snapshot(*row) for row in query}
+
+    cache = current_app.extensions[source.cache]
+    snapshots = cache.get_many([f"{namespace}:{id}" for id in ids], load, version)
+    return {snapshot.id: snapshot for snapshot in snapshots.values()}
+
+def get_snapshot(namespace, id):
+    """
+    Get the snapshot of a row by ID.
+
+    Args:
+        namespace (str): The namespace the model was registered with.
+        id (int): The ID of the row.
+
+    Returns:
+        namedtuple: The snapshot, or None if the row does not exist.
+    """
+    return get_snapshots(namespace, [id]).get(id)
+
+def get_snapshot_or_404(namespace, id):
+    """
+    Get the snapshot of a row by ID or abort with 404 if it does not exist.
+
+    Args:
+        namespace (str): The namespace the model was registered with.
+        id (int): The ID of the row.
+
+    Returns:
+        namedtuple: The snapshot.
+    """
+    snapshot = get_snapshot(namespace, id)
+    if snapshot is None:
+        abort(404)
+    return snapshot
+
+def mark_changed(session, *keys, cache="reference_cache"):
+    """
+    Remember cache keys to invalidate once the session commits.
+
+    Invalidating on commit instead of on flush keeps other requests from
+    caching the old rows again before the change is visible to them.
+
+    Args:
+        session (Session): The session flushing the change.
+        *keys (str): The cache keys affected by the change.
+        cache (str): The name of the application extension holding the keys.
+    """
+    if session is not None:
+        session.info.setdefault("changed_references", {}).setdefault(cache, set()).update(keys)
+
+def mark_bulk_changed(session, model, ids):
+    """
+    Remember the cache keys of rows written by a bulk statement.
+
+    Bulk statements do not fire the mapper events the reference sources
+    listen to, so their callers report the written rows here. As they may
+    write many rows, the whole namespace of the model is invalidated with a
+    single key instead of a key per row.
+
+    Args:
+        session (Session): The session executing the statement.
+        model (Model): The model of the rows.
+        ids (list): The IDs of the inserted, updated or deleted rows.
+    """
+    if not ids:
+        return
+    for namespace, source in _sources.items():
+        if source.model is model:
+            mark_changed(session, f"{namespace}:{ALL_KEYS}", *source.dependents, cache=source.cache)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed_references(session):
+    changed = session.info.pop("changed_references", None)
+    for cache, keys in (changed or {}).items():
+        current_app.extensions[cache].invalidate(*keys)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changed_references(session):
+    session.info.pop("changed_references", None)
@@ -0,0 +1,91 @@
+import logging
+import time
+from flask import has_request_context, request
+from sqlalchemy import event
+from .custom_utils import create_logger
+
+DEFAULT_SLOW_QUERY_THRESHOLD = 0.25
+SLOW_QUERY_LOG = "slow_queries.log"
+MAX_PARAMETERS_LENGTH = 1000
+
+# Statements that can be explained without being executed.
+EXPLAINABLE = ("SELECT", "WITH", "UPDATE", "DELETE", "INSERT")
+
+slow_query_logger = logging.getLogger("app.slow_queries")
+slow_query_logger.setLevel(logging.INFO)
+# Slow queries only go to their own file, not to the application log.
+slow_query_logger.propagate = False
+
+def explain(connection, statement, parameters):
+    """
+    Get the query plan of a statement.
+
+    The plan is read through a separate DBAPI cursor, so the statement is not
+    executed again and no SQLAlchemy events are fired.
+
+    Args:
+        connection (Connection): The connection that executed the statement.
+        statement (str): The SQL statement.
+        parameters: The parameters of the statement.
+
+    Returns:
+        list: The rows of EXPLAIN QUERY PLAN on SQLite or EXPLAIN elsewhere,
+            or None if the statement cannot be explained.
+    """
+    if not statement.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    prefix = "EXPLAIN QUERY PLAN " if connection.dialect.name == "sqlite" else "EXPLAIN "
+    cursor = connection.connection.cursor()
+    try:
+        cursor.execute(prefix + statement, parameters)
+        return [" | ".join(str(column) for column in row) for row in cursor.fetchall()]
+    except Exception as e:
+        return [f"EXPLAIN failed: {e}"]
+    finally:
+        cursor.close()
+
+def init_slow_query_log(app, engine):
+    """
+    Log statements slower than SLOW_QUERY_THRESHOLD seconds to their own file.
+
+    Each record holds the statement, its parameters, its duration, the
+    endpoint that issued it and its query plan. Records are written to
+    SLOW_QUERY_LOG in the log folder, rotated like the application log.
+    Setting SLOW_QUERY_THRESHOLD to None disables the log.
+
+    Args:
+        app (Flask): The Flask application instance.
+        engine (Engine): The engine of the application.
+    """
+    threshold = app.config.get("SLOW_QUERY_THRESHOLD", DEFAULT_SLOW_QUERY_THRESHOLD)
+    if threshold is None:
+        return
+    create_logger(app, app.config.get("LOG_FOLDER", "logs"), app.config.get("SLOW_QUERY_LOG", SLOW_QUERY_LOG),
+                  logger=slow_query_logger)
+
+    # Start times are keyed by execution context, so a failed statement cannot shift them onto the next one.
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_timer(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("slow_query_start_times", {})[context] = time.perf_counter()
+
+    @event.listens_for(engine, "handle_error")
+    def drop_timer(exception_context):
+        if exception_context.connection is not None:
+            exception_context.connection.info.get("slow_query_start_times", {}).pop(
+                exception_context.execution_context, None)
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def log_slow_query(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info.get("slow_query_start_times", {}).pop(context, None)
+        if start is None:
+            return
+        duration = time.perf_counter() - start
+        if duration < threshold:
+            return
+        slow_query_logger.warning("Slow query (%.1f ms)", duration * 1000, extra={"data": {
+            "duration_ms": round(duration * 1000, 3),
+            "statement": statement,
+            "parameters": repr(parameters)[:MAX_PARAMETERS_LENGTH],
+            "endpoint": request.endpoint if has_request_context() else None,
+            "plan": None if executemany else explain(conn, statement, parameters)
+        }})
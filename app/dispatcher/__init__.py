@@ -3,4 +3,4 @@ from flask import Blueprint
 # Create a Blueprint instance for the dispatcher module
 dispatcher_bp = Blueprint("dispatcher", __name__, template_folder="templates")
 
-from . import routes
+from . import routes, commands
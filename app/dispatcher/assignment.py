@@ -0,0 +1,297 @@
+from collections import namedtuple
+from sqlalchemy import and_, bindparam, literal, null, or_, select, union_all, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.common.asset_status import ASSET_KINDS, AssetBusyError, hold_assets, release_assets
+from app.common.changes import ORDERS, bump_change_counters, record_bumped_counters, record_order_changes
+from app.common.models import AssetStatus, TransportationOrder, Trailer, User
+from app.common.reference import mark_bulk_changed
+from .availability import free_crews_query
+from .models import TractorHead
+from .trailer_index import TrailerBuckets, get_trailer_index, record_trailer_changes
+
+Assignment = namedtuple("Assignment", ["order", "driver", "tractor_head", "trailer"])
+AssignmentPlan = namedtuple("AssignmentPlan", ["assignments", "unassigned"])
+
+# Reasons an order is left out of a plan.
+NO_TRAILER = "no_trailer"
+NO_CREW = "no_driver_or_tractor_head"
+
+# Assignment fields of the assets, named like the order columns.
+ASSET_FIELDS = ASSET_KINDS
+
+class AssignmentConflict(Exception):
+    """
+    Raised when assignments of a bulk assignment cannot be applied.
+
+    Attributes:
+        errors (list): The position of every rejected assignment in the batch
+            (from 0), its order and the error messages keyed by field.
+    """
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} assignments rejected")
+        self.errors = errors
+
+def plan_assignments(orders, drivers, tractor_heads, trailers):
+    """
+    Plan assignments of free drivers, tractor heads and trailers to orders.
+
+    Trailers are matched best-fit decreasing: the heaviest orders choose first
+    and each takes the smallest free trailer of its type able to carry its
+    load, which matches as many orders as possible and keeps the big trailers
+    for the loads that need them. Drivers and tractor heads are then handed out
+    in the order of the orders list, so if there are fewer of them than
+    matched orders, the first orders are served. No asset is used twice.
+
+    Args:
+        orders (list): (id, trailer_type, load_weight) tuples, the most urgent first.
+        drivers (list): IDs of the free drivers.
+        tractor_heads (list): IDs of the free tractor heads.
+        trailers (TrailerBuckets or iterable): The free trailers, as buckets the
+            planned ones are taken from or (id, type, max_load_capacity) tuples.
+
+    Returns:
+        AssignmentPlan: The assignments, in the order of the orders list, and
+            the IDs of the orders left out mapped to the reason.
+    """
+    buckets = trailers if isinstance(trailers, TrailerBuckets) else TrailerBuckets(trailers)
+    matched = {}
+    unassigned = {}
+    for order_id, trailer_type, load_weight in sorted(orders, key=lambda order: order[2], reverse=True):
+        trailer_id = buckets.take(trailer_type, load_weight)
+        if trailer_id is None:
+            unassigned[order_id] = NO_TRAILER
+        else:
+            matched[order_id] = trailer_id
+
+    crews = zip(drivers, tractor_heads)
+    assignments = []
+    for order_id, _, _ in orders:
+        if order_id not in matched:
+            continue
+        crew = next(crews, None)
+        if crew is None:
+            unassigned[order_id] = NO_CREW
+        else:
+            assignments.append(Assignment(order_id, crew[0], crew[1], matched[order_id]))
+    return AssignmentPlan(assignments, unassigned)
+
+def unassigned_orders_query(order_ids=None):
+    """
+    Build a query for active orders without a driver, tractor head or trailer.
+
+    Args:
+        order_ids (list, optional): Only plan these orders.
+
+    Returns:
+        Select: Query yielding (id, trailer_type, load_weight) rows, the earliest planned delivery first.
+    """
+    query = select(
+        TransportationOrder.id, TransportationOrder.trailer_type, TransportationOrder.load_weight
+    ).where(
+        TransportationOrder.completed == False,
+        TransportationOrder.driver.is_(None),
+        TransportationOrder.tractor_head.is_(None),
+        TransportationOrder.trailer.is_(None)
+    ).order_by(TransportationOrder.planned_delivery_date, TransportationOrder.id)
+    if order_ids is not None:
+        query = query.where(TransportationOrder.id.in_(order_ids))
+    return query
+
+def suggest_assignments(order_ids=None):
+    """
+    Plan assignments for the unassigned active orders.
+
+    The orders and the free drivers and tractor heads are read in two
+    queries; the free trailers come from the trailer capacity index.
+
+    Args:
+        order_ids (list, optional): Only plan these orders.
+
+    Returns:
+        AssignmentPlan: The suggested assignments and the orders left out.
+    """
+    orders = db.session.execute(unassigned_orders_query(order_ids)).all()
+    crews = {"driver": [], "tractor_head": []}
+    for kind, asset_id in db.session.execute(free_crews_query()):
+        crews[kind].append(asset_id)
+    return plan_assignments(orders, crews["driver"], crews["tractor_head"], get_trailer_index().free_trailers())
+
+def _read_snapshot(assignments):
+    order_ids = {assignment["order"] for assignment in assignments}
+    requested = {field: {assignment[field] for assignment in assignments if assignment[field] is not None}
+                 for field in ASSET_FIELDS}
+    orders = {row.id: row for row in db.session.execute(
+        select(TransportationOrder.id, TransportationOrder.trailer_type, TransportationOrder.load_weight,
+               TransportationOrder.completed, TransportationOrder.version, TransportationOrder.driver,
+               TransportationOrder.trailer)
+        .where(TransportationOrder.id.in_(order_ids))
+    )}
+    assets = {field: {} for field in ASSET_FIELDS}
+    for kind, asset_id, trailer_type, capacity in db.session.execute(union_all(
+        select(literal("driver"), User.id, null(), null())
+        .where(User.id.in_(requested["driver"]), User.role == "driver"),
+        select(literal("tractor_head"), TractorHead.id, null(), null())
+        .where(TractorHead.id.in_(requested["tractor_head"])),
+        select(literal("trailer"), Trailer.id, Trailer.type, Trailer.max_load_capacity)
+        .where(Trailer.id.in_(requested["trailer"]))
+    )):
+        assets[kind][asset_id] = (trailer_type, capacity)
+    # Assets of the orders being assigned are released by the batch itself.
+    busy = {field: {} for field in ASSET_FIELDS}
+    for kind, asset_id, current_order in db.session.execute(
+        select(AssetStatus.kind, AssetStatus.asset_id, AssetStatus.current_order).where(
+            or_(*[and_(AssetStatus.kind == field, AssetStatus.asset_id.in_(requested[field]))
+                  for field in ASSET_FIELDS]),
+            AssetStatus.current_order.isnot(None),
+            AssetStatus.current_order.notin_(order_ids)
+        )
+    ):
+        busy[kind][asset_id] = current_order
+    return orders, assets, busy
+
+def check_assignments(assignments):
+    """
+    Validate a batch of assignments against a single snapshot of the orders and the fleet.
+
+    The orders, the requested assets and the statuses of the busy ones are
+    read with three queries in the current transaction. Besides
+    assets already busy with other orders, assets and orders appearing twice
+    in the batch are rejected.
+
+    Args:
+        assignments (list): Assignments loaded with AssignmentSchema.
+
+    Returns:
+        tuple: The orders as read, with their version, driver and trailer, keyed
+            by order ID, and the errors of the rejected assignments, as in AssignmentConflict.
+    """
+    orders, assets, busy = _read_snapshot(assignments)
+    errors = []
+    seen_orders = {}
+    seen_assets = {field: {} for field in ASSET_FIELDS}
+    for index, assignment in enumerate(assignments):
+        messages = {}
+        order_id = assignment["order"]
+        order = orders.get(order_id)
+        if order_id in seen_orders:
+            messages["order"] = [f"Already assigned by assignment {seen_orders[order_id]} of this batch."]
+        elif order is None:
+            messages["order"] = ["Order does not exist."]
+        elif order.completed:
+            messages["order"] = ["Order is already finished."]
+        elif assignment["version"] is not None and assignment["version"] != order.version:
+            messages["version"] = [f"Order is at version {order.version}."]
+        seen_orders.setdefault(order_id, index)
+
+        for field in ASSET_FIELDS:
+            asset_id = assignment[field]
+            if asset_id is None:
+                continue
+            if asset_id not in assets[field]:
+                messages[field] = [f"{asset_id} does not exist."]
+            elif asset_id in busy[field]:
+                messages[field] = [f"{asset_id} is assigned to order {busy[field][asset_id]}."]
+            elif asset_id in seen_assets[field]:
+                messages[field] = [
+                    f"{asset_id} is already used by assignment {seen_assets[field][asset_id]} of this batch."]
+            seen_assets[field].setdefault(asset_id, index)
+
+        trailer = assets["trailer"].get(assignment["trailer"])
+        if trailer and order is not None and "trailer" not in messages:
+            trailer_type, capacity = trailer
+            if trailer_type != order.trailer_type:
+                messages["trailer"] = [f"Trailer is of type {trailer_type}, not {order.trailer_type}."]
+            elif capacity < order.load_weight:
+                messages["trailer"] = [f"Trailer carries at most {capacity}, not {order.load_weight}."]
+
+        if messages:
+            errors.append({"index": index, "order": order_id, "errors": messages})
+    return orders, errors
+
+def apply_assignments(assignments):
+    """
+    Assign drivers, tractor heads and trailers to many orders in one transaction.
+
+    The batch is checked with check_assignments() and written with a single
+    executemany UPDATE, preceded by another one only when drivers move between
+    orders of the batch. It bumps the versions of the orders and only
+    matches orders still at the checked version. Either every assignment is
+    applied or none is. The UPDATE bypasses the flush events, so the asset
+    statuses, the order feed, the change counter and the trailer capacity
+    index are updated here.
+
+    Args:
+        assignments (list): Assignments loaded with AssignmentSchema.
+
+    Returns:
+        dict: The new versions of the orders, keyed by order ID.
+
+    Raises:
+        AssignmentConflict: If any assignment is rejected, or an order has been
+            changed by someone else after the check. Nothing is written; the
+            caller rolls back the transaction.
+    """
+    orders, errors = check_assignments(assignments)
+    if errors:
+        raise AssignmentConflict(errors)
+    if not assignments:
+        return {}
+
+    table = TransportationOrder.__table__
+    # A driver has at most one active order, so drivers moving between orders of the batch
+    # are taken off their orders first; the UPDATE below still checks the versions.
+    new_drivers = {assignment["driver"] for assignment in assignments} - {None}
+    moving = [assignment["order"] for assignment in assignments
+              if orders[assignment["order"]].driver in new_drivers
+              and orders[assignment["order"]].driver != assignment["driver"]]
+    if moving:
+        db.session.connection().execute(update(table).where(table.c.id.in_(moving)).values(driver=None))
+    statement = update(table).where(
+        table.c.id == bindparam("order_id"),
+        table.c.version == bindparam("expected_version"),
+        table.c.completed == False
+    ).values(
+        driver=bindparam("new_driver"),
+        tractor_head=bindparam("new_tractor_head"),
+        trailer=bindparam("new_trailer"),
+        version=table.c.version + 1
+    )
+    try:
+        result = db.session.connection().execute(statement, [
+            {"order_id": assignment["order"], "expected_version": orders[assignment["order"]].version,
+             "new_driver": assignment["driver"], "new_tractor_head": assignment["tractor_head"],
+             "new_trailer": assignment["trailer"]}
+            for assignment in assignments
+        ])
+    except IntegrityError:
+        # A driver was assigned to another active order after the check.
+        result = None
+    if result is None or result.rowcount != len(assignments):
+        raise AssignmentConflict([
+            {"index": index, "order": assignment["order"],
+             "errors": {"version": ["Orders of the batch were changed in the meantime."]}}
+            for index, assignment in enumerate(assignments)
+        ])
+
+    order_ids = [assignment["order"] for assignment in assignments]
+    mark_bulk_changed(db.session, TransportationOrder, order_ids)
+    connection = db.session.connection()
+    release_assets(connection, order_ids)
+    try:
+        hold_assets(connection, [(assignment["order"], field, assignment[field])
+                                 for assignment in assignments for field in ASSET_FIELDS
+                                 if assignment[field] is not None])
+    except AssetBusyError as e:
+        raise AssignmentConflict([
+            {"index": index, "order": assignment["order"],
+             "errors": {e.kind: [f"{e.asset_id} was assigned to another order in the meantime."]}}
+            for index, assignment in enumerate(assignments) if assignment[e.kind] == e.asset_id
+        ])
+    record_bumped_counters(db.session, bump_change_counters(connection, ORDERS))
+    record_order_changes(db.session, [(order_id, "updated") for order_id in sorted(order_ids)])
+    released = [("release", orders[order_id].trailer) for order_id in order_ids
+                if orders[order_id].trailer is not None]
+    held = [("hold", assignment["trailer"]) for assignment in assignments if assignment["trailer"] is not None]
+    record_trailer_changes(db.session, released + held)
+    return {order_id: orders[order_id].version + 1 for order_id in order_ids}
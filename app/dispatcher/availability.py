@@ -0,0 +1,116 @@
+from collections import namedtuple
+from sqlalchemy import and_, select, literal, union_all
+from app import db
+from app.common.asset_status import DRIVER, TRACTOR_HEAD, TRAILER
+from app.common.models import AssetStatus, User, Trailer
+from .models import TractorHead
+
+FleetAvailability = namedtuple("FleetAvailability", ["drivers", "tractor_heads", "trailers"])
+
+def _free(query, kind, id_column):
+    """
+    Restrict a query of assets to the ones not assigned to any active order.
+
+    The asset status table holds the current order of every asset, so this
+    is a primary key join and an indexed "current_order IS NULL" check.
+
+    Args:
+        query (Select): The query of the assets.
+        kind (str): The kind of the assets.
+        id_column (Column): The ID column of the assets.
+
+    Returns:
+        Select: The restricted query.
+    """
+    return query.join(AssetStatus, and_(AssetStatus.kind == kind, AssetStatus.asset_id == id_column)).where(
+        AssetStatus.current_order.is_(None))
+
+def available_drivers_query():
+    """
+    Build a query for drivers that are not assigned to any active order.
+
+    Returns:
+        Select: Query yielding (kind, id, label) rows for available drivers.
+    """
+    return _free(select(
+        literal("driver").label("kind"),
+        User.id.label("id"),
+        (User.first_name + " " + User.last_name).label("label")
+    ).where(User.role == "driver"), DRIVER, User.id)
+
+def available_tractor_heads_query():
+    """
+    Build a query for tractor heads that are not assigned to any active order.
+
+    Returns:
+        Select: Query yielding (kind, id, label) rows for available tractor heads.
+    """
+    return _free(select(
+        literal("tractor_head").label("kind"),
+        TractorHead.id.label("id"),
+        (TractorHead.brand + " " + TractorHead.registration_number).label("label")
+    ), TRACTOR_HEAD, TractorHead.id)
+
+def available_trailers_query(trailer_type, order_load_weight):
+    """
+    Build a query for free trailers able to carry the given load.
+
+    Args:
+        trailer_type (str): The required type of the trailer.
+        order_load_weight (int): The weight of the load.
+
+    Returns:
+        Select: Query yielding (kind, id, label) rows for available trailers.
+    """
+    return _free(select(
+        literal("trailer").label("kind"),
+        Trailer.id.label("id"),
+        Trailer.registration_number.label("label")
+    ).where(
+        Trailer.type == trailer_type,
+        Trailer.max_load_capacity >= order_load_weight
+    ), TRAILER, Trailer.id)
+
+def get_fleet_availability(trailer_type, order_load_weight):
+    """
+    Get available drivers, tractor heads and trailers in one database round trip.
+
+    The three queries of free assets are combined with UNION ALL, so the database
+    excludes busy assets itself and only (id, label) pairs are transferred.
+
+    Args:
+        trailer_type (str): The trailer type required by the order.
+        order_load_weight (int): The weight of the order's load.
+
+    Returns:
+        FleetAvailability: Lists of (id, label) tuples for drivers, tractor heads and trailers.
+    """
+    query = union_all(
+        available_drivers_query(),
+        available_tractor_heads_query(),
+        available_trailers_query(trailer_type, order_load_weight)
+    ).order_by("kind", "label")
+    availability = FleetAvailability(drivers=[], tractor_heads=[], trailers=[])
+    buckets = {
+        "driver": availability.drivers,
+        "tractor_head": availability.tractor_heads,
+        "trailer": availability.trailers
+    }
+    for kind, asset_id, label in db.session.execute(query):
+        buckets[kind].append((asset_id, label))
+    return availability
+
+def free_crews_query():
+    """
+    Build a query for all free drivers and tractor heads.
+
+    Uses the same conditions as the availability lists, without the labels.
+
+    Returns:
+        Select: Query yielding (kind, id) rows.
+    """
+    return union_all(
+        available_drivers_query().with_only_columns(literal("driver").label("kind"), User.id.label("id")),
+        available_tractor_heads_query().with_only_columns(
+            literal("tractor_head").label("kind"), TractorHead.id.label("id"))
+    ).order_by("kind", "id")
@@ -0,0 +1,180 @@
+import hashlib
+import json
+import time
+from flask import current_app, request
+from app import db
+from app.common.changes import ORDERS, REFERENCE_DATA, get_change_counters, wait_for_order_changes
+from app.common.models import TransportationOrder
+from app.common.reference import get_snapshots
+
+# Columns of an order the board shows; everything else comes from snapshots.
+BOARD_COLUMNS = [
+    TransportationOrder.id,
+    TransportationOrder.planned_delivery_date,
+    TransportationOrder.trailer_type,
+    TransportationOrder.load_weight,
+    TransportationOrder.loading_place,
+    TransportationOrder.delivery_place,
+    TransportationOrder.driver,
+    TransportationOrder.tractor_head,
+    TransportationOrder.trailer,
+    TransportationOrder.version
+]
+BOARD_KEYS = [TransportationOrder.planned_delivery_date, TransportationOrder.id]
+
+DEFAULT_FEED_MAX_WAIT = 25
+DEFAULT_FEED_POLL_INTERVAL = 1.0
+DEFAULT_FEED_STREAM_DURATION = 300
+DEFAULT_FEED_BATCH_SIZE = 500
+
+def board_query():
+    """
+    Build a query of the board's columns of active orders.
+
+    Returns:
+        Query: Query yielding one row per active order, without ORDER BY.
+    """
+    return db.session.query(*BOARD_COLUMNS).filter(TransportationOrder.completed == False)
+
+def board_validators():
+    """
+    Compute the validators of the board for the current request.
+
+    The board only changes when orders or the reference data shown with them
+    change, so the validators are derived from their change counters and the
+    query string (filters, page size and cursor) without reading any order.
+
+    Returns:
+        tuple: The strong ETag, unquoted, the time of the last change, or None,
+            and the version of the reference data counter, for serialize_board().
+    """
+    versions, last_modified = get_change_counters(ORDERS, REFERENCE_DATA)
+    arguments = hashlib.sha1(request.query_string).hexdigest()[:16]
+    return "board-" + "-".join(map(str, versions)) + "-" + arguments, last_modified, versions[1]
+
+def serialize_board(rows, reference_version=None):
+    """
+    Serialize board rows with the labels of their companies and assets.
+
+    The labels are looked up in the reference cache, one query per kind of
+    row for those not cached yet. Given the reference data version of an
+    ETag, labels cached before another process changed the reference data
+    are loaded again, so the ETag never comes with old labels.
+
+    Args:
+        rows (list): Rows of the board query.
+        reference_version (int, optional): The reference data counter version the ETag was built from.
+
+    Returns:
+        list: The orders as dictionaries.
+    """
+    companies = get_snapshots("company", {row.loading_place for row in rows} | {row.delivery_place for row in rows},
+                              reference_version)
+    drivers = get_snapshots("driver", {row.driver for row in rows if row.driver}, reference_version)
+    tractor_heads = get_snapshots("tractor_head", {row.tractor_head for row in rows if row.tractor_head},
+                                  reference_version)
+    trailers = get_snapshots("trailer", {row.trailer for row in rows if row.trailer}, reference_version)
+
+    def company(id):
+        snapshot = companies.get(id)
+        return {"id": id, "name": snapshot.company_name if snapshot else None}
+
+    def driver(id):
+        snapshot = drivers.get(id)
+        return {"id": id, "name": f"{snapshot.first_name} {snapshot.last_name}"} if snapshot else None
+
+    def tractor_head(id):
+        snapshot = tractor_heads.get(id)
+        return {"id": id, "brand": snapshot.brand,
+                "registration_number": snapshot.registration_number} if snapshot else None
+
+    def trailer(id):
+        snapshot = trailers.get(id)
+        return {"id": id, "type": snapshot.type,
+                "registration_number": snapshot.registration_number} if snapshot else None
+
+    return [{
+        "id": row.id,
+        "planned_delivery_date": row.planned_delivery_date.isoformat(),
+        "trailer_type": row.trailer_type,
+        "load_weight": row.load_weight,
+        "loading_company": company(row.loading_place),
+        "delivery_company": company(row.delivery_place),
+        "driver": driver(row.driver),
+        "tractor_head": tractor_head(row.tractor_head),
+        "trailer": trailer(row.trailer),
+        "version": row.version
+    } for row in rows]
+
+def board_deltas(changes):
+    """
+    Turn order feed entries into changes of the board.
+
+    Several entries of one order are collapsed into the latest one. Each
+    delta carries the order as the board shows it, or None if the order is
+    no longer on the board (completed or deleted), so a client can patch its
+    rows without knowing what the actions mean.
+
+    Args:
+        changes (list): Entries of the order feed, oldest first.
+
+    Returns:
+        list: The deltas, ordered by the position of their latest entry.
+    """
+    latest = {}
+    for change in changes:
+        latest.pop(change.order_id, None)
+        latest[change.order_id] = change
+    rows = board_query().filter(TransportationOrder.id.in_(latest)).all() if latest else []
+    orders = {order["id"]: order for order in serialize_board(rows)}
+    return [{"seq": change.seq, "id": change.order_id, "action": change.action, "order": orders.get(change.order_id)}
+            for change in latest.values()]
+
+def wait_for_board_deltas(since, timeout):
+    """
+    Wait for changes of the board after a position of the order feed.
+
+    Args:
+        since (int): The position of the last entry the client has seen.
+        timeout (float): The maximum time to wait, in seconds.
+
+    Returns:
+        tuple: The position of the last returned entry (since if none) and the deltas.
+    """
+    changes = wait_for_order_changes(
+        since, timeout,
+        current_app.config.get("ORDER_FEED_POLL_INTERVAL", DEFAULT_FEED_POLL_INTERVAL),
+        current_app.config.get("ORDER_FEED_BATCH_SIZE", DEFAULT_FEED_BATCH_SIZE)
+    )
+    return (changes[-1].seq if changes else since), board_deltas(changes)
+
+def board_event_stream(since):
+    """
+    Generate Server-Sent Events with the changes of the board.
+
+    Each batch of deltas is sent as a "changes" event whose ID is the
+    position of its last feed entry, so a reconnecting EventSource resumes
+    with the Last-Event-ID header. A comment is sent after every idle poll
+    to keep proxies from closing the connection. The stream ends after
+    ORDER_FEED_STREAM_DURATION seconds to release the worker; the client
+    then reconnects.
+
+    Args:
+        since (int): The position of the last entry the client has seen.
+
+    Yields:
+        str: The events.
+    """
+    duration = current_app.config.get("ORDER_FEED_STREAM_DURATION", DEFAULT_FEED_STREAM_DURATION)
+    wait = current_app.config.get("ORDER_FEED_MAX_WAIT", DEFAULT_FEED_MAX_WAIT)
+    deadline = time.monotonic() + duration
+    yield "retry: 1000\n\n"
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        since, deltas = wait_for_board_deltas(since, min(wait, remaining))
+        if deltas:
+            yield f"id: {since}\nevent: changes\ndata: {json.dumps(deltas)}\n\n"
+        else:
+            yield ": keep-alive\n\n"
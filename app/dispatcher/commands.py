@@ -0,0 +1,8 @@
+from app.common.bulk_import import register_import_command
+from . import dispatcher_bp
+from .importers import tractor_head_importer, trailer_importer
+
+register_import_command(dispatcher_bp.cli, "import-tractor-heads", tractor_head_importer,
+                        "Import tractor heads from a CSV or JSON Lines file.")
+register_import_command(dispatcher_bp.cli, "import-trailers", trailer_importer,
+                        "Import trailers from a CSV or JSON Lines file.")
@@ -0,0 +1,44 @@
+from app import db
+from app.common.asset_status import TRACTOR_HEAD, TRAILER, register_assets
+from app.common.bulk_import import BulkImporter
+from app.common.models import Trailer
+from .models import TractorHead
+from .schemas import TractorHeadSchema, TrailerSchema
+
+def upper_registration_number(row):
+    """
+    Store registration numbers in upper case, as the forms do.
+
+    Args:
+        row (dict): A validated row.
+
+    Returns:
+        dict: The row with an upper case registration number.
+    """
+    row["registration_number"] = row["registration_number"].upper()
+    return row
+
+class AssetImporter(BulkImporter):
+    """
+    Imports tractor heads or trailers, adding them to the free assets.
+
+    Attributes:
+        kind (str): The asset kind of the imported rows.
+    """
+    def __init__(self, model, schema, kind, **options):
+        super().__init__(model, schema, **options)
+        self.kind = kind
+
+    def inserted(self, ids):
+        """
+        Add asset status rows of the inserted assets.
+
+        Args:
+            ids (list): The IDs of the assets.
+        """
+        register_assets(db.session.connection(), self.kind, ids)
+
+tractor_head_importer = AssetImporter(TractorHead, TractorHeadSchema(), TRACTOR_HEAD, unique="registration_number",
+                                      prepare=upper_registration_number)
+trailer_importer = AssetImporter(Trailer, TrailerSchema(), TRAILER, unique="registration_number",
+                                 prepare=upper_registration_number)
@@ -1,6 +1,7 @@
 from app import db
+from app.common.models import VersionedMixin
 
-class TractorHead(db.Model):
+class TractorHead(VersionedMixin, db.Model):
     """
     Represents a tractor head in the system.
 
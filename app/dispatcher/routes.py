@@ -1,17 +1,31 @@
-from flask import request, render_template, redirect, url_for, flash, current_app
+from flask import (request, render_template, redirect, url_for, flash, current_app, jsonify, Response,
+                   stream_with_context)
 from flask_login import login_required
 from flask_wtf.csrf import generate_csrf
 from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm.exc import StaleDataError
 from marshmallow import ValidationError
 from app import db
 from app.common.permissions import role_required
+from app.common.asset_status import AssetBusyError
 from app.common.models import TransportationOrder, Trailer
+from app.common.loaders import order_board_options
+from app.common.pagination import paginate
+from app.common.reference import get_snapshot_or_404
 from app.common.schemas import TransportationOrderSchema
 from app.common.custom_utils import send_validation_errors_to_form
+from app.common.concurrency import check_version, render_conflict
+from app.common.bulk_import import import_upload
+from app.common.changes import not_modified, cache_validators, last_order_change
+from app.common.instrumentation import allow_repeated_queries
 from . import dispatcher_bp
+from .assignment import AssignmentConflict, apply_assignments, suggest_assignments
+from .board import (BOARD_KEYS, DEFAULT_FEED_MAX_WAIT, board_query, board_validators, serialize_board,
+                    wait_for_board_deltas, board_event_stream)
+from .importers import tractor_head_importer, trailer_importer
 from .forms import CompletingTheTransportationOrderForm, TractorHeadForm, TrailerForm
 from .models import TractorHead
-from .schemas import TractorHeadSchema, TrailerSchema
+from .schemas import AssignmentSchema, TractorHeadSchema, TrailerSchema
 
 @dispatcher_bp.route("/tractor_heads/new", methods=["GET", "POST"])
 @login_required
@@ -43,14 +57,14 @@ def new_tractor_head():
             return redirect(url_for("home"))
         except ValidationError as e:
             send_validation_errors_to_form(e, form)
-            current_app.logger.exception(f"New tractor head - validation error: {e}")
+            current_app.logger.exception("New tractor head - validation error: %s", e)
         except IntegrityError as e:
             db.session.rollback()
-            current_app.logger.exception(f"Adding new tractor head error: {e}")
+            current_app.logger.exception("Adding new tractor head error: %s", e)
             flash("Registration number is already in use, choose another.", "danger")
         except Exception as e:
             db.session.rollback()
-            current_app.logger.exception(f"Error during new tractor head adding: {e}")
+            current_app.logger.exception("Error during new tractor head adding: %s", e)
             flash(f"Error: {e}, try again", "danger")
     return render_template("tractor_head_form.html", form=form, title="New Tractor Head")
 
@@ -61,15 +75,27 @@ def tractor_heads():
     """
     Display list of all tractor heads.
 
-    This route fetches all tractor heads from the database and displays them.
+    This route fetches a page of tractor heads from the database and displays them.
 
     Returns:
         str: Rendered HTML template displaying the list of tractor heads.
     """
-    all_tractor_heads = TractorHead.query.all()
-    if not all_tractor_heads:
+    page = paginate(TractorHead.query, [TractorHead.id])
+    if not page.items:
         flash("Tractor heads list is empty.", "info")
-    return render_template("tractor_heads_list.html", tractor_heads=all_tractor_heads)
+    return render_template("tractor_heads_list.html", tractor_heads=page.items, page=page)
+
+@dispatcher_bp.route("/tractor_heads/import", methods=["POST"])
+@login_required
+@role_required("dispatcher")
+def import_tractor_heads():
+    """
+    Import tractor heads from an uploaded CSV or JSON Lines file.
+
+    Returns:
+        Response: JSON with the numbers of imported and rejected rows and the errors of the rejected ones.
+    """
+    return import_upload(tractor_head_importer)
 
 @dispatcher_bp.route("/tractor_heads/<int:id>", methods=["GET"])
 @login_required
@@ -86,7 +112,7 @@ def tractor_head_details(id):
     Returns:
         str: Rendered HTML template displaying the tractor head details.
     """
-    tractor_head = TractorHead.query.get_or_404(id)
+    tractor_head = get_snapshot_or_404("tractor_head", id)
     return render_template("tractor_head_details.html", tractor_head=tractor_head)
 
 @dispatcher_bp.route("/tractor_heads/edit/<int:id>", methods=["GET", "POST"])
@@ -115,6 +141,7 @@ def edit_tractor_head(id):
             "registration_number": form.registration_number.data
         }
         try:
+            check_version(tractor_head, form.version.data)
             result = schema.load(tractor_head_data)
             tractor_head.brand = result["brand"]
             tractor_head.registration_number = result["registration_number"]
@@ -123,14 +150,19 @@ def edit_tractor_head(id):
             return redirect(url_for("dispatcher.tractor_heads"))
         except ValidationError as e:
             send_validation_errors_to_form(e, form)
-            current_app.logger.exception(f"Edit {tractor_head} - validation error: {e}")
+            current_app.logger.exception("Edit tractor head %s - validation error: %s", id, e)
+        except StaleDataError as e:
+            db.session.rollback()
+            current_app.logger.warning("Edit tractor head %s - conflict: %s", id, e)
+            form = TractorHeadForm(formdata=None, obj=tractor_head)
+            return render_conflict("tractor_head_form.html", form=form, title="Edit Tractor Head")
         except IntegrityError as e:
             db.session.rollback()
-            current_app.logger.exception(f"Editing {tractor_head} error: {e}")
+            current_app.logger.exception("Editing tractor head %s error: %s", id, e)
             flash("Registration number is already in use, choose another.", "danger")
         except Exception as e:
             db.session.rollback()
-            current_app.logger.exception(f"Error during {tractor_head} editing: {e}")
+            current_app.logger.exception("Error during tractor head %s editing: %s", id, e)
             flash(f"Error: {e}, try again", "danger")
     return render_template("tractor_head_form.html", form=form, title="Edit Tractor Head")
 
@@ -175,7 +207,7 @@ def delete_tractor_head(id):
         flash("Tractor head has been deleted.", "success")
     except Exception as e:
         db.session.rollback()
-        current_app.logger.exception(f"Error during {tractor_head} deleting: {e}")
+        current_app.logger.exception("Error during tractor head %s deleting: %s", id, e)
         flash(f"Error: {e}, try again", "danger")
     return redirect(url_for("dispatcher.tractor_heads"))
 
@@ -210,14 +242,14 @@ def new_trailer():
             return redirect(url_for("home"))
         except ValidationError as e:
             send_validation_errors_to_form(e, form)
-            current_app.logger.exception(f"New trailer - validation error: {e}")
+            current_app.logger.exception("New trailer - validation error: %s", e)
         except IntegrityError as e:
             db.session.rollback()
-            current_app.logger.exception(f"Adding new trailer error: {e}")
+            current_app.logger.exception("Adding new trailer error: %s", e)
             flash("Registration number is already in use, choose another.", "danger")
         except Exception as e:
             db.session.rollback()
-            current_app.logger.exception(f"Error during new trailer adding: {e}")
+            current_app.logger.exception("Error during new trailer adding: %s", e)
             flash(f"Error: {e}, try again", "danger")
     return render_template("trailer_form.html", form=form, title="New Trailer")
 
@@ -228,15 +260,27 @@ def trailers():
     """
     Display list of all trailers.
 
-    This route fetches all trailers from the database and displays them.
+    This route fetches a page of trailers from the database and displays them.
 
     Returns:
         str: Rendered HTML template displaying the list of trailers.
     """
-    all_trailers = Trailer.query.all()
-    if not all_trailers:
+    page = paginate(Trailer.query, [Trailer.id])
+    if not page.items:
         flash("Trailers list is empty.", "info")
-    return render_template("trailers_list.html", trailers=all_trailers)
+    return render_template("trailers_list.html", trailers=page.items, page=page)
+
+@dispatcher_bp.route("/trailers/import", methods=["POST"])
+@login_required
+@role_required("dispatcher")
+def import_trailers():
+    """
+    Import trailers from an uploaded CSV or JSON Lines file.
+
+    Returns:
+        Response: JSON with the numbers of imported and rejected rows and the errors of the rejected ones.
+    """
+    return import_upload(trailer_importer)
 
 @dispatcher_bp.route("/trailers/<int:id>", methods=["GET"])
 @login_required
@@ -253,7 +297,7 @@ def trailer_details(id):
     Returns:
         str: Rendered HTML template displaying the trailer details.
     """
-    trailer = Trailer.query.get_or_404(id)
+    trailer = get_snapshot_or_404("trailer", id)
     return render_template("trailer_details.html", trailer=trailer)
 
 @dispatcher_bp.route("/trailers/edit/<int:id>", methods=["GET", "POST"])
@@ -283,6 +327,7 @@ def edit_trailer(id):
             "registration_number": form.registration_number.data
         }
         try:
+            check_version(trailer, form.version.data)
             result = schema.load(trailer_data)
             trailer.type = result["type"]
             trailer.max_load_capacity = result["max_load_capacity"]
@@ -292,14 +337,19 @@ def edit_trailer(id):
             return redirect(url_for("dispatcher.trailers"))
         except ValidationError as e:
             send_validation_errors_to_form(e, form)
-            current_app.logger.exception(f"Edit {trailer} - validation error: {e}")
+            current_app.logger.exception("Edit trailer %s - validation error: %s", id, e)
+        except StaleDataError as e:
+            db.session.rollback()
+            current_app.logger.warning("Edit trailer %s - conflict: %s", id, e)
+            form = TrailerForm(formdata=None, obj=trailer)
+            return render_conflict("trailer_form.html", form=form, title="Edit Trailer")
         except IntegrityError as e:
             db.session.rollback()
-            current_app.logger.exception(f"Editing {trailer} error: {e}")
+            current_app.logger.exception("Editing trailer %s error: %s", id, e)
             flash("Registration number is already in use, choose another.", "danger")
         except Exception as e:
             db.session.rollback()
-            current_app.logger.exception(f"Error during {trailer} editing: {e}")
+            current_app.logger.exception("Error during trailer %s editing: %s", id, e)
             flash(f"Error: {e}, try again", "danger")
     return render_template("trailer_form.html", form=form, title="Edit Trailer")
 
@@ -344,7 +394,7 @@ def delete_trailer(id):
         flash("Trailer has been deleted.", "success")
     except Exception as e:
         db.session.rollback()
-        current_app.logger.exception(f"Error during {trailer} deleting: {e}")
+        current_app.logger.exception("Error during trailer %s deleting: %s", id, e)
         flash(f"Error: {e}, try again", "danger")
     return redirect(url_for("dispatcher.trailers"))
 
@@ -355,16 +405,145 @@ def active_transport_orders():
     """
     Display list of active transportation orders.
 
-    This route fetches all incomplete transportation orders from the database
-    and displays them.
+    This route fetches a page of incomplete transportation orders from the database,
+    ordered by planned delivery date, and displays them.
+
+    The page receives the position of the order feed it was rendered at and
+    patches its rows with the changes streamed after it.
 
     Returns:
         str: Rendered HTML template displaying the list of active transportation orders.
     """
-    orders = TransportationOrder.query.filter_by(completed=False).order_by(TransportationOrder.planned_delivery_date).all()
-    if not orders:
+    last_seq = last_order_change()
+    page = paginate(
+        TransportationOrder.query.options(*order_board_options()).filter_by(completed=False),
+        [TransportationOrder.planned_delivery_date, TransportationOrder.id]
+    )
+    if not page.items:
         flash("There are no orders yet", "info")
-    return render_template("transportation_orders.html", orders=orders)
+    return render_template("transportation_orders.html", orders=page.items, page=page, last_seq=last_seq)
+
+@dispatcher_bp.route("/orders/active.json", methods=["GET"])
+@login_required
+@role_required("dispatcher")
+def active_transport_orders_json():
+    """
+    Return a page of active transportation orders as JSON.
+
+    Only the columns the board shows are selected, and the related names come
+    from the reference cache. The response carries a strong ETag and
+    Last-Modified built from change counters, so a client sending them back
+    gets 304 Not Modified without any order being read.
+
+    Returns:
+        Response: JSON with the orders and the URLs of the neighbouring pages, or 304.
+    """
+    etag, last_modified, reference_version = board_validators()
+    response = not_modified(etag, last_modified)
+    if response:
+        return response
+    page = paginate(board_query(), BOARD_KEYS)
+    response = jsonify(orders=serialize_board(page.items, reference_version), next=page.next_url, prev=page.prev_url)
+    return cache_validators(response, etag, last_modified)
+
+@dispatcher_bp.route("/orders/changes", methods=["GET"])
+@login_required
+@role_required("dispatcher")
+def order_changes():
+    """
+    Long-poll for changes of the active order board.
+
+    Without the "since" argument, only the current position of the order feed
+    is returned. With it, the changes after that position are returned, waiting
+    up to "wait" seconds (at most ORDER_FEED_MAX_WAIT) for the first one.
+
+    Returns:
+        Response: JSON with the position of the last change and the changed orders.
+    """
+    since = request.args.get("since", type=int)
+    if since is None:
+        return jsonify(last_seq=last_order_change(), changes=[])
+    max_wait = current_app.config.get("ORDER_FEED_MAX_WAIT", DEFAULT_FEED_MAX_WAIT)
+    wait = max(0, min(request.args.get("wait", 0, type=float), max_wait))
+    allow_repeated_queries()
+    last_seq, deltas = wait_for_board_deltas(since, wait)
+    return jsonify(last_seq=last_seq, changes=deltas)
+
+@dispatcher_bp.route("/orders/changes/stream", methods=["GET"])
+@login_required
+@role_required("dispatcher")
+def order_change_stream():
+    """
+    Stream changes of the active order board as Server-Sent Events.
+
+    The stream starts after the Last-Event-ID header of a reconnecting client,
+    the "since" argument or, without either, the current position of the feed.
+
+    Returns:
+        Response: The event stream.
+    """
+    since = request.headers.get("Last-Event-ID", type=int)
+    if since is None:
+        since = request.args.get("since", type=int)
+    if since is None:
+        since = last_order_change()
+    return Response(stream_with_context(board_event_stream(since)), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@dispatcher_bp.route("/orders/assignment-plan", methods=["GET"])
+@login_required
+@role_required("dispatcher")
+def assignment_plan():
+    """
+    Suggest drivers, tractor heads and trailers for the unassigned active orders.
+
+    Every suggested order gets the smallest free trailer of its type able to
+    carry its load, and no asset is suggested twice. The plan is not saved.
+    Repeated "order" arguments limit the plan to the given orders.
+
+    Returns:
+        Response: JSON with the suggested assignments and the orders left out with the reason.
+    """
+    order_ids = request.args.getlist("order", type=int) or None
+    plan = suggest_assignments(order_ids)
+    return jsonify(
+        assignments=[assignment._asdict() for assignment in plan.assignments],
+        unassigned=[{"order": order_id, "reason": reason} for order_id, reason in sorted(plan.unassigned.items())]
+    )
+
+@dispatcher_bp.route("/orders/assign", methods=["POST"])
+@login_required
+@role_required("dispatcher")
+def assign_orders():
+    """
+    Assign drivers, tractor heads and trailers to many transportation orders at once.
+
+    The request body is a JSON array of assignments with the "order" ID and
+    the "driver", "tractor_head" and "trailer" IDs (null for none), optionally
+    with the "version" of the order they were planned against. All of them
+    are checked against one snapshot of the fleet and applied in a single
+    transaction, or none is applied.
+
+    Returns:
+        Response: JSON with the new versions of the orders, or the rejected
+            assignments with status 400 for malformed input and 409 for conflicts.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, list):
+        return jsonify(error="Expected a JSON array of assignments."), 400
+    try:
+        assignments = AssignmentSchema(many=True).load(data)
+    except ValidationError as e:
+        return jsonify(errors=[{"index": index, "errors": messages}
+                               for index, messages in sorted(e.messages.items())]), 400
+    try:
+        versions = apply_assignments(assignments)
+        db.session.commit()
+    except AssignmentConflict as e:
+        db.session.rollback()
+        current_app.logger.warning("Bulk assignment rejected: %s", e)
+        return jsonify(errors=e.errors), 409
+    return jsonify(orders=[{"order": order_id, "version": version} for order_id, version in versions.items()])
 
 @dispatcher_bp.route("/orders/complete/<int:id>", methods=["GET", "POST"])
 @login_required
@@ -401,6 +580,7 @@ def complete_the_order(id):
             "completed": order.completed
         }
         try:
+            check_version(order, form.version.data)
             result = schema.load(transportation_order_data)
             order.driver = result["driver"] if form.driver.data != "0" else None
             order.tractor_head = result["tractor_head"] if form.tractor_head.data != "0" else None
@@ -410,10 +590,21 @@ def complete_the_order(id):
             return redirect(url_for("dispatcher.active_transport_orders"))
         except ValidationError as e:
             send_validation_errors_to_form(e, form)
-            current_app.logger.exception(f"Edit {order} (dispatcher) - validation error: {e}")
+            current_app.logger.exception("Edit order %s (dispatcher) - validation error: %s", id, e)
+        except StaleDataError as e:
+            db.session.rollback()
+            current_app.logger.warning("Edit order %s (dispatcher) - conflict: %s", id, e)
+            form = CompletingTheTransportationOrderForm(formdata=None, obj=order)
+            return render_conflict("completing_the_order_form.html", form=form)
+        except (AssetBusyError, IntegrityError) as e:
+            # Another active order took an asset in the meantime; for drivers, the unique index notices first.
+            db.session.rollback()
+            current_app.logger.warning("Edit order %s (dispatcher) - asset taken: %s", id, e)
+            form = CompletingTheTransportationOrderForm(formdata=None, obj=order)
+            return render_conflict("completing_the_order_form.html", form=form)
         except Exception as e:
             db.session.rollback()
-            current_app.logger.exception(f"Error during completing the {order}: {e}")
+            current_app.logger.exception("Error during completing the order %s: %s", id, e)
             flash(f"Error: {e}, try again", "danger")
     return render_template("completing_the_order_form.html", form=form)
 
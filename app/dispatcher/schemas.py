@@ -40,4 +40,20 @@ class TrailerSchema(Schema):
     max_load_capacity = fields.Int(required=True, validate=[not_blank])
     registration_number = fields.Str(required=True, validate=[validate.Length(equal=7), not_blank])
 
+class AssignmentSchema(Schema):
+    """
+    Schema for validating one assignment of a bulk assignment.
 
+    Attributes:
+        order (int): The ID of the transportation order.
+        driver (int): The ID of the driver, or None to leave the order without one.
+        tractor_head (int): The ID of the tractor head, or None.
+        trailer (int): The ID of the trailer, or None.
+        version (int): The version of the order the assignment was planned against;
+            if missing, the version read by the request is used.
+    """
+    order = fields.Int(required=True, strict=True)
+    driver = fields.Int(strict=True, allow_none=True, load_default=None)
+    tractor_head = fields.Int(strict=True, allow_none=True, load_default=None)
+    trailer = fields.Int(strict=True, allow_none=True, load_default=None)
+    version = fields.Int(strict=True, allow_none=True, load_default=None)
@@ -0,0 +1,318 @@
+import threading
+from bisect import bisect_left, insort
+from collections import Counter
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from app import db
+from app.common.asset_status import TRAILER
+from app.common.changes import ORDERS, REFERENCE_DATA, get_change_counters, on_counters_committed
+from app.common.models import AssetStatus, TransportationOrder, Trailer
+
+# The counters covering every change of the trailers and their assignments.
+INDEX_COUNTERS = (ORDERS, REFERENCE_DATA)
+
+class TrailerBuckets:
+    """
+    Trailers grouped by type and sorted by capacity.
+
+    Finding the smallest trailer of a type able to carry a load is a binary
+    search over the (capacity, id) pairs of that type.
+
+    Attributes:
+        buckets (dict): Sorted (max_load_capacity, id) pairs, keyed by type.
+    """
+    def __init__(self, trailers=()):
+        """
+        Args:
+            trailers (iterable): (id, type, max_load_capacity) tuples.
+        """
+        self.buckets = {}
+        for trailer_id, trailer_type, capacity in trailers:
+            self.buckets.setdefault(trailer_type, []).append((capacity, trailer_id))
+        for bucket in self.buckets.values():
+            bucket.sort()
+
+    def add(self, trailer_id, trailer_type, capacity):
+        """
+        Add a trailer.
+
+        Args:
+            trailer_id (int): The ID of the trailer.
+            trailer_type (str): The type of the trailer.
+            capacity (int): The maximum load capacity of the trailer.
+        """
+        insort(self.buckets.setdefault(trailer_type, []), (capacity, trailer_id))
+
+    def remove(self, trailer_id, trailer_type, capacity):
+        """
+        Remove a trailer, if it is there.
+
+        Args:
+            trailer_id (int): The ID of the trailer.
+            trailer_type (str): The type of the trailer.
+            capacity (int): The maximum load capacity of the trailer.
+        """
+        bucket = self.buckets.get(trailer_type, [])
+        index = bisect_left(bucket, (capacity, trailer_id))
+        if index < len(bucket) and bucket[index] == (capacity, trailer_id):
+            del bucket[index]
+
+    def _fitting_index(self, trailer_type, load_weight):
+        bucket = self.buckets.get(trailer_type)
+        if not bucket:
+            return None, None
+        index = bisect_left(bucket, (load_weight,))
+        return bucket, index if index < len(bucket) else None
+
+    def smallest(self, trailer_type, load_weight):
+        """
+        Find the smallest trailer of a type able to carry a load.
+
+        Args:
+            trailer_type (str): The required type of the trailer.
+            load_weight (int): The weight of the load.
+
+        Returns:
+            int: The ID of the trailer, or None if no trailer is big enough.
+        """
+        bucket, index = self._fitting_index(trailer_type, load_weight)
+        return None if index is None else bucket[index][1]
+
+    def take(self, trailer_type, load_weight):
+        """
+        Remove and return the smallest trailer of a type able to carry a load.
+
+        Args:
+            trailer_type (str): The required type of the trailer.
+            load_weight (int): The weight of the load.
+
+        Returns:
+            int: The ID of the trailer, or None if no trailer is big enough.
+        """
+        bucket, index = self._fitting_index(trailer_type, load_weight)
+        return None if index is None else bucket.pop(index)[1]
+
+    def copy(self):
+        """
+        Copy the buckets, e.g. to take trailers from without changing these.
+
+        Returns:
+            TrailerBuckets: The copy.
+        """
+        buckets = TrailerBuckets()
+        buckets.buckets = {trailer_type: list(bucket) for trailer_type, bucket in self.buckets.items()}
+        return buckets
+
+class TrailerCapacityIndex:
+    """
+    In-memory index of the free trailers of a process, by type and capacity.
+
+    The index is loaded from the database once and then kept current with the
+    trailer and order changes committed by this process. It remembers the
+    versions of the order and reference data change counters it reflects;
+    when they do not match the database, because another process or a bulk
+    statement changed the data, it is loaded again on the next lookup. A
+    lookup therefore costs one counter query and a binary search.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._versions = None
+        self._trailers = {}
+        self._busy = Counter()
+        self._free = TrailerBuckets()
+        self.loads = 0
+
+    def _load(self):
+        trailers = {trailer_id: (trailer_type, capacity) for trailer_id, trailer_type, capacity in db.session.execute(
+            select(Trailer.id, Trailer.type, Trailer.max_load_capacity))}
+        busy = Counter(db.session.scalars(
+            select(AssetStatus.asset_id).where(AssetStatus.kind == TRAILER, AssetStatus.current_order.isnot(None))))
+        free = TrailerBuckets((trailer_id, trailer_type, capacity)
+                              for trailer_id, (trailer_type, capacity) in trailers.items() if trailer_id not in busy)
+        return trailers, busy, free
+
+    def _current(self):
+        if db.session.info.get("bumped_counters"):
+            # Uncommitted changes of the session must not end up in the shared index.
+            return self._load()[2]
+        # The counters and the trailers are read in the same transaction, so they match.
+        versions = dict(zip(INDEX_COUNTERS, get_change_counters(*INDEX_COUNTERS)[0]))
+        with self._lock:
+            if versions == self._versions:
+                return self._free
+        trailers, busy, free = self._load()
+        with self._lock:
+            self._versions, self._trailers, self._busy, self._free = versions, trailers, busy, free
+            self.loads += 1
+            return free
+
+    def free_trailers(self):
+        """
+        Get a copy of the free trailers.
+
+        Returns:
+            TrailerBuckets: The free trailers, which the caller may take trailers from.
+        """
+        free = self._current()
+        with self._lock:
+            return free.copy()
+
+    def smallest_free_trailer(self, trailer_type, load_weight):
+        """
+        Find the smallest free trailer of a type able to carry a load.
+
+        Args:
+            trailer_type (str): The required type of the trailer.
+            load_weight (int): The weight of the load.
+
+        Returns:
+            int: The ID of the trailer, or None if no free trailer is big enough.
+        """
+        free = self._current()
+        with self._lock:
+            return free.smallest(trailer_type, load_weight)
+
+    def apply(self, changes, counters):
+        """
+        Apply the trailer changes of a committed transaction.
+
+        The changes are only applied if the index was at the counter versions
+        the transaction started from; otherwise the index is loaded again on
+        the next lookup.
+
+        Args:
+            changes (list): ("put", id, type, capacity), ("drop", id), ("hold", id)
+                and ("release", id) tuples, in the order they were flushed, or
+                ("reload",) if a change could not be followed.
+            counters (dict): The (before, after) versions of the bumped counters.
+        """
+        with self._lock:
+            if self._versions is None:
+                return
+            if any(self._versions.get(name) != before for name, (before, _) in counters.items()
+                   if name in self._versions):
+                self._versions = None
+                return
+            if ("reload",) in changes:
+                self._versions = None
+                return
+            for change in changes:
+                getattr(self, f"_{change[0]}")(*change[1:])
+            for name, (_, after) in counters.items():
+                if name in self._versions:
+                    self._versions[name] = after
+
+    def _put(self, trailer_id, trailer_type, capacity):
+        previous = self._trailers.get(trailer_id)
+        if previous and not self._busy[trailer_id]:
+            self._free.remove(trailer_id, *previous)
+        self._trailers[trailer_id] = (trailer_type, capacity)
+        if not self._busy[trailer_id]:
+            self._free.add(trailer_id, trailer_type, capacity)
+
+    def _drop(self, trailer_id):
+        previous = self._trailers.pop(trailer_id, None)
+        if previous:
+            self._free.remove(trailer_id, *previous)
+
+    def _hold(self, trailer_id):
+        if not self._busy[trailer_id] and trailer_id in self._trailers:
+            self._free.remove(trailer_id, *self._trailers[trailer_id])
+        self._busy[trailer_id] += 1
+
+    def _release(self, trailer_id):
+        self._busy[trailer_id] -= 1
+        if self._busy[trailer_id] <= 0:
+            del self._busy[trailer_id]
+            if trailer_id in self._trailers:
+                self._free.add(trailer_id, *self._trailers[trailer_id])
+
+def get_trailer_index():
+    """
+    Get the trailer capacity index of the current application.
+
+    Returns:
+        TrailerCapacityIndex: The index.
+    """
+    return current_app.extensions["trailer_index"]
+
+def init_trailer_index(app):
+    """
+    Create the trailer capacity index of an application.
+
+    Args:
+        app (Flask): The Flask application instance.
+    """
+    app.extensions["trailer_index"] = TrailerCapacityIndex()
+
+def record_trailer_changes(session, changes):
+    """
+    Report trailer changes of bulk statements to the trailer capacity index.
+
+    They are applied when the session commits, if the counters bumped by the
+    statements are reported with record_bumped_counters().
+
+    Args:
+        session (Session): The session making the changes.
+        changes (list): Changes as taken by TrailerCapacityIndex.apply().
+    """
+    session.info.setdefault("trailer_changes", []).extend(changes)
+
+# Returned when the trailer of an order was not loaded, so the index cannot follow it.
+_UNKNOWN = object()
+
+def _held_trailer(session, order, values):
+    # The trailer an active order holds, given the old ("non_added") or new ("non_deleted") attribute values.
+    if (values == "non_added" and order in session.new) or (values == "non_deleted" and order in session.deleted):
+        return None
+    state = inspect(order)
+    trailer = getattr(state.attrs.trailer.history, values)()
+    completed = getattr(state.attrs.completed.history, values)()
+    if order not in session.new and not (trailer and completed):
+        return _UNKNOWN
+    if (completed and completed[0]) or not trailer:
+        return None
+    return trailer[0]
+
+@event.listens_for(TransportationOrder.completed, "set", active_history=True)
+@event.listens_for(TransportationOrder.trailer, "set", active_history=True)
+def _keep_previous_values(target, value, oldvalue, initiator):
+    # Active history loads the old values of expired orders, so flushes can tell which trailer is released.
+    pass
+
+@event.listens_for(Session, "after_flush")
+def _collect_trailer_changes(session, flush_context):
+    changes = []
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, Trailer):
+            if obj in session.deleted:
+                changes.append(("drop", obj.id))
+            elif obj in session.new or session.is_modified(obj, include_collections=False):
+                changes.append(("put", obj.id, obj.type, obj.max_load_capacity))
+        elif isinstance(obj, TransportationOrder):
+            before = _held_trailer(session, obj, "non_added")
+            after = _held_trailer(session, obj, "non_deleted")
+            if before is _UNKNOWN or after is _UNKNOWN:
+                changes.append(("reload",))
+            elif before != after:
+                if before is not None:
+                    changes.append(("release", before))
+                if after is not None:
+                    changes.append(("hold", after))
+    if changes:
+        record_trailer_changes(session, changes)
+
+def _apply_committed_changes(session, counters):
+    if has_app_context() and "trailer_index" in current_app.extensions:
+        get_trailer_index().apply(session.info.get("trailer_changes", []), counters)
+
+on_counters_committed(_apply_committed_changes)
+
+@event.listens_for(Session, "after_commit")
+def _discard_applied_changes(session):
+    session.info.pop("trailer_changes", None)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_rolled_back_changes(session):
+    session.info.pop("trailer_changes", None)
@@ -0,0 +1,94 @@
+from sqlalchemy import select
+from app import db
+from app.common.changes import REFERENCE_DATA, get_change_counters
+from app.common.models import TransportationOrder
+from app.common.reference import get_snapshots
+
+# Columns of an order the driver app shows; the companies and assets come from snapshots.
+CURRENT_ORDER_COLUMNS = [
+    TransportationOrder.id,
+    TransportationOrder.planned_delivery_date,
+    TransportationOrder.load_weight,
+    TransportationOrder.loading_place,
+    TransportationOrder.delivery_place,
+    TransportationOrder.tractor_head,
+    TransportationOrder.trailer,
+    TransportationOrder.version
+]
+
+def current_order_row(driver_id):
+    """
+    Read the driver app's columns of the active order of a driver.
+
+    A driver has at most one active order, so the lookup is a single probe of
+    the unique partial index on the drivers of active orders.
+
+    Args:
+        driver_id (int): The ID of the driver.
+
+    Returns:
+        Row: The order's columns, or None if the driver has no active order.
+    """
+    return db.session.execute(select(*CURRENT_ORDER_COLUMNS).where(
+        TransportationOrder.driver == driver_id, TransportationOrder.completed == False)).one_or_none()
+
+def current_order_etag(row):
+    """
+    Compute the ETag of the driver's current order.
+
+    The order's version changes with every write of the order, and the
+    reference data counter with every change of the companies and assets
+    shown with it.
+
+    Args:
+        row (Row): The order's columns, or None.
+
+    Returns:
+        tuple: The strong ETag, unquoted, and the version of the reference data
+            counter, for serialize_current_order().
+    """
+    (reference_version,), _ = get_change_counters(REFERENCE_DATA)
+    order = f"{row.id}-{row.version}" if row else "none"
+    return f"current-order-{order}-{reference_version}", reference_version
+
+def serialize_current_order(row, reference_version=None):
+    """
+    Serialize the driver's current order with the labels of its companies and assets.
+
+    Given the reference data version of the ETag, labels cached before
+    another process changed the reference data are loaded again.
+
+    Args:
+        row (Row): The order's columns, or None.
+        reference_version (int, optional): The reference data counter version the ETag was built from.
+
+    Returns:
+        dict: The order as a dictionary, or None.
+    """
+    if row is None:
+        return None
+    companies = get_snapshots("company", {row.loading_place, row.delivery_place}, reference_version)
+    tractor_heads = get_snapshots("tractor_head", [row.tractor_head] if row.tractor_head else [], reference_version)
+    trailers = get_snapshots("trailer", [row.trailer] if row.trailer else [], reference_version)
+    tractor_head = tractor_heads.get(row.tractor_head)
+    trailer = trailers.get(row.trailer)
+
+    def company(id):
+        snapshot = companies.get(id)
+        return {"id": id, "name": snapshot.company_name,
+                "address": f"{snapshot.street} {snapshot.street_number}, {snapshot.postal_code} {snapshot.town}, "
+                           f"{snapshot.country}",
+                "phone_number": snapshot.phone_number} if snapshot else None
+
+    return {
+        "id": row.id,
+        "planned_delivery_date": row.planned_delivery_date.isoformat(),
+        "load_weight": row.load_weight,
+        "loading_company": company(row.loading_place),
+        "delivery_company": company(row.delivery_place),
+        "tractor_head": {"id": tractor_head.id, "brand": tractor_head.brand,
+                         "registration_number": tractor_head.registration_number} if tractor_head else None,
+        "trailer": {"id": trailer.id, "type": trailer.type,
+                    "registration_number": trailer.registration_number} if trailer else None,
+        "version": row.version
+    }
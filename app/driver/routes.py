@@ -1,10 +1,16 @@
-from flask import render_template, redirect, url_for, flash, current_app
+from flask import request, render_template, redirect, url_for, flash, current_app, jsonify
 from flask_login import current_user, login_required
 from flask_wtf.csrf import generate_csrf
+from sqlalchemy.orm.exc import StaleDataError
 from app import db
 from app.common.permissions import role_required
 from app.common.models import TransportationOrder
+from app.common.changes import not_modified, cache_validators
+from app.common.concurrency import check_version, render_conflict
+from app.common.loaders import order_list_options
+from app.common.pagination import paginate
 from . import driver_bp
+from .current_order import current_order_etag, current_order_row, serialize_current_order
 
 @driver_bp.route("/current-order", methods=["GET"])
 @login_required
@@ -26,6 +32,28 @@ def current_transportation_order():
         return redirect(url_for("home"))
     return render_template("current_order.html", order=order)
 
+@driver_bp.route("/current-order.json", methods=["GET"])
+@login_required
+@role_required("driver")
+def current_transportation_order_json():
+    """
+    Return the current transportation order of the logged-in driver as compact JSON.
+
+    Only the fields the driver app shows are selected, and the companies and
+    assets come from the reference cache. The response carries a strong ETag
+    built from the order's version and the reference data counter, so an
+    unchanged order costs two indexed lookups and returns 304 Not Modified.
+
+    Returns:
+        Response: JSON with the order, null if the driver has no active order, or 304.
+    """
+    row = current_order_row(current_user.id)
+    etag, reference_version = current_order_etag(row)
+    response = not_modified(etag, None)
+    if response:
+        return response
+    return cache_validators(jsonify(order=serialize_current_order(row, reference_version)), etag, None)
+
 @driver_bp.route("/confirm-finish-order/<int:id>", methods=["GET"])
 @login_required
 @role_required("driver")
@@ -55,7 +83,9 @@ def finish_order(id):
 
     This route marks the specified transportation order as completed
     and updates the database. If an error occurs, a flash message is shown
-    and the user is redirected to the home page.
+    and the user is redirected to the home page. If the order has changed
+    since the confirmation page was shown, the page is shown again with
+    the current order.
 
     Args:
         id (int): The ID of the transportation order to be completed.
@@ -65,13 +95,17 @@ def finish_order(id):
     """
     try:
         current_order = TransportationOrder.query.get_or_404(id)
+        check_version(current_order, request.form.get("version", type=int))
         current_order.completed = True
         db.session.commit()
         flash("Transportation order has been completed.", "success")
+    except StaleDataError as e:
+        db.session.rollback()
+        current_app.logger.warning("Order %s finishing by driver %s - conflict: %s", id, current_user.id, e)
+        return render_conflict("confirm_finish_order.html", csrf_token=generate_csrf(), current_order=current_order)
     except Exception as e:
         db.session.rollback()
-        current_app.logger.exception(f"Error during {current_order} finishing by driver "
-                                     f"{current_user.first_name} {current_user.last_name}: {e}")
+        current_app.logger.exception("Error during order %s finishing by driver %s: %s", id, current_user.id, e)
         flash(f"Error: {e}, try again", "danger")
     return redirect(url_for("home"))
 
@@ -82,15 +116,18 @@ def completed_orders():
     """
     Display list of archived transportation orders for the logged-in driver.
 
-    This route fetches and displays all completed transportation orders assigned
-    to the driver.
+    This route fetches and displays a page of completed transportation orders assigned
+    to the driver, ordered by planned delivery date.
 
     Returns:
         str: Rendered HTML template displaying the list of archived orders.
     """
-    archived_orders = TransportationOrder.query.filter_by(driver=current_user.id, completed=True).order_by(TransportationOrder.planned_delivery_date).all()
-    if not archived_orders:
+    page = paginate(
+        TransportationOrder.query.options(*order_list_options()).filter_by(driver=current_user.id, completed=True),
+        [TransportationOrder.planned_delivery_date, TransportationOrder.id]
+    )
+    if not page.items:
         flash("You don’t have any archived orders", "info")
         return redirect(url_for("home"))
-    return render_template("archived_orders.html", archived_orders=archived_orders)
+    return render_template("archived_orders.html", archived_orders=page.items, page=page)
 
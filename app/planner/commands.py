@@ -0,0 +1,35 @@
+import click
+from marshmallow import ValidationError
+from app.common.bulk_import import register_import_command
+from . import planner_bp
+from .export import DEFAULT_EXPORT_BATCH_SIZE, export_rows, csv_chunks, gzip_chunks
+from .importers import company_importer
+from .schemas import ArchivedOrdersFilterSchema
+
+register_import_command(planner_bp.cli, "import-companies", company_importer,
+                        "Import companies from a CSV or JSON Lines file.")
+
+@planner_bp.cli.command("export-archive")
+@click.option("--output", "-o", type=click.File("wb"), default="-", help="The output file; standard output by default.")
+@click.option("--gzip", "compress", is_flag=True, help="Compress the output with gzip.")
+@click.option("--filter", "filters", multiple=True, metavar="NAME=VALUE",
+              help="A filter of the archive list, e.g. date_from=2024-01-01. Can be repeated.")
+@click.option("--batch-size", type=int, default=DEFAULT_EXPORT_BATCH_SIZE, show_default=True,
+              help="The number of rows fetched from the database at once.")
+def export_archive(output, compress, filters, batch_size):
+    """
+    Export archived transportation orders as CSV.
+    """
+    try:
+        filters = ArchivedOrdersFilterSchema().load(dict(item.split("=", 1) for item in filters))
+    except ValidationError as e:
+        raise click.BadParameter(str(e.messages), param_hint="--filter")
+    except ValueError:
+        raise click.BadParameter("Filters must be given as NAME=VALUE.", param_hint="--filter")
+    chunks = csv_chunks(export_rows(filters, batch_size))
+    if compress:
+        for data in gzip_chunks(chunks):
+            output.write(data)
+    else:
+        for chunk in chunks:
+            output.write(chunk.encode("utf-8"))
@@ -0,0 +1,115 @@
+import csv
+import io
+import zlib
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from app import db
+from app.common.models import TransportationOrder, User, Trailer
+from app.dispatcher.models import TractorHead
+from .filters import apply_order_filters
+from .models import Company
+
+DEFAULT_EXPORT_BATCH_SIZE = 1000
+# Size of the CSV text collected before it is sent, in characters.
+CHUNK_SIZE = 64 * 1024
+
+EXPORT_COLUMNS = [
+    "id", "creation_date", "planned_delivery_date", "trailer_type", "load_weight",
+    "loading_company", "loading_town", "delivery_company", "delivery_town",
+    "driver", "tractor_head", "trailer"
+]
+
+def export_query(filters):
+    """
+    Build the query of the archive export.
+
+    Company, driver and vehicle names are joined in SQL, so every exported
+    row comes from a single query instead of loading related objects.
+
+    Args:
+        filters (dict): Filters loaded with ArchivedOrdersFilterSchema.
+
+    Returns:
+        Select: Query yielding one row per completed order, in EXPORT_COLUMNS order.
+    """
+    loading = aliased(Company)
+    delivery = aliased(Company)
+    query = select(
+        TransportationOrder.id,
+        TransportationOrder.creation_date,
+        TransportationOrder.planned_delivery_date,
+        TransportationOrder.trailer_type,
+        TransportationOrder.load_weight,
+        loading.company_name,
+        loading.town,
+        delivery.company_name,
+        delivery.town,
+        (User.first_name + " " + User.last_name),
+        TractorHead.registration_number,
+        Trailer.registration_number
+    ).join(
+        loading, TransportationOrder.loading_place == loading.id
+    ).join(
+        delivery, TransportationOrder.delivery_place == delivery.id
+    ).outerjoin(
+        User, TransportationOrder.driver == User.id
+    ).outerjoin(
+        TractorHead, TransportationOrder.tractor_head == TractorHead.id
+    ).outerjoin(
+        Trailer, TransportationOrder.trailer == Trailer.id
+    ).where(TransportationOrder.completed == True)
+    return apply_order_filters(query, filters).order_by(TransportationOrder.creation_date, TransportationOrder.id)
+
+def export_rows(filters, batch_size=DEFAULT_EXPORT_BATCH_SIZE):
+    """
+    Read the exported rows in batches.
+
+    The rows are fetched batch_size at a time from a server-side cursor where
+    the database supports one, so memory use does not grow with the archive.
+
+    Args:
+        filters (dict): Filters loaded with ArchivedOrdersFilterSchema.
+        batch_size (int): The number of rows fetched at once.
+
+    Yields:
+        Row: The exported rows.
+    """
+    yield from db.session.execute(export_query(filters).execution_options(yield_per=batch_size))
+
+def csv_chunks(rows):
+    """
+    Write rows as CSV text with a header row, in chunks of about CHUNK_SIZE characters.
+
+    Args:
+        rows (iterable): The rows, in EXPORT_COLUMNS order.
+
+    Yields:
+        str: The CSV text.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def gzip_chunks(chunks):
+    """
+    Compress text chunks into a gzip stream as they come.
+
+    Args:
+        chunks (iterable): The UTF-8 text to compress.
+
+    Yields:
+        bytes: The gzip data.
+    """
+    compressor = zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode("utf-8"))
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,33 @@
+from app.common.models import TransportationOrder
+
+def apply_order_filters(query, filters):
+    """
+    Narrow a transportation order query with validated filters.
+
+    Every filter becomes a SQL condition, so the database picks a supporting
+    index and only matching rows are loaded.
+
+    Args:
+        query (Query): The transportation order query to narrow.
+        filters (dict): Filters loaded with ArchivedOrdersFilterSchema.
+
+    Returns:
+        Query: The filtered query.
+    """
+    if "date_from" in filters:
+        query = query.filter(TransportationOrder.planned_delivery_date >= filters["date_from"])
+    if "date_to" in filters:
+        query = query.filter(TransportationOrder.planned_delivery_date <= filters["date_to"])
+    if "trailer_type" in filters:
+        query = query.filter(TransportationOrder.trailer_type == filters["trailer_type"])
+    if "loading_place" in filters:
+        query = query.filter(TransportationOrder.loading_place == filters["loading_place"])
+    if "delivery_place" in filters:
+        query = query.filter(TransportationOrder.delivery_place == filters["delivery_place"])
+    if "driver" in filters:
+        query = query.filter(TransportationOrder.driver == filters["driver"])
+    if "min_weight" in filters:
+        query = query.filter(TransportationOrder.load_weight >= filters["min_weight"])
+    if "max_weight" in filters:
+        query = query.filter(TransportationOrder.load_weight <= filters["max_weight"])
+    return query
@@ -1,7 +1,8 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, IntegerField, SubmitField, SelectField, DateField
-from app.common.models import Trailer
-from .models import Company
+from wtforms.widgets import HiddenInput
+from app.common.choices import trailer_type_choices, driver_choices
+from .search import company_labels
 
 class CompanyForm(FlaskForm):
     """
@@ -17,6 +18,7 @@ class CompanyForm(FlaskForm):
     street = StringField("Street")
     street_number = IntegerField("Street number")
     phone_number = StringField("Phone number")
+    version = IntegerField("Version", widget=HiddenInput())
     submit = SubmitField("Submit")
 
 class TransportationOrderForm(FlaskForm):
@@ -25,25 +27,61 @@ class TransportationOrderForm(FlaskForm):
 
     This form collects information about the transportation order including
     planned delivery date, trailer type, load weight, and places for loading
-    and delivery.
+    and delivery. Loading and delivery places are picked with the company
+    search instead of a dropdown of all companies.
     """
     planned_delivery_date = DateField("Planned delivery date")
     trailer_type = SelectField("Trailer type", choices=[])
     load_weight = IntegerField("Load weight")
-    loading_place = SelectField("Loading place", choices=[])
-    delivery_place = SelectField("Delivery place", choices=[])
+    loading_place = IntegerField("Loading place", widget=HiddenInput())
+    delivery_place = IntegerField("Delivery place", widget=HiddenInput())
+    version = IntegerField("Version", widget=HiddenInput())
     submit = SubmitField("Submit")
 
     def __init__(self, *args, **kwargs):
         """
-        Initialize the form with choices for loading and delivery places
-        and trailer types.
+        Initialize the form with choices for trailer types and labels of
+        the selected loading and delivery places.
 
-        This method queries the database to populate the choices for loading
-        and delivery places and trailer types.
+        Trailer types and company labels come from the form choices cache, so
+        they are only queried when missing or changed.
         """
         super(TransportationOrderForm, self).__init__(*args, **kwargs)
-        self.loading_place.choices = [(c.id, c.company_name) for c in Company.query.all()]
-        self.delivery_place.choices = [(c.id, c.company_name) for c in Company.query.all()]
-        self.trailer_type.choices = [t.type for t in Trailer.query.group_by(Trailer.type)]
+        labels = company_labels([self.loading_place.data, self.delivery_place.data])
+        self.loading_place_label = labels.get(self.loading_place.data, "")
+        self.delivery_place_label = labels.get(self.delivery_place.data, "")
+        self.trailer_type.choices = trailer_type_choices()
 
+class ArchivedOrdersFilterForm(FlaskForm):
+    """
+    Form for filtering the archived transportation orders.
+
+    The form is submitted with GET, so the filters end up in the query string
+    and are kept when moving between pages of the archive.
+    """
+    class Meta:
+        csrf = False
+
+    date_from = DateField("Delivery date from")
+    date_to = DateField("Delivery date to")
+    trailer_type = SelectField("Trailer type", choices=[])
+    loading_place = IntegerField("Loading place", widget=HiddenInput())
+    delivery_place = IntegerField("Delivery place", widget=HiddenInput())
+    driver = SelectField("Driver", choices=[])
+    min_weight = IntegerField("Min load weight")
+    max_weight = IntegerField("Max load weight")
+    submit = SubmitField("Filter")
+
+    def __init__(self, *args, **kwargs):
+        """
+        Initialize the form with choices for trailer types and drivers and
+        labels of the selected loading and delivery places.
+
+        Choices come from the form choices cache, so they are not queried on every request.
+        """
+        super(ArchivedOrdersFilterForm, self).__init__(*args, **kwargs)
+        labels = company_labels([self.loading_place.data, self.delivery_place.data])
+        self.loading_place_label = labels.get(self.loading_place.data, "")
+        self.delivery_place_label = labels.get(self.delivery_place.data, "")
+        self.trailer_type.choices = [("", "Any")] + [(t, t) for t in trailer_type_choices()]
+        self.driver.choices = [("", "Any")] + [(str(id), name) for id, name in driver_choices()]
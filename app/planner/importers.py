@@ -0,0 +1,58 @@
+from sqlalchemy import select
+from app import db
+from app.common.bulk_import import BulkImporter
+from app.common.changes import record_order_changes
+from app.common.models import TransportationOrder
+from app.common.schemas import TransportationOrderSchema
+from .models import Company
+from .schemas import CompanySchema
+
+# Orders are assigned to drivers and vehicles by dispatchers, not in manifests.
+ASSIGNMENT_FIELDS = ("tractor_head", "trailer", "driver", "completed")
+
+class OrderImporter(BulkImporter):
+    """
+    Imports transportation orders from shippers' manifests.
+
+    Loading and delivery places are company IDs. The companies of a chunk
+    are looked up with a single query, and rows referring to missing
+    companies are rejected. Inserted orders are added to the order feed.
+    """
+    def __init__(self):
+        super().__init__(TransportationOrder, TransportationOrderSchema(exclude=ASSIGNMENT_FIELDS))
+
+    def check_rows(self, rows, seen, result):
+        """
+        Reject orders whose loading or delivery place is not an existing company.
+
+        Args:
+            rows (list): (line number, row) pairs of a chunk.
+            seen (set): Unused; orders have no unique columns.
+            result (ImportResult): The result to record rejected rows in.
+
+        Returns:
+            list: The (line number, row) pairs to insert.
+        """
+        ids = {row[field] for _, row in rows for field in ("loading_place", "delivery_place")}
+        existing = set(db.session.scalars(select(Company.id).where(Company.id.in_(ids)))) if ids else set()
+        valid = []
+        for line, row in rows:
+            errors = {field: [f"Company {row[field]} does not exist."]
+                      for field in ("loading_place", "delivery_place") if row[field] not in existing}
+            if errors:
+                result.add_error(line, errors)
+            else:
+                valid.append((line, row))
+        return valid
+
+    def inserted(self, ids):
+        """
+        Add the inserted orders to the order feed.
+
+        Args:
+            ids (list): The IDs of the orders.
+        """
+        record_order_changes(db.session, [(id, "created") for id in ids])
+
+company_importer = BulkImporter(Company, CompanySchema())
+order_importer = OrderImporter()
@@ -1,6 +1,7 @@
 from app import db
+from app.common.models import VersionedMixin
 
-class Company(db.Model):
+class Company(VersionedMixin, db.Model):
     """
     Represents a company entity in the database.
 
@@ -1,17 +1,28 @@
-from flask import request, render_template, redirect, url_for, flash, current_app
+from flask import (request, render_template, redirect, url_for, flash, current_app, jsonify, Response,
+                   stream_with_context)
 from flask_wtf.csrf import generate_csrf
 from flask_login import login_required, current_user
 from marshmallow import ValidationError
+from sqlalchemy.orm.exc import StaleDataError
 from datetime import date
 from app import db
 from app.common.permissions import role_required
 from app.common.models import TransportationOrder
+from app.common.loaders import order_list_options
+from app.common.pagination import paginate
+from app.common.reference import get_snapshot_or_404
 from app.common.schemas import TransportationOrderSchema
 from app.common.custom_utils import send_validation_errors_to_form
+from app.common.concurrency import check_version, render_conflict
+from app.common.bulk_import import import_upload
 from . import planner_bp
 from .models import Company
-from .forms import CompanyForm, TransportationOrderForm
-from .schemas import CompanySchema
+from .forms import CompanyForm, TransportationOrderForm, ArchivedOrdersFilterForm
+from .schemas import CompanySchema, ArchivedOrdersFilterSchema
+from .filters import apply_order_filters
+from .search import search_companies, SEARCH_LIMIT
+from .importers import company_importer, order_importer
+from .export import DEFAULT_EXPORT_BATCH_SIZE, export_rows, csv_chunks, gzip_chunks
 
 @planner_bp.route("/companies/new", methods=["GET", "POST"])
 @login_required
@@ -47,10 +58,10 @@ def new_company():
             return redirect(url_for("home"))
         except ValidationError as e:
             send_validation_errors_to_form(e, form)
-            current_app.logger.exception(f"New company - validation error: {e}")
+            current_app.logger.exception("New company - validation error: %s", e)
         except Exception as e:
             db.session.rollback()
-            current_app.logger.exception(f"Error during new company adding: {e}")
+            current_app.logger.exception("Error during new company adding: %s", e)
             flash(f"Error: {e}, try again", "danger")
     return render_template("company_form.html", form=form, title="New Company")
 
@@ -61,15 +72,44 @@ def companies():
     """
     Display list of all companies.
 
-    This route fetches all companies from the database and displays them.
+    This route fetches a page of companies from the database and displays them.
 
     Returns:
         str: Rendered HTML template displaying the list of companies.
     """
-    all_companies = Company.query.all()
-    if not all_companies:
+    page = paginate(Company.query, [Company.id])
+    if not page.items:
         flash("Companies list is empty.", "info")
-    return render_template("companies_list.html", companies=all_companies)
+    return render_template("companies_list.html", companies=page.items, page=page)
+
+@planner_bp.route("/companies/search", methods=["GET"])
+@login_required
+@role_required("planner")
+def company_search():
+    """
+    Search companies for the company pickers of the planner forms.
+
+    This route returns companies whose name, town, postal code or street start
+    with the words given in the "q" query argument, best matches first.
+
+    Returns:
+        Response: JSON list of objects with the company "id" and "label".
+    """
+    term = request.args.get("q", "")
+    limit = max(1, min(request.args.get("limit", SEARCH_LIMIT, type=int), SEARCH_LIMIT))
+    return jsonify([{"id": id, "label": label} for id, label in search_companies(term, limit)])
+
+@planner_bp.route("/companies/import", methods=["POST"])
+@login_required
+@role_required("planner")
+def import_companies():
+    """
+    Import companies from an uploaded CSV or JSON Lines file.
+
+    Returns:
+        Response: JSON with the numbers of imported and rejected rows and the errors of the rejected ones.
+    """
+    return import_upload(company_importer)
 
 @planner_bp.route("/companies/<int:id>", methods=["GET"])
 @login_required
@@ -86,7 +126,7 @@ def company_details(id):
     Returns:
         str: Rendered HTML template displaying the company details.
     """
-    company = Company.query.get_or_404(id)
+    company = get_snapshot_or_404("company", id)
     return render_template("company_details.html", company=company)
 
 @planner_bp.route("/companies/edit/<int:id>", methods=["GET", "POST"])
@@ -119,6 +159,7 @@ def edit_company(id):
             "phone_number": form.phone_number.data
         }
         try:
+            check_version(company, form.version.data)
             result = schema.load(company_data)
             company.company_name = result["company_name"]
             company.country = result["country"]
@@ -132,10 +173,15 @@ def edit_company(id):
             return redirect(url_for("planner.companies"))
         except ValidationError as e:
             send_validation_errors_to_form(e, form)
-            current_app.logger.exception(f"Edit {company} - validation error: {e}")
+            current_app.logger.exception("Edit company %s - validation error: %s", id, e)
+        except StaleDataError as e:
+            db.session.rollback()
+            current_app.logger.warning("Edit company %s - conflict: %s", id, e)
+            form = CompanyForm(formdata=None, obj=company)
+            return render_conflict("company_form.html", form=form, title="Edit Company")
         except Exception as e:
             db.session.rollback()
-            current_app.logger.exception(f"Error during {company} editing: {e}")
+            current_app.logger.exception("Error during company %s editing: %s", id, e)
             flash(f"Error: {e}, try again", "danger")
     return render_template("company_form.html", form=form, title="Edit Company")
 
@@ -180,7 +226,7 @@ def delete_company(id):
         flash("Company has been deleted.", "success")
     except Exception as e:
         db.session.rollback()
-        current_app.logger.exception(f"Error during {company} deleting: {e}")
+        current_app.logger.exception("Error during company %s deleting: %s", id, e)
         flash(f"Error: {e}, try again", "danger")
     return redirect(url_for("planner.companies"))
 
@@ -218,10 +264,10 @@ def new_transportation_order():
             return redirect(url_for("home"))
         except ValidationError as e:
             send_validation_errors_to_form(e, form)
-            current_app.logger.exception(f"New transportation order (planner) - validation error: {e}")
+            current_app.logger.exception("New transportation order (planner) - validation error: %s", e)
         except Exception as e:
             db.session.rollback()
-            current_app.logger.exception(f"Error during new transportation order adding: {e}")
+            current_app.logger.exception("Error during new transportation order adding: %s", e)
             flash(f"Error: {e}, try again", "danger")
     return render_template("transportation_order_form.html", form=form, title="New Transportation Order")
 
@@ -232,15 +278,34 @@ def transportation_orders():
     """
     Display list of all transportation orders.
 
-    This route fetches all incomplete transportation orders from the database and displays them.
+    This route fetches a page of incomplete transportation orders from the database, ordered
+    by creation date, and displays them.
 
     Returns:
         str: Rendered HTML template displaying the list of transportation orders.
     """
-    all_orders = TransportationOrder.query.filter_by(completed=False).order_by(TransportationOrder.creation_date).all()
-    if not all_orders:
+    page = paginate(
+        TransportationOrder.query.options(*order_list_options()).filter_by(completed=False),
+        [TransportationOrder.creation_date, TransportationOrder.id]
+    )
+    if not page.items:
         flash("Orders list is empty.", "info")
-    return render_template("transportation_orders_list.html", orders=all_orders, title="Transportation Orders")
+    return render_template("transportation_orders_list.html", orders=page.items, page=page, title="Transportation Orders")
+
+@planner_bp.route("/transportation_orders/import", methods=["POST"])
+@login_required
+@role_required("planner")
+def import_transportation_orders():
+    """
+    Create transportation orders in bulk from a JSON array or an uploaded CSV or JSON Lines file.
+
+    Each row has the fields of the order form. The orders are created by the
+    logged-in planner today, whatever the rows say.
+
+    Returns:
+        Response: JSON with the IDs of the created orders and the errors of the rejected rows.
+    """
+    return import_upload(order_importer, defaults={"created_by": current_user.id, "creation_date": str(date.today())})
 
 @planner_bp.route("/transportation_orders/<int:id>", methods=["GET"])
 @login_required
@@ -291,6 +356,7 @@ def edit_transportation_order(id):
             "delivery_place": form.delivery_place.data
         }
         try:
+            check_version(order, form.version.data)
             result = schema.load(transportation_order_data)
             order.planned_delivery_date = result["planned_delivery_date"]
             order.trailer_type = result["trailer_type"]
@@ -302,10 +368,15 @@ def edit_transportation_order(id):
             return redirect(url_for("planner.transportation_orders"))
         except ValidationError as e:
             send_validation_errors_to_form(e, form)
-            current_app.logger.exception(f"Edit {order} (planner) - validation error: {e}")
+            current_app.logger.exception("Edit order %s (planner) - validation error: %s", id, e)
+        except StaleDataError as e:
+            db.session.rollback()
+            current_app.logger.warning("Edit order %s (planner) - conflict: %s", id, e)
+            form = TransportationOrderForm(formdata=None, obj=order)
+            return render_conflict("transportation_order_form.html", form=form, title="Edit Transportation Order")
         except Exception as e:
             db.session.rollback()
-            current_app.logger.exception(f"Error during {order} editing: {e}")
+            current_app.logger.exception("Error during order %s editing: %s", id, e)
             flash(f"Error: {e}, try again", "danger")
     return render_template("transportation_order_form.html", form=form, title="Edit Transportation Order")
 
@@ -350,7 +421,7 @@ def delete_transportation_order(id):
         flash("Transportation order has been deleted.", "success")
     except Exception as e:
         db.session.rollback()
-        current_app.logger.exception(f"Error during {order} deleting: {e}")
+        current_app.logger.exception("Error during order %s deleting: %s", id, e)
         flash(f"Error: {e}, try again", "danger")
     return redirect(url_for("planner.transportation_orders"))
 
@@ -361,15 +432,59 @@ def archived_transportation_orders():
     """
     Display list of archived transportation orders.
 
-    This route fetches all completed transportation orders from the database and displays them.
+    This route fetches a page of completed transportation orders from the database, ordered
+    by creation date, and displays them. The orders can be filtered by planned delivery date
+    range, trailer type, loading and delivery company, driver and load weight range with
+    query arguments; the filters are applied in the database query.
 
     Returns:
         str: Rendered HTML template displaying the list of archived transportation orders.
     """
-    archived_orders = TransportationOrder.query.filter_by(completed=True).order_by(TransportationOrder.creation_date).all()
-    if not archived_orders:
+    form = ArchivedOrdersFilterForm(request.args)
+    schema = ArchivedOrdersFilterSchema()
+    filters = {}
+    try:
+        filters = schema.load({key: value for key, value in request.args.items() if value})
+    except ValidationError as e:
+        send_validation_errors_to_form(e, form)
+    query = apply_order_filters(
+        TransportationOrder.query.options(*order_list_options()).filter_by(completed=True),
+        filters
+    )
+    page = paginate(query, [TransportationOrder.creation_date, TransportationOrder.id])
+    if not page.items:
         flash("There are no archived transportation orders", "info")
-    return render_template("transportation_orders_list.html", orders=archived_orders, title="Archived Transportation Orders")
+    export_url = url_for("planner.export_archived_transportation_orders",
+                         **{key: value for key, value in request.args.items() if key not in ("after", "before")})
+    return render_template("transportation_orders_list.html", orders=page.items, page=page, filter_form=form,
+                           export_url=export_url, title="Archived Transportation Orders")
 
 
 
+
+@planner_bp.route("/transportation_orders/archived/export", methods=["GET"])
+@login_required
+@role_required("planner")
+def export_archived_transportation_orders():
+    """
+    Export archived transportation orders as a CSV file.
+
+    The export takes the same filters as the archive list. Rows are streamed
+    from the database in batches of EXPORT_BATCH_SIZE and written to the
+    response as they come, so memory use does not depend on the size of the
+    archive. With the "gzip" query argument, the file is gzip-compressed.
+
+    Returns:
+        Response: The streamed CSV file, or the filter errors with status 400.
+    """
+    try:
+        filters = ArchivedOrdersFilterSchema().load({key: value for key, value in request.args.items() if value})
+    except ValidationError as e:
+        return jsonify(errors=e.messages), 400
+    chunks = csv_chunks(export_rows(filters, current_app.config.get("EXPORT_BATCH_SIZE", DEFAULT_EXPORT_BATCH_SIZE)))
+    filename, mimetype = "archived_orders.csv", "text/csv"
+    if request.args.get("gzip"):
+        chunks = gzip_chunks(chunks)
+        filename, mimetype = filename + ".gz", "application/gzip"
+    return Response(stream_with_context(chunks), mimetype=mimetype,
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"'})
@@ -1,4 +1,4 @@
-from marshmallow import Schema, fields, validate, validates, ValidationError
+from marshmallow import Schema, fields, validate, validates, validates_schema, ValidationError, EXCLUDE
 from app.common.custom_utils import not_blank
 
 class CompanySchema(Schema):
@@ -41,3 +41,47 @@ class CompanySchema(Schema):
         if not value.isdigit() and not (value.startswith('+') and value[1:].isdigit()):
             raise ValidationError("Phone number must contain only digits and optional leading '+'.")
 
+class ArchivedOrdersFilterSchema(Schema):
+    """
+    Schema for validating filters of the archived transportation orders.
+
+    All filters are optional. Unknown query arguments (e.g. pagination cursors)
+    are ignored.
+
+    Attributes:
+        date_from (date): Earliest planned delivery date.
+        date_to (date): Latest planned delivery date.
+        trailer_type (str): The type of trailer used by the orders.
+        loading_place (int): The ID of the loading company.
+        delivery_place (int): The ID of the delivery company.
+        driver (int): The ID of the driver.
+        min_weight (int): The minimal load weight.
+        max_weight (int): The maximal load weight.
+    """
+    class Meta:
+        unknown = EXCLUDE
+
+    date_from = fields.Date()
+    date_to = fields.Date()
+    trailer_type = fields.Str(validate=[validate.Length(max=16)])
+    loading_place = fields.Int()
+    delivery_place = fields.Int()
+    driver = fields.Int()
+    min_weight = fields.Int(validate=[validate.Range(min=0)])
+    max_weight = fields.Int(validate=[validate.Range(min=0)])
+
+    @validates_schema
+    def validate_ranges(self, data, **kwargs):
+        """
+        Validate that the date and weight ranges are not reversed.
+
+        Args:
+            data (dict): The deserialized filters.
+
+        Raises:
+            ValidationError: If a range starts after it ends.
+        """
+        if "date_from" in data and "date_to" in data and data["date_from"] > data["date_to"]:
+            raise ValidationError("The start date must not be after the end date.", "date_to")
+        if "min_weight" in data and "max_weight" in data and data["min_weight"] > data["max_weight"]:
+            raise ValidationError("The minimal weight must not be greater than the maximal weight.", "max_weight")
@@ -0,0 +1,137 @@
+import re
+from sqlalchemy import DDL, event, or_, text
+from app import db
+from app.common.reference import get_snapshots
+from .models import Company
+
+SEARCH_TABLE = "company_search"
+SEARCH_LIMIT = 20
+
+# External-content FTS5 index over the searchable company columns. The prefix
+# option keeps 2 and 3 character prefix indexes so short prefix queries do not
+# have to scan the whole term list.
+CREATE_SEARCH_TABLE = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+    company_name, town, postal_code, street,
+    content='company', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+)
+"""
+
+CREATE_SEARCH_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_after_insert AFTER INSERT ON company BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, company_name, town, postal_code, street)
+        VALUES (new.id, new.company_name, new.town, new.postal_code, new.street);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_after_delete AFTER DELETE ON company BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, company_name, town, postal_code, street)
+        VALUES ('delete', old.id, old.company_name, old.town, old.postal_code, old.street);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_after_update AFTER UPDATE ON company BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, company_name, town, postal_code, street)
+        VALUES ('delete', old.id, old.company_name, old.town, old.postal_code, old.street);
+        INSERT INTO {SEARCH_TABLE}(rowid, company_name, town, postal_code, street)
+        VALUES (new.id, new.company_name, new.town, new.postal_code, new.street);
+    END
+    """
+]
+
+DROP_SEARCH_TABLE = f"DROP TABLE IF EXISTS {SEARCH_TABLE}"
+
+# Keep the search index in step with db.create_all()/db.drop_all(); deployed
+# databases get the same objects from the migration.
+event.listen(Company.__table__, "after_create", DDL(CREATE_SEARCH_TABLE).execute_if(dialect="sqlite"))
+for trigger in CREATE_SEARCH_TRIGGERS:
+    event.listen(Company.__table__, "after_create", DDL(trigger).execute_if(dialect="sqlite"))
+event.listen(Company.__table__, "before_drop", DDL(DROP_SEARCH_TABLE).execute_if(dialect="sqlite"))
+
+def build_match_query(term):
+    """
+    Build an FTS5 MATCH expression of prefix queries from user input.
+
+    Every word of the input becomes a quoted prefix query, so punctuation in
+    the input cannot be interpreted as FTS5 syntax.
+
+    Args:
+        term (str): The text typed by the user.
+
+    Returns:
+        str: The MATCH expression, or an empty string if there is nothing to search for.
+    """
+    words = re.findall(r"\w+", term)
+    return " ".join(f'"{word}"*' for word in words)
+
+def company_label(company_name, town, postal_code, street):
+    """
+    Build the label a company is shown with in search results.
+
+    Args:
+        company_name (str): The name of the company.
+        town (str): The town where the company is located.
+        postal_code (str): The postal code of the company's address.
+        street (str): The street name of the company's address.
+
+    Returns:
+        str: The label of the company.
+    """
+    return f"{company_name}, {postal_code} {town}, {street}"
+
+def search_companies(term, limit=SEARCH_LIMIT):
+    """
+    Search companies by prefixes of their name, town, postal code and street.
+
+    On SQLite the FTS5 index is used and matches are ranked with bm25, with
+    the company name weighted the most. Other databases fall back to prefix
+    LIKE queries.
+
+    Args:
+        term (str): The text typed by the user.
+        limit (int): The maximum number of results.
+
+    Returns:
+        list: A list of (id, label) tuples of matching companies.
+    """
+    match = build_match_query(term)
+    if not match:
+        return []
+    if db.engine.dialect.name == "sqlite":
+        rows = db.session.execute(text(
+            f"SELECT company.id, company.company_name, company.town, company.postal_code, company.street "
+            f"FROM {SEARCH_TABLE} JOIN company ON company.id = {SEARCH_TABLE}.rowid "
+            f"WHERE {SEARCH_TABLE} MATCH :match "
+            f"ORDER BY bm25({SEARCH_TABLE}, 10.0, 2.0, 2.0, 1.0) LIMIT :limit"
+        ), {"match": match, "limit": limit})
+    else:
+        conditions = [
+            or_(*[column.ilike(f"{word}%") for column in
+                  (Company.company_name, Company.town, Company.postal_code, Company.street)])
+            for word in re.findall(r"\w+", term)
+        ]
+        rows = db.session.query(
+            Company.id, Company.company_name, Company.town, Company.postal_code, Company.street
+        ).filter(*conditions).order_by(Company.company_name).limit(limit)
+    return [(id, company_label(name, town, postal_code, street)) for id, name, town, postal_code, street in rows]
+
+def company_labels(ids):
+    """
+    Get search labels of the given companies.
+
+    Labels are built from the cached company snapshots; only companies not
+    cached yet are loaded, with a single query.
+
+    Args:
+        ids (list): The IDs of the companies; None values are skipped.
+
+    Returns:
+        dict: Labels of the existing companies keyed by their IDs.
+    """
+    ids = [id for id in ids if id]
+    if not ids:
+        return {}
+    return {id: company_label(company.company_name, company.town, company.postal_code, company.street)
+            for id, company in get_snapshots("company", ids).items()}
@@ -0,0 +1,35 @@
+// Company pickers: a search input with suggestions from the company search
+// endpoint, storing the ID of the chosen company in a hidden input.
+document.querySelectorAll("[data-company-search]").forEach(function (input) {
+    const target = document.getElementById(input.dataset.target);
+    const options = document.getElementById(input.getAttribute("list"));
+    let timer = null;
+
+    input.addEventListener("input", function () {
+        const chosen = Array.from(options.options).find(function (option) {
+            return option.value === input.value;
+        });
+        if (chosen) {
+            target.value = chosen.dataset.id;
+            return;
+        }
+        target.value = "";
+        clearTimeout(timer);
+        if (input.value.trim().length < 2) {
+            return;
+        }
+        timer = setTimeout(function () {
+            fetch(input.dataset.companySearch + "?q=" + encodeURIComponent(input.value))
+                .then(function (response) { return response.json(); })
+                .then(function (companies) {
+                    options.innerHTML = "";
+                    companies.forEach(function (company) {
+                        const option = document.createElement("option");
+                        option.value = company.label;
+                        option.dataset.id = company.id;
+                        options.appendChild(option);
+                    });
+                });
+        }, 150);
+    });
+});
@@ -0,0 +1,68 @@
+// Dispatcher board: patches the rows of the page with the changes streamed
+// from the order feed instead of reloading the whole list.
+document.querySelectorAll("[data-order-board]").forEach(function (list) {
+    const firstPage = list.dataset.firstPage === "true";
+    const lastPage = list.dataset.lastPage === "true";
+
+    function text(value) {
+        return value === null || value === undefined ? "" : value;
+    }
+
+    function paragraph(label, values) {
+        const p = document.createElement("p");
+        p.textContent = "Actually assigned " + label + ": " + values.map(text).join(" ");
+        return p;
+    }
+
+    function render(order) {
+        const item = document.createElement("li");
+        item.className = "order-item";
+        item.dataset.orderId = order.id;
+        item.dataset.date = order.planned_delivery_date;
+        const link = document.createElement("a");
+        link.href = list.dataset.completeUrl.replace(/\/0$/, "/" + order.id);
+        link.textContent = order.planned_delivery_date + " : " + text(order.loading_company.name) +
+            " ---> " + text(order.delivery_company.name);
+        const driver = order.driver || {};
+        const tractorHead = order.tractor_head || {};
+        const trailer = order.trailer || {};
+        item.append(
+            link,
+            paragraph("driver", [driver.name]),
+            paragraph("tractor head", [tractorHead.brand, tractorHead.registration_number]),
+            paragraph("trailer", [trailer.type, trailer.registration_number])
+        );
+        return item;
+    }
+
+    // Rows are ordered by planned delivery date, then ID, like the page.
+    function comesAfter(item, order) {
+        const date = item.dataset.date;
+        return date > order.planned_delivery_date ||
+            (date === order.planned_delivery_date && Number(item.dataset.orderId) > order.id);
+    }
+
+    function apply(delta) {
+        const current = list.querySelector('[data-order-id="' + delta.id + '"]');
+        if (current) {
+            current.remove();
+        }
+        if (!delta.order) {
+            return;
+        }
+        const next = Array.from(list.children).find(function (item) {
+            return comesAfter(item, delta.order);
+        });
+        // Orders outside the rows of the page belong to another page, unless it is the first or last one.
+        if (next && (next !== list.firstElementChild || firstPage)) {
+            list.insertBefore(render(delta.order), next);
+        } else if (!next && lastPage) {
+            list.appendChild(render(delta.order));
+        }
+    }
+
+    const source = new EventSource(list.dataset.orderBoard);
+    source.addEventListener("changes", function (event) {
+        JSON.parse(event.data).forEach(apply);
+    });
+});
@@ -0,0 +1,118 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from app import bcrypt
+
+DEFAULT_LOG_ROUNDS = 12
+DEFAULT_HASHING_WORKERS = min(4, os.cpu_count() or 1)
+
+# Thread pools shared by all applications of the process, keyed by size.
+_pools = {}
+_pools_lock = threading.Lock()
+
+def get_log_rounds():
+    """
+    Get the bcrypt cost factor new hashes are created with.
+
+    Returns:
+        int: The BCRYPT_LOG_ROUNDS setting of the current application.
+    """
+    return current_app.config.get("BCRYPT_LOG_ROUNDS", DEFAULT_LOG_ROUNDS)
+
+def get_hashing_pool():
+    """
+    Get the thread pool bcrypt runs in.
+
+    bcrypt releases the GIL while hashing, so the pool size bounds how many
+    CPU cores password hashing can take at once, however many logins arrive.
+    The size is the PASSWORD_HASHING_WORKERS setting; 0 hashes on the
+    request thread.
+
+    Returns:
+        ThreadPoolExecutor: The pool, or None if hashing runs on the request thread.
+    """
+    workers = current_app.config.get("PASSWORD_HASHING_WORKERS", DEFAULT_HASHING_WORKERS)
+    if not workers:
+        return None
+    with _pools_lock:
+        if workers not in _pools:
+            _pools[workers] = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-hashing")
+        return _pools[workers]
+
+def _run(function, *args):
+    pool = get_hashing_pool()
+    if pool is None:
+        return function(*args)
+    return pool.submit(function, *args).result()
+
+def hash_password(password):
+    """
+    Hash a password with the configured cost factor.
+
+    Args:
+        password (str): The plain text password.
+
+    Returns:
+        str: The bcrypt hash.
+    """
+    return _run(bcrypt.generate_password_hash, password, get_log_rounds()).decode("utf-8")
+
+def check_password(password_hash, password):
+    """
+    Check a password against a stored hash.
+
+    Args:
+        password_hash (str): The stored bcrypt hash.
+        password (str): The plain text password.
+
+    Returns:
+        bool: True if the password matches.
+    """
+    return _run(bcrypt.check_password_hash, password_hash, password)
+
+def hash_log_rounds(password_hash):
+    """
+    Read the cost factor a bcrypt hash was created with.
+
+    Args:
+        password_hash (str): The bcrypt hash, e.g. "$2b$12$...".
+
+    Returns:
+        int: The cost factor, or None if the hash is malformed.
+    """
+    try:
+        return int(password_hash.split("$")[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+def needs_rehash(password_hash):
+    """
+    Check whether a hash was created with a different cost factor than the configured one.
+
+    Args:
+        password_hash (str): The stored bcrypt hash.
+
+    Returns:
+        bool: True if the hash should be replaced.
+    """
+    return hash_log_rounds(password_hash) != get_log_rounds()
+
+def verify_and_upgrade(user, password):
+    """
+    Check a user's password and rehash it if the cost factor has changed.
+
+    The new hash is only assigned to the user; the caller commits it.
+
+    Args:
+        user (User): The user logging in.
+        password (str): The plain text password.
+
+    Returns:
+        bool: True if the password matches.
+    """
+    if not user.password_hash or not check_password(user.password_hash, password):
+        return False
+    if needs_rehash(user.password_hash):
+        user.password_hash = hash_password(password)
+    return True
@@ -2,12 +2,14 @@ from flask import render_template, redirect, url_for, flash, request, current_ap
 from flask_login import login_user, logout_user, current_user, login_required
 from sqlalchemy.exc import IntegrityError
 from marshmallow import ValidationError
-from app import db, bcrypt
+from app import db
 from app.common.models import User
 from app.common.custom_utils import send_validation_errors_to_form
+from app.common.pagination import paginate
 from . import user_bp
 from .forms import RegistrationForm, LoginForm
 from .schemas import UserSchema
+from .passwords import hash_password, verify_and_upgrade
 
 @user_bp.route("/register", methods=["GET", "POST"])
 def register():
@@ -41,14 +43,14 @@ def register():
             return redirect(url_for("user.login"))
         except ValidationError as e:
             send_validation_errors_to_form(e, form)
-            current_app.logger.exception(f"Register - validation error: {e}")
+            current_app.logger.exception("Register - validation error: %s", e)
         except IntegrityError as e:
             db.session.rollback()
-            current_app.logger.exception(f"Registration error: {e}")
+            current_app.logger.exception("Registration error: %s", e)
             flash("Username or email is already in use, choose another.", "danger")
         except Exception as e:
             db.session.rollback()
-            current_app.logger.exception(f"Registration error: {e}")
+            current_app.logger.exception("Registration error: %s", e)
             flash(f"Error: {e}, try again", "danger")
     return render_template("register.html", form=form, title="Registration")
 
@@ -64,7 +66,7 @@ def create_user(data):
     Returns:
         User: A new User object.
     """
-    hashed_password = bcrypt.generate_password_hash(data["password"]).decode("utf-8")
+    hashed_password = hash_password(data["password"])
     return User(
         username=data["username"],
         first_name=data["first_name"],
@@ -114,7 +116,7 @@ def edit_user_data(id):
             user.phone_number = result["phone_number"]
             user.email = result["email"]
             if form.password.data:
-                hashed_password = bcrypt.generate_password_hash(result["password"]).decode("utf-8")
+                hashed_password = hash_password(result["password"])
                 user.password_hash = hashed_password
             user.role = result["role"]
             db.session.commit()
@@ -122,14 +124,14 @@ def edit_user_data(id):
             return redirect(url_for("home"))
         except ValidationError as e:
             send_validation_errors_to_form(e, form)
-            current_app.logger.exception(f"Edit {user} validation error: {e}")
+            current_app.logger.exception("Edit user %s validation error: %s", id, e)
         except IntegrityError as e:
             db.session.rollback()
-            current_app.logger.exception(f"Edit {user} error: {e}")
+            current_app.logger.exception("Edit user %s error: %s", id, e)
             flash("Username or email is already in use, choose another.", "danger")
         except Exception as e:
             db.session.rollback()
-            current_app.logger.exception(f"Edit {user} error: {e}")
+            current_app.logger.exception("Edit user %s error: %s", id, e)
             flash(f"Error: {e}, try again", "danger")
     return render_template("register.html", form=form, title="User Data Edit")
 
@@ -150,7 +152,9 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
-        if user and bcrypt.check_password_hash(user.password_hash, form.password.data):
+        if user and verify_and_upgrade(user, form.password.data):
+            # Commits the new hash if the password was rehashed with the current cost factor.
+            db.session.commit()
             login_user(user)
             next_page = request.args.get("next")
             flash("Login successful.", "success")
@@ -193,13 +197,13 @@ def users_list():
     """
     Display list of all users.
 
-    This route fetches all users from the database and categorizes them by role (planner, dispatcher, driver).
+    This route fetches a page of users from the database and categorizes them by role (planner, dispatcher, driver).
 
     Returns:
         str: Rendered HTML template displaying the list of users.
     """
-    users = User.query.all()
-    planners = [user for user in users if user.role == "planner"]
-    dispatchers = [user for user in users if user.role == "dispatcher"]
-    drivers = [user for user in users if user.role == "driver"]
-    return render_template("users_list.html", planners=planners, dispatchers=dispatchers, drivers=drivers)
+    page = paginate(User.query, [User.id])
+    planners = [user for user in page.items if user.role == "planner"]
+    dispatchers = [user for user in page.items if user.role == "dispatcher"]
+    drivers = [user for user in page.items if user.role == "driver"]
+    return render_template("users_list.html", planners=planners, dispatchers=dispatchers, drivers=drivers, page=page)
@@ -0,0 +1,114 @@
+"""
+Benchmark of the assignment planner.
+
+Fills a temporary SQLite database with unassigned orders and free drivers,
+tractor heads and trailers of random types and capacities, then times the
+planning alone and the whole suggestion, which also reads the orders and the
+free fleet. Prints the mean time of each and the number of planned orders,
+then compares smallest-fitting-trailer lookups in SQL and in the trailer
+capacity index.
+
+Usage:
+    python benchmarks/assignment_benchmark.py [--orders N] [--assets N] [--repeat N]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from app import create_app, db
+from app.common.asset_status import DRIVER, TRACTOR_HEAD, TRAILER, register_assets
+from app.common.models import TransportationOrder, Trailer, User
+from app.dispatcher.assignment import plan_assignments, suggest_assignments
+from app.dispatcher.availability import available_trailers_query, free_crews_query
+from app.dispatcher.models import TractorHead
+from app.dispatcher.trailer_index import get_trailer_index
+from app.planner.models import Company
+
+TRAILER_TYPES = ["Curtain side", "Refrigerated", "Tipper", "Low loader", "Container", "Self-unloading", "Insulated"]
+
+def populate(orders, assets):
+    """
+    Insert the orders and, of each kind, the given number of free assets.
+    """
+    rng = random.Random(0)
+    db.session.execute(insert(User), [
+        {"username": f"driver{i}", "first_name": "Driver", "last_name": str(i), "phone_number": "123456789",
+         "email": f"driver{i}@mail.com", "role": "driver"}
+        for i in range(assets)
+    ])
+    db.session.execute(insert(TractorHead), [
+        {"brand": "MAN", "registration_number": f"WGM{i:05d}"} for i in range(assets)
+    ])
+    db.session.execute(insert(Trailer), [
+        {"type": rng.choice(TRAILER_TYPES), "max_load_capacity": rng.randrange(10000, 40001, 1000),
+         "registration_number": f"WND{i:04d}"}
+        for i in range(assets)
+    ])
+    # The statements bypass the flush events, so the asset statuses are written here.
+    for kind in (DRIVER, TRACTOR_HEAD, TRAILER):
+        register_assets(db.session.connection(), kind, range(1, assets + 1))
+    company = Company(company_name="Company", country="Poland", town="Warsaw", postal_code="00-001",
+                      street="Street", street_number=1, phone_number="123456789")
+    db.session.add(company)
+    db.session.flush()
+    db.session.execute(insert(TransportationOrder), [
+        {"created_by": 1, "planned_delivery_date": date.today() + timedelta(days=rng.randrange(30)),
+         "trailer_type": rng.choice(TRAILER_TYPES), "load_weight": rng.randrange(1000, 40001, 500),
+         "loading_place": company.id, "delivery_place": company.id}
+        for _ in range(orders)
+    ])
+    db.session.commit()
+
+def timed(function, repeat):
+    """
+    Call a function repeatedly and return its last result and the mean time.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=1000)
+    parser.add_argument("--assets", type=int, default=2000, help="Free drivers, tractor heads and trailers each.")
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"})
+        with app.app_context():
+            db.create_all()
+            populate(args.orders, args.assets)
+            orders = [(order.id, order.trailer_type, order.load_weight)
+                      for order in TransportationOrder.query.order_by(TransportationOrder.planned_delivery_date)]
+            crews = {"driver": [], "tractor_head": []}
+            for kind, asset_id in db.session.execute(free_crews_query()):
+                crews[kind].append(asset_id)
+            index = get_trailer_index()
+
+            plan, elapsed = timed(lambda: plan_assignments(orders, crews["driver"], crews["tractor_head"],
+                                                           index.free_trailers()), args.repeat)
+            print(f"plan only        {elapsed * 1000:8.1f} ms   {len(plan.assignments)} of {args.orders} orders planned")
+            plan, elapsed = timed(suggest_assignments, args.repeat)
+            print(f"with DB reads    {elapsed * 1000:8.1f} ms   {len(plan.assignments)} of {args.orders} orders planned")
+
+            lookups = orders[:100]
+            _, elapsed = timed(lambda: [db.session.execute(
+                available_trailers_query(trailer_type, load_weight).order_by(Trailer.max_load_capacity).limit(1)
+            ).first() for _, trailer_type, load_weight in lookups], args.repeat)
+            print(f"smallest trailer {elapsed / len(lookups) * 1000:8.3f} ms   per lookup, SQL")
+            _, elapsed = timed(lambda: [index.smallest_free_trailer(trailer_type, load_weight)
+                                        for _, trailer_type, load_weight in lookups], args.repeat)
+            print(f"smallest trailer {elapsed / len(lookups) * 1000:8.3f} ms   per lookup, capacity index")
+            db.engine.dispose()
+
+if __name__ == "__main__":
+    main()
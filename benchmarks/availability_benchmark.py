@@ -0,0 +1,123 @@
+"""
+Benchmark of the fleet availability lookup used by the completing the order form.
+
+Seeds a temporary SQLite database with 10,000 vehicles (tractor heads and
+trailers), 6,000 drivers and 5,000 open orders, then compares the previous
+load-everything-and-filter-in-Python approach with the anti-join service.
+
+Usage:
+    python benchmarks/availability_benchmark.py [--repeat N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from app import create_app, db
+from app.common.asset_status import DRIVER, TRACTOR_HEAD, TRAILER, hold_assets, register_assets
+from app.common.models import User, TransportationOrder, Trailer
+from app.dispatcher.models import TractorHead
+from app.dispatcher.availability import get_fleet_availability
+from app.planner.models import Company
+
+TRACTOR_HEADS = 5000
+TRAILERS = 5000
+DRIVERS = 6000
+OPEN_ORDERS = 5000
+
+def seed():
+    """
+    Insert benchmark data with executemany statements.
+    """
+    db.session.execute(insert(Company), [
+        {"company_name": f"Company {i}", "country": "Poland", "town": "Warsaw", "postal_code": "00-001",
+         "street": "Street", "street_number": i, "phone_number": "123456789"}
+        for i in range(1, 11)
+    ])
+    db.session.execute(insert(User), [
+        {"username": f"driver{i}", "first_name": "Driver", "last_name": f"No{i}", "phone_number": "123456789",
+         "email": f"driver{i}@mail.com", "role": "driver"}
+        for i in range(1, DRIVERS + 1)
+    ])
+    db.session.execute(insert(TractorHead), [
+        {"brand": "MAN", "registration_number": f"TH{i:06d}"} for i in range(1, TRACTOR_HEADS + 1)
+    ])
+    db.session.execute(insert(Trailer), [
+        {"type": "Container", "max_load_capacity": 12000 + (i % 13) * 1000, "registration_number": f"TR{i:05d}"}
+        for i in range(1, TRAILERS + 1)
+    ])
+    db.session.execute(insert(TransportationOrder), [
+        {"created_by": 1, "planned_delivery_date": date(2222, 1, 1), "trailer_type": "Container",
+         "load_weight": 10000, "loading_place": 1, "delivery_place": 2,
+         "driver": i, "tractor_head": i, "trailer": i, "completed": False}
+        for i in range(1, OPEN_ORDERS + 1)
+    ])
+    # The statements bypass the flush events, so the asset statuses are written here.
+    connection = db.session.connection()
+    for kind, count in ((DRIVER, DRIVERS), (TRACTOR_HEAD, TRACTOR_HEADS), (TRAILER, TRAILERS)):
+        register_assets(connection, kind, range(1, count + 1))
+    hold_assets(connection, [(i, kind, i) for i in range(1, OPEN_ORDERS + 1) for kind in (DRIVER, TRACTOR_HEAD, TRAILER)])
+    db.session.commit()
+
+def legacy_availability(trailer_type, order_load_weight):
+    """
+    Reproduce the previous form implementation for comparison.
+    """
+    all_drivers = User.query.filter(User.role == "driver").all()
+    busy_driver_ids = [driver_id for (driver_id,) in db.session.query(TransportationOrder.driver).filter(
+        TransportationOrder.completed == False, TransportationOrder.driver.isnot(None)).all()]
+    drivers = [(d.id, f"{d.first_name} {d.last_name}") for d in all_drivers if d.id not in busy_driver_ids]
+
+    all_tractor_heads = TractorHead.query.all()
+    busy_tractor_head_ids = [tractor_head_id for (tractor_head_id,) in db.session.query(TransportationOrder.tractor_head).filter(
+        TransportationOrder.completed == False, TransportationOrder.tractor_head.isnot(None)).all()]
+    tractor_heads = [(t.id, f"{t.brand} {t.registration_number}") for t in all_tractor_heads if t.id not in busy_tractor_head_ids]
+
+    busy_trailer_ids = [trailer_id for (trailer_id,) in db.session.query(TransportationOrder.trailer).filter(
+        TransportationOrder.completed == False, TransportationOrder.trailer.isnot(None)).all()]
+    trailers = [(t.id, t.registration_number) for t in Trailer.query.filter(
+        Trailer.type == trailer_type,
+        Trailer.max_load_capacity >= order_load_weight,
+        Trailer.id.notin_(busy_trailer_ids)
+    ).all()]
+    return drivers, tractor_heads, trailers
+
+def measure(label, function, repeat):
+    """
+    Run a function several times and print the best and mean wall time.
+    """
+    timings = []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        function("Container", 15000)
+        timings.append(time.perf_counter() - start)
+    print(f"{label:<24} best {min(timings) * 1000:8.2f} ms   mean {sum(timings) / len(timings) * 1000:8.2f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"})
+        with app.app_context():
+            db.create_all()
+            seed()
+            legacy = legacy_availability("Container", 15000)
+            current = get_fleet_availability("Container", 15000)
+            assert sorted(legacy[0]) == sorted(current.drivers)
+            assert sorted(legacy[1]) == sorted(current.tractor_heads)
+            assert sorted(legacy[2]) == sorted(current.trailers)
+            measure("legacy (python filter)", legacy_availability, args.repeat)
+            measure("anti-join service", get_fleet_availability, args.repeat)
+            db.session.remove()
+            db.engine.dispose()
+
+if __name__ == "__main__":
+    main()
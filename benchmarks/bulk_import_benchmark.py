@@ -0,0 +1,88 @@
+"""
+Benchmark of the bulk company import against inserting companies one by one.
+
+Generates a CSV and a JSON Lines file of companies and imports them with the
+bulk importer into a temporary SQLite database. For comparison, a sample of
+the rows is inserted the way the company form does it, validating and
+committing each row on its own. Prints the rows per second of each.
+
+Usage:
+    python benchmarks/bulk_import_benchmark.py [--rows N] [--sample N] [--chunk-size N]
+"""
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app, db
+from app.planner.importers import company_importer
+from app.planner.models import Company
+from app.planner.schemas import CompanySchema
+
+FIELDS = ["company_name", "country", "town", "postal_code", "street", "street_number", "phone_number"]
+
+def company(i):
+    """
+    Build the data of the i-th generated company.
+    """
+    return {"company_name": f"Company {i}", "country": "Poland", "town": "Warsaw", "postal_code": "00-001",
+            "street": "Street", "street_number": i, "phone_number": "123456789"}
+
+def csv_file(rows):
+    """
+    Build a CSV file of generated companies, with a header row.
+    """
+    lines = [",".join(FIELDS)] + [",".join(str(company(i)[field]) for field in FIELDS) for i in range(rows)]
+    return io.BytesIO("\n".join(lines).encode("utf-8"))
+
+def jsonl_file(rows):
+    """
+    Build a JSON Lines file of generated companies.
+    """
+    return io.BytesIO("\n".join(json.dumps(company(i)) for i in range(rows)).encode("utf-8"))
+
+def one_by_one(rows):
+    """
+    Insert companies like the company form: validate, add and commit each.
+    """
+    schema = CompanySchema()
+    for i in range(rows):
+        db.session.add(Company(**schema.load(company(i))))
+        db.session.commit()
+
+def run(app, label, rows, operation):
+    """
+    Run an insert operation against an empty database and print its throughput.
+    """
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        start = time.perf_counter()
+        operation()
+        elapsed = time.perf_counter() - start
+        assert Company.query.count() == rows
+    print(f"{label:<12} {rows:>8} rows {elapsed:8.2f} s {rows / elapsed:10.0f} rows/s")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--sample", type=int, default=1000, help="Rows inserted one by one.")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(tmp_dir, 'bench.db')}"})
+        run(app, "one by one", args.sample, lambda: one_by_one(args.sample))
+        for label, format, build in (("bulk CSV", "csv", csv_file), ("bulk JSONL", "jsonl", jsonl_file)):
+            file = build(args.rows)
+            run(app, label, args.rows, lambda: company_importer.run(file, format, chunk_size=args.chunk_size))
+        with app.app_context():
+            db.engine.dispose()
+
+if __name__ == "__main__":
+    main()
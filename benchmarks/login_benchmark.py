@@ -0,0 +1,105 @@
+"""
+Benchmark of login throughput at different bcrypt costs and hashing pool sizes.
+
+For every combination of cost factor and PASSWORD_HASHING_WORKERS, client
+threads log in repeatedly against a temporary SQLite database while another
+thread requests the login page, a request that does no hashing. Prints the
+logins per second and the mean latency of the page, which shows how much the
+hashing slows down the rest of the traffic.
+
+Usage:
+    python benchmarks/login_benchmark.py [--clients N] [--seconds S] [--costs 10 12] [--workers 0 2 4]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import render_template
+from app import create_app, db
+from app.user.routes import create_user
+
+def build_app(db_path, cost, workers):
+    """
+    Create an application with a single user to log in as.
+    """
+    app = create_app({
+        "TESTING": True,
+        "WTF_CSRF_ENABLED": False,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_path}",
+        "BCRYPT_LOG_ROUNDS": cost,
+        "PASSWORD_HASHING_WORKERS": workers
+    })
+    app.add_url_rule("/", "home", lambda: render_template("base.html"))
+    with app.app_context():
+        db.create_all()
+        db.session.add(create_user({
+            "username": "driver", "first_name": "Driver", "last_name": "User", "phone_number": "123456789",
+            "email": "driver@mail.com", "password": "password", "role": "driver"
+        }))
+        db.session.commit()
+    return app
+
+def log_in(app, deadline, results, lock):
+    """
+    Log in repeatedly until the deadline.
+    """
+    client = app.test_client()
+    logins = 0
+    while time.perf_counter() < deadline:
+        response = client.post("/user/login", data={"email": "driver@mail.com", "password": "password"})
+        assert response.status_code == 302
+        client.post("/user/logout")
+        logins += 1
+    with lock:
+        results["logins"] += logins
+
+def browse(app, deadline, results):
+    """
+    Request a page without hashing until the deadline, recording latencies.
+    """
+    client = app.test_client()
+    while time.perf_counter() < deadline:
+        start = time.perf_counter()
+        client.get("/user/login")
+        results["latencies"].append(time.perf_counter() - start)
+
+def run(tmp_dir, cost, workers, clients, seconds):
+    """
+    Run the login burst for one combination of cost and pool size.
+    """
+    app = build_app(os.path.join(tmp_dir, f"bench_{cost}_{workers}.db"), cost, workers)
+    results = {"logins": 0, "latencies": []}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=log_in, args=(app, deadline, results, lock)) for _ in range(clients)]
+    threads.append(threading.Thread(target=browse, args=(app, deadline, results)))
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with app.app_context():
+        db.engine.dispose()
+    latencies = results["latencies"]
+    print(f"cost {cost:>2}  workers {workers or 'inline':>6}   {results['logins'] / seconds:7.1f} logins/s   "
+          f"login page {sum(latencies) / len(latencies) * 1000:7.2f} ms mean")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--costs", type=int, nargs="+", default=[10, 12])
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, 2, 4])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for cost in args.costs:
+            for workers in args.workers:
+                run(tmp_dir, cost, workers, args.clients, args.seconds)
+
+if __name__ == "__main__":
+    main()
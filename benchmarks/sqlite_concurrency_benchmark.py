@@ -0,0 +1,128 @@
+"""
+Benchmark of concurrent SQLite writers and readers with and without WAL.
+
+Runs writer threads committing single-row inserts and reader threads reading
+a page of orders at the same time against a temporary SQLite database, first
+with SQLite's default rollback journal and then with the WAL settings the
+application applies on connect. Prints the throughput and the number of
+"database is locked" errors of each.
+
+Usage:
+    python benchmarks/sqlite_concurrency_benchmark.py [--writers N] [--readers N] [--seconds S]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert
+from sqlalchemy.exc import OperationalError
+from app import create_app, db
+from app.common.models import User, TransportationOrder
+from app.planner.models import Company
+
+SETTINGS = {
+    "rollback journal": {
+        "SQLITE_JOURNAL_MODE": "DELETE",
+        "SQLITE_SYNCHRONOUS": "FULL",
+        "SQLITE_BUSY_TIMEOUT": None,
+        "SQLITE_MMAP_SIZE": None
+    },
+    "WAL": {}
+}
+
+def seed():
+    """
+    Insert the companies, the planner and the orders read by the readers.
+    """
+    db.session.execute(insert(Company), [
+        {"company_name": f"Company {i}", "country": "Poland", "town": "Warsaw", "postal_code": "00-001",
+         "street": "Street", "street_number": i, "phone_number": "123456789"}
+        for i in range(1, 3)
+    ])
+    db.session.execute(insert(User), [{"username": "planner", "first_name": "Planner", "last_name": "User",
+                                       "phone_number": "123456789", "email": "planner@mail.com", "role": "planner"}])
+    db.session.execute(insert(TransportationOrder), [
+        {"created_by": 1, "planned_delivery_date": date(2222, 1, 1), "trailer_type": "Container",
+         "load_weight": 10000, "loading_place": 1, "delivery_place": 2, "completed": False}
+        for _ in range(1000)
+    ])
+    db.session.commit()
+
+def worker(app, operation, deadline, counters, lock):
+    """
+    Run an operation in its own app context until the deadline, counting results.
+    """
+    done = errors = 0
+    with app.app_context():
+        while time.perf_counter() < deadline:
+            try:
+                operation()
+                done += 1
+            except OperationalError:
+                db.session.rollback()
+                errors += 1
+        db.session.remove()
+    with lock:
+        counters["done"] += done
+        counters["errors"] += errors
+
+def write():
+    db.session.add(TransportationOrder(
+        created_by=1, planned_delivery_date=date(2222, 1, 1), trailer_type="Container",
+        load_weight=10000, loading_place=1, delivery_place=2, completed=False
+    ))
+    db.session.commit()
+
+def read():
+    TransportationOrder.query.filter_by(completed=False).order_by(
+        TransportationOrder.creation_date, TransportationOrder.id).limit(50).all()
+    db.session.rollback()
+
+def run(label, settings, tmp_dir, writers, readers, seconds):
+    """
+    Run the writers and readers against a fresh database with the given settings.
+    """
+    app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{os.path.join(tmp_dir, label.replace(' ', '_'))}.db",
+        "DATABASE_POOL_SIZE": writers + readers,
+        **settings
+    })
+    with app.app_context():
+        db.create_all()
+        seed()
+    write_counters = {"done": 0, "errors": 0}
+    read_counters = {"done": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=worker, args=(app, write, deadline, write_counters, lock))
+               for _ in range(writers)]
+    threads += [threading.Thread(target=worker, args=(app, read, deadline, read_counters, lock))
+                for _ in range(readers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with app.app_context():
+        db.engine.dispose()
+    print(f"{label:<17} writes {write_counters['done'] / seconds:8.0f}/s ({write_counters['errors']} locked)   "
+          f"reads {read_counters['done'] / seconds:8.0f}/s ({read_counters['errors']} locked)")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--readers", type=int, default=8)
+    parser.add_argument("--seconds", type=float, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for label, settings in SETTINGS.items():
+            run(label, settings, tmp_dir, args.writers, args.readers, args.seconds)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark of the Flask-Login user loader with and without the identity cache.
+
+Creates a dispatcher in a temporary SQLite database and requests the active
+order board repeatedly, once with the identity cache disabled (every request
+selects the user row) and once with it enabled. Both the user loader alone
+and the whole request are timed.
+
+Usage:
+    python benchmarks/user_loader_benchmark.py [--requests N]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import render_template
+from sqlalchemy import event
+from app import create_app, db, login_manager
+from app.common.models import User
+from app.user.routes import create_user
+
+def build_app(db_path, identity_cache_size):
+    """
+    Create an application with a dispatcher logged in through the test client.
+    """
+    app = create_app({
+        "TESTING": True,
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{db_path}",
+        "IDENTITY_CACHE_SIZE": identity_cache_size
+    })
+    app.add_url_rule("/", "home", lambda: render_template("base.html"))
+    with app.app_context():
+        db.create_all()
+        user = User.query.filter_by(username="dispatcher").first()
+        if user is None:
+            user = create_user({
+                "username": "dispatcher", "first_name": "Dispatcher", "last_name": "User",
+                "phone_number": "123456789", "email": "dispatcher@mail.com",
+                "password": "password", "role": "dispatcher"
+            })
+            db.session.add(user)
+            db.session.commit()
+        user_id = user.id
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+    return app, client, user_id
+
+def measure(label, function, repeat):
+    """
+    Run a function several times and print the mean wall time per call.
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed / repeat * 1000:8.3f} ms per call")
+
+def run(label, app, client, user_id, repeat):
+    """
+    Time the user loader and the active order board of one application.
+    """
+    statements = []
+    with app.app_context():
+        event.listen(db.engine, "before_cursor_execute", lambda *args: statements.append(args[2]))
+
+    def load():
+        with app.test_request_context():
+            login_manager._user_callback(str(user_id))
+
+    def request():
+        response = client.get("/dispatcher/orders/active")
+        assert response.status_code == 200
+
+    request()
+    statements.clear()
+    request()
+    print(f"{label}: {len(statements)} queries per request")
+    measure("  user loader", load, repeat)
+    measure("  GET /dispatcher/orders/active", request, repeat)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        db_path = os.path.join(tmp_dir, "bench.db")
+        for label, identity_cache_size in (("without identity cache", 0), ("with identity cache", 1000)):
+            app, client, user_id = build_app(db_path, identity_cache_size)
+            run(label, app, client, user_id, args.requests)
+            with app.app_context():
+                db.engine.dispose()
+
+if __name__ == "__main__":
+    main()
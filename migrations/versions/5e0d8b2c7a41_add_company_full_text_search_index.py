@@ -0,0 +1,59 @@
+"""add company full-text search index
+
+Revision ID: 5e0d8b2c7a41
+Revises: 11cc1c51d382
+Create Date: 2026-10-18 21:02:47.315920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e0d8b2c7a41'
+down_revision = '11cc1c51d382'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("""
+        CREATE VIRTUAL TABLE company_search USING fts5(
+            company_name, town, postal_code, street,
+            content='company', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+    """)
+    op.execute("""
+        CREATE TRIGGER company_search_after_insert AFTER INSERT ON company BEGIN
+            INSERT INTO company_search(rowid, company_name, town, postal_code, street)
+            VALUES (new.id, new.company_name, new.town, new.postal_code, new.street);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER company_search_after_delete AFTER DELETE ON company BEGIN
+            INSERT INTO company_search(company_search, rowid, company_name, town, postal_code, street)
+            VALUES ('delete', old.id, old.company_name, old.town, old.postal_code, old.street);
+        END
+    """)
+    op.execute("""
+        CREATE TRIGGER company_search_after_update AFTER UPDATE ON company BEGIN
+            INSERT INTO company_search(company_search, rowid, company_name, town, postal_code, street)
+            VALUES ('delete', old.id, old.company_name, old.town, old.postal_code, old.street);
+            INSERT INTO company_search(rowid, company_name, town, postal_code, street)
+            VALUES (new.id, new.company_name, new.town, new.postal_code, new.street);
+        END
+    """)
+    # index the companies that already exist
+    op.execute("INSERT INTO company_search(company_search) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("DROP TRIGGER IF EXISTS company_search_after_update")
+    op.execute("DROP TRIGGER IF EXISTS company_search_after_delete")
+    op.execute("DROP TRIGGER IF EXISTS company_search_after_insert")
+    op.execute("DROP TABLE IF EXISTS company_search")
@@ -1,20 +1,39 @@
 import pytest
+from contextlib import contextmanager
+from datetime import date
+from flask import render_template
+from sqlalchemy import event
 from app import create_app, db
-from app.common.models import User
+from app.common.custom_utils import close_all_loggers
+from app.common.models import User, TransportationOrder, Trailer
+from app.dispatcher.models import TractorHead
+from app.planner.models import Company
 from app.common.schemas import TransportationOrderSchema
 from app.user.routes import create_user
 from app.user.schemas import UserSchema
 from app.dispatcher.schemas import TractorHeadSchema, TrailerSchema
 from app.planner.schemas import CompanySchema
 
+@pytest.fixture(autouse=True)
+def close_log_files():
+    yield
+    # Loggers are process-global, so handlers of a test's log files must not reach the next tests.
+    close_all_loggers()
+
 @pytest.fixture
-def app():
-    app = create_app()
-    app.config.update({
+def app(tmp_path):
+    app = create_app({
         "TESTING": True,
         "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+        "LOG_FOLDER": str(tmp_path / "logs"),
         "LOGIN_DISABLED": True,
+        # The lowest bcrypt cost keeps the many logins of the tests fast.
+        "BCRYPT_LOG_ROUNDS": 4,
+        # /metrics is off by default, the instrumentation tests read it.
+        "METRICS_ENABLED": True,
     })
+    # The home page is registered by run.py, routes redirect to it.
+    app.add_url_rule("/", "home", lambda: render_template("base.html"))
     with app.app_context():
         db.create_all()
         yield app
@@ -55,6 +74,47 @@ def logged_in_client(client, user, app):
     app.config["LOGIN_DISABLED"] = True
     return client
 
+@pytest.fixture
+def login_as(app, client):
+    def login(role):
+        user = create_user({
+            "username": f"{role}_user",
+            "first_name": role.capitalize(),
+            "last_name": "User",
+            "phone_number": "123456789",
+            "email": f"{role}@mail.com",
+            "password": "test_password",
+            "role": role
+        })
+        db.session.add(user)
+        db.session.commit()
+        with client.session_transaction() as session:
+            session["_user_id"] = str(user.id)
+            session["_fresh"] = True
+        return user
+    return login
+
+@pytest.fixture
+def captured_queries(app):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", capture)
+    yield statements
+    event.remove(db.engine, "before_cursor_execute", capture)
+
+@pytest.fixture
+def assert_max_queries(captured_queries):
+    @contextmanager
+    def assert_max(count):
+        captured_queries.clear()
+        yield captured_queries
+        statements = "\n".join(statement for statement, _ in captured_queries)
+        assert len(captured_queries) <= count, f"{len(captured_queries)} queries, expected at most {count}:\n{statements}"
+    return assert_max
+
 @pytest.fixture
 def user_schema():
     return UserSchema()
@@ -74,3 +134,45 @@ def trailer_schema():
 @pytest.fixture
 def company_schema():
     return CompanySchema()
+
+@pytest.fixture
+def companies(app):
+    companies = [
+        Company(company_name="Loading Company", country="Poland", town="Warsaw", postal_code="00-001",
+                street="First Street", street_number=1, phone_number="123456789"),
+        Company(company_name="Delivery Company", country="Poland", town="Krakow", postal_code="30-001",
+                street="Second Street", street_number=2, phone_number="987654321")
+    ]
+    db.session.add_all(companies)
+    db.session.commit()
+    return companies
+
+@pytest.fixture
+def fleet(app, user, companies):
+    drivers = [
+        User(username=f"driver{i}", first_name="Driver", last_name=f"No{i}", phone_number="123456789",
+             email=f"driver{i}@mail.com", role="driver")
+        for i in range(2)
+    ]
+    tractor_heads = [TractorHead(brand="MAN", registration_number=f"WGM1234{i}") for i in range(2)]
+    trailers = [
+        Trailer(type="Container", max_load_capacity=20000, registration_number="WND0001"),
+        Trailer(type="Container", max_load_capacity=24000, registration_number="WND0002"),
+        Trailer(type="Tipper", max_load_capacity=24000, registration_number="WND0003")
+    ]
+    db.session.add_all(drivers + tractor_heads + trailers)
+    db.session.flush()
+    order = TransportationOrder(
+        created_by=user.id,
+        planned_delivery_date=date(2222, 1, 1),
+        trailer_type="Container",
+        load_weight=10000,
+        loading_place=companies[0].id,
+        delivery_place=companies[1].id,
+        driver=drivers[0].id,
+        tractor_head=tractor_heads[0].id,
+        trailer=trailers[0].id
+    )
+    db.session.add(order)
+    db.session.commit()
+    return {"drivers": drivers, "tractor_heads": tractor_heads, "trailers": trailers, "order": order}
@@ -1,6 +1,26 @@
+import re
+import base64
+import html
+import json
+import logging
+import time
 import pytest
-from datetime import datetime
+from datetime import date, datetime
 from marshmallow import ValidationError
+from sqlalchemy import event, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm.exc import StaleDataError
+from app import create_app, db
+from app.common.models import User, TransportationOrder, Trailer
+from app.dispatcher.models import TractorHead
+from app.planner.models import Company
+from app.common.choices import trailer_type_choices
+from app.common.reference import ReferenceCache, FileInvalidation, get_reference_cache
+from app.common.changes import bump_change_counters
+from app.common.database import database_report
+from app.common.custom_utils import (create_logger, close_logger, close_all_loggers, RequestQueueHandler,
+                                     SizeAndTimeRotatingFileHandler)
+from app.common.slow_queries import slow_query_logger
 
 # SCHEMAS
 
@@ -88,3 +108,480 @@ def test_past_planned_delivery_date(transportation_order_schema):
     with pytest.raises(ValidationError) as excinfo:
         transportation_order_schema.load(data)
     assert "planned_delivery_date" in excinfo.value.messages
+
+# QUERY PLANS
+
+FULL_SCAN = re.compile(r"^SCAN transportation_order$")
+
+def assert_no_full_scans(statements):
+    for statement, parameters in list(statements):
+        if "transportation_order" not in statement:
+            continue
+        plan = db.session.connection().exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+        details = [row[-1] for row in plan]
+        assert not any(FULL_SCAN.match(detail) for detail in details), f"Full scan in: {statement}\n{details}"
+
+@pytest.mark.parametrize("role, url", [
+    ("planner", "/planner/transportation_orders"),
+    ("planner", "/planner/transportation_orders/archived"),
+    ("planner", "/planner/transportation_orders/archived?trailer_type=Container"),
+    ("planner", "/planner/transportation_orders/archived?loading_place=1"),
+    ("planner", "/planner/transportation_orders/archived?delivery_place=2&date_from=2222-01-01"),
+    ("planner", "/planner/transportation_orders/archived?min_weight=1000&max_weight=5000"),
+    ("dispatcher", "/dispatcher/orders/active"),
+    ("driver", "/driver/archived-orders"),
+    ("driver", "/driver/current-order.json"),
+])
+def test_order_lists_use_indexes(client, login_as, fleet, captured_queries, role, url):
+    login_as(role)
+    captured_queries.clear()
+    response = client.get(url)
+    assert response.status_code in (200, 302)
+    assert any("transportation_order" in statement for statement, _ in captured_queries)
+    assert_no_full_scans(captured_queries)
+
+def test_order_completion_form_uses_indexes(client, login_as, fleet, captured_queries):
+    login_as("dispatcher")
+    captured_queries.clear()
+    response = client.get(f"/dispatcher/orders/complete/{fleet['order'].id}")
+    assert response.status_code == 200
+    assert_no_full_scans(captured_queries)
+
+# QUERY COUNTS
+
+def seed_orders(count, creator, driver=None, completed=False):
+    for i in range(count):
+        loading = Company(company_name=f"Loading {i}", country="Poland", town="Warsaw", postal_code="00-001",
+                          street="Street", street_number=i + 1, phone_number="123456789")
+        delivery = Company(company_name=f"Delivery {i}", country="Poland", town="Krakow", postal_code="30-001",
+                           street="Street", street_number=i + 1, phone_number="123456789")
+        order_driver = driver or User(username=f"seeded{i}", first_name="Seeded", last_name=f"No{i}",
+                                      phone_number="123456789", email=f"seeded{i}@mail.com", role="driver")
+        tractor_head = TractorHead(brand="MAN", registration_number=f"SEED{i:04d}")
+        trailer = Trailer(type="Container", max_load_capacity=24000, registration_number=f"SD{i:05d}")
+        db.session.add_all([loading, delivery, order_driver, tractor_head, trailer])
+        db.session.flush()
+        db.session.add(TransportationOrder(
+            created_by=creator.id, planned_delivery_date=date(2222, 1, 1), trailer_type="Container",
+            load_weight=10000, loading_place=loading.id, delivery_place=delivery.id, driver=order_driver.id,
+            tractor_head=tractor_head.id, trailer=trailer.id, completed=completed
+        ))
+    db.session.commit()
+    db.session.expunge_all()
+
+@pytest.mark.parametrize("role, url, completed, max_queries", [
+    ("planner", "/planner/transportation_orders", False, 4),
+    # The archive filter form loads trailer types and drivers.
+    ("planner", "/planner/transportation_orders/archived", True, 6),
+    # The board also reads the position of the order feed.
+    ("dispatcher", "/dispatcher/orders/active", False, 5),
+    ("driver", "/driver/archived-orders", True, 4),
+])
+def test_order_lists_have_fixed_query_count(client, login_as, assert_max_queries, role, url, completed, max_queries):
+    user = login_as(role)
+    seed_orders(20, user, driver=user if role == "driver" else None, completed=completed)
+    with assert_max_queries(max_queries):
+        response = client.get(url)
+    assert response.status_code == 200
+
+# VERSIONING
+
+def test_concurrent_update_raises_stale_data_error(app, fleet):
+    order = fleet["order"]
+    db.session.execute(update(TransportationOrder).where(TransportationOrder.id == order.id).values(
+        load_weight=11000, version=TransportationOrder.version + 1).execution_options(synchronize_session=False))
+    order.load_weight = 12000
+    with pytest.raises(StaleDataError):
+        db.session.flush()
+    db.session.rollback()
+
+def test_change_counters_are_bumped_without_returning(app):
+    statements = []
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        connection = db.session.connection()
+        assert bump_change_counters(connection, "test") == {"test": 1}
+        assert bump_change_counters(connection, "test", "test") == {"test": 2}
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+    db.session.rollback()
+    assert not any("RETURNING" in statement.upper() for statement in statements)
+
+# PAGINATION
+
+def page_links(response):
+    links = re.findall(r'<a href="([^"]+)" class="btn btn-secondary">(?:&laquo; Previous|Next &raquo;)</a>', response.text)
+    return [html.unescape(link) for link in links]
+
+def test_keyset_pagination_walks_forward_and_back(client, login_as):
+    login_as("dispatcher")
+    db.session.add_all([TractorHead(brand="MAN", registration_number=f"WGM0000{i}") for i in range(5)])
+    db.session.commit()
+
+    first = client.get("/dispatcher/tractor_heads?per_page=2")
+    assert b"WGM00000" in first.data and b"WGM00001" in first.data
+    [next_url] = page_links(first)
+
+    second = client.get(next_url)
+    assert b"WGM00002" in second.data and b"WGM00003" in second.data
+    assert b"WGM00001" not in second.data
+    prev_url, next_url = page_links(second)
+
+    assert b"WGM00004" in client.get(next_url).data
+    back = client.get(prev_url)
+    assert b"WGM00000" in back.data and b"WGM00001" in back.data
+    assert len(page_links(back)) == 1
+
+def test_keyset_pagination_rejects_invalid_cursor(client, login_as):
+    login_as("dispatcher")
+    response = client.get("/dispatcher/tractor_heads?after=not-a-cursor")
+    assert response.status_code == 400
+
+@pytest.mark.parametrize("values", [[None, 1], [5, 1]])
+def test_keyset_pagination_rejects_cursor_with_non_string_date(client, login_as, values):
+    login_as("planner")
+    cursor = base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+    response = client.get(f"/planner/transportation_orders?after={cursor}")
+    assert response.status_code == 400
+
+def test_later_order_pages_use_indexes(client, login_as, captured_queries):
+    user = login_as("planner")
+    seed_orders(3, user)
+    first = client.get("/planner/transportation_orders?per_page=1")
+    [next_url] = page_links(first)
+    captured_queries.clear()
+    assert client.get(next_url).status_code == 200
+    assert any("transportation_order" in statement for statement, _ in captured_queries)
+    assert_no_full_scans(captured_queries)
+
+# FORM CHOICES
+
+def test_form_choices_are_cached_across_requests(client, login_as, fleet, assert_max_queries):
+    login_as("planner")
+    client.get("/planner/transportation_orders/archived")
+    with assert_max_queries(2) as statements:
+        response = client.get("/planner/transportation_orders/archived")
+    assert response.status_code == 200
+    assert not any("FROM trailer" in statement or "user.role" in statement for statement, _ in statements)
+
+def test_form_choices_are_invalidated_on_commit(client, login_as, fleet):
+    login_as("planner")
+    assert b"Tanker" not in client.get("/planner/transportation_orders/new").data
+    db.session.add(Trailer(type="Tanker", max_load_capacity=24000, registration_number="WND0004"))
+    db.session.commit()
+    assert b"Tanker" in client.get("/planner/transportation_orders/new").data
+
+def test_form_choices_are_kept_on_rollback(app, fleet, captured_queries):
+    with app.test_request_context():
+        assert trailer_type_choices() == ["Container", "Tipper"]
+    db.session.add(Trailer(type="Tanker", max_load_capacity=24000, registration_number="WND0004"))
+    db.session.flush()
+    db.session.rollback()
+    captured_queries.clear()
+    with app.test_request_context():
+        assert trailer_type_choices() == ["Container", "Tipper"]
+    assert not captured_queries
+
+def test_company_labels_are_invalidated_on_rename(client, login_as, fleet, companies):
+    login_as("planner")
+    url = f"/planner/transportation_orders/edit/{fleet['order'].id}"
+    assert b"Loading Company, 00-001 Warsaw" in client.get(url).data
+    company = db.session.get(Company, companies[0].id)
+    company.company_name = "Renamed Company"
+    db.session.commit()
+    response = client.get(url)
+    assert b"Renamed Company, 00-001 Warsaw" in response.data
+    assert b"Delivery Company, 30-001 Krakow" in response.data
+
+# REFERENCE CACHE
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_reference_cache_counts_hits_and_misses():
+    cache = ReferenceCache()
+    assert cache.get("key", lambda: "value") == "value"
+    assert cache.get("key", lambda: "other") == "value"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_reference_cache_expires_entries():
+    clock = FakeClock()
+    cache = ReferenceCache(ttl=10, clock=clock)
+    cache.get("key", lambda: "old")
+    clock.now = 11
+    assert cache.get("key", lambda: "new") == "new"
+
+def test_reference_cache_evicts_least_recently_used():
+    cache = ReferenceCache(max_size=2)
+    cache.get("a", lambda: 1)
+    cache.get("b", lambda: 2)
+    cache.get("a", lambda: None)
+    cache.get("c", lambda: 3)
+    assert cache.get("a", lambda: None) == 1
+    assert cache.get("b", lambda: "reloaded") == "reloaded"
+    assert cache.stats()["evictions"] == 2
+
+def test_reference_cache_is_dropped_when_counter_version_moves():
+    cache = ReferenceCache()
+    cache.get_many(["key"], lambda keys: {"key": "old"}, version=1)
+    assert cache.get_many(["key"], lambda keys: {"key": "other"}, version=1) == {"key": "old"}
+    assert cache.get_many(["key"], lambda keys: {"key": "new"}, version=2) == {"key": "new"}
+    assert cache.get_many(["key"], lambda keys: {"key": "other"}, version=1) == {"key": "new"}
+    assert cache.get("key", lambda: "other") == "new"
+
+def test_reference_cache_does_not_store_values_loaded_during_invalidation():
+    cache = ReferenceCache()
+
+    def load():
+        cache.invalidate("key")
+        return "stale"
+
+    assert cache.get("key", load) == "stale"
+    assert cache.get("key", lambda: "fresh") == "fresh"
+
+def test_file_invalidation_is_shared_between_caches(tmp_path):
+    path = str(tmp_path / "invalidations.log")
+    first = ReferenceCache(backend=FileInvalidation(path))
+    second = ReferenceCache(backend=FileInvalidation(path))
+    first.get("key", lambda: "old")
+    second.invalidate("key")
+    assert first.get("key", lambda: "new") == "new"
+    assert second.get("key", lambda: "value") == "value"
+
+def test_file_invalidation_is_replaced_when_too_big(tmp_path):
+    path = tmp_path / "invalidations.log"
+    first = ReferenceCache(backend=FileInvalidation(str(path), max_bytes=200))
+    second = ReferenceCache(backend=FileInvalidation(str(path), max_bytes=200))
+    first.get("key", lambda: "old")
+    first.get("other", lambda: "old")
+    for i in range(10):
+        second.invalidate(f"company:{i}")
+    assert path.stat().st_size < 200
+    # The lines about "key" and "other" may have been missed, so everything is dropped.
+    assert first.get("key", lambda: "new") == "new"
+    assert first.get("other", lambda: "new") == "new"
+
+def test_reference_cache_drops_namespace():
+    cache = ReferenceCache()
+    cache.get("company:1", lambda: "old")
+    cache.get("trailer:1", lambda: "old")
+    cache.invalidate("company:*")
+    assert cache.get("company:1", lambda: "new") == "new"
+    assert cache.get("trailer:1", lambda: "new") == "old"
+
+def test_detail_pages_are_served_from_reference_cache(client, login_as, fleet, captured_queries):
+    login_as("dispatcher")
+    url = f"/dispatcher/trailers/{fleet['trailers'][0].id}"
+    client.get(url)
+    captured_queries.clear()
+    response = client.get(url)
+    assert b"WND0001" in response.data
+    assert not any("FROM trailer" in statement for statement, _ in captured_queries)
+
+def test_reference_cache_is_invalidated_by_edits(client, login_as, companies):
+    login_as("planner")
+    url = f"/planner/companies/{companies[0].id}"
+    assert b"Loading Company" in client.get(url).data
+    company = db.session.get(Company, companies[0].id)
+    company.company_name = "Renamed Company"
+    db.session.commit()
+    assert b"Renamed Company" in client.get(url).data
+
+def test_missing_rows_are_not_cached(client, login_as, app):
+    login_as("planner")
+    assert client.get("/planner/companies/999").status_code == 404
+    assert get_reference_cache().stats()["size"] == 0
+
+# DATABASE
+
+def test_sqlite_pragmas_are_applied_on_connect(tmp_path):
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'site.db'}", "SQLITE_BUSY_TIMEOUT": 1000,
+                      "LOG_FOLDER": str(tmp_path)})
+    with app.app_context():
+        report = database_report(app, db.engine)
+        db.engine.dispose()
+    assert report["journal_mode"] == "wal"
+    assert report["synchronous"] == 1
+    assert report["busy_timeout"] == 1000
+    assert report["mmap_size"] == 256 * 1024 * 1024
+
+def test_database_uri_is_read_from_environment(tmp_path, monkeypatch):
+    uri = f"sqlite:///{tmp_path / 'env.db'}"
+    monkeypatch.setenv("DATABASE_URL", uri)
+    app = create_app({"LOG_FOLDER": str(tmp_path)})
+    assert app.config["SQLALCHEMY_DATABASE_URI"] == uri
+    with app.app_context():
+        db.engine.dispose()
+
+def test_pool_and_sqlite_settings_are_read_from_environment(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_POOL_SIZE", "4")
+    monkeypatch.setenv("DATABASE_POOL_PRE_PING", "true")
+    monkeypatch.setenv("SQLITE_BUSY_TIMEOUT", "2000")
+    monkeypatch.setenv("SQLITE_MMAP_SIZE", "")
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'site.db'}", "DATABASE_POOL_SIZE": 3,
+                      "LOG_FOLDER": str(tmp_path)})
+    assert app.config["SQLALCHEMY_ENGINE_OPTIONS"] == {"pool_size": 3, "pool_pre_ping": True}
+    with app.app_context():
+        report = database_report(app, db.engine)
+        db.engine.dispose()
+    assert report["busy_timeout"] == 2000
+    assert report["mmap_size"] == 0
+
+def test_invalid_environment_setting_is_reported(tmp_path, monkeypatch):
+    monkeypatch.setenv("DATABASE_POOL_SIZE", "many")
+    with pytest.raises(ValueError, match="DATABASE_POOL_SIZE"):
+        create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'site.db'}", "LOG_FOLDER": str(tmp_path)})
+
+def test_pool_settings_are_skipped_for_memory_database(app, tmp_path):
+    file_app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'site.db'}",
+                           "DATABASE_POOL_SIZE": 3, "DATABASE_POOL_RECYCLE": 600, "LOG_FOLDER": str(tmp_path)})
+    with file_app.app_context():
+        assert db.engine.pool.size() == 3
+        db.engine.dispose()
+    memory_app = create_app({"SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:", "DATABASE_POOL_SIZE": 3,
+                             "LOG_FOLDER": str(tmp_path)})
+    assert "pool_size" not in memory_app.config["SQLALCHEMY_ENGINE_OPTIONS"]
+
+# LOGGING
+
+@pytest.fixture
+def test_log(app, tmp_path):
+    create_logger(app, tmp_path, "test.log")
+    yield tmp_path / "test.log"
+    close_logger(app, tmp_path, "test.log")
+
+def test_log_file_is_opened_once_per_process(app, tmp_path, test_log):
+    handlers_before = len(app.logger.handlers)
+    create_logger(create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+                              "LOG_FOLDER": app.config["LOG_FOLDER"]}), tmp_path, "test.log")
+    assert len(app.logger.handlers) == handlers_before
+
+def test_close_all_loggers_detaches_log_files(tmp_path):
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:", "LOG_FOLDER": str(tmp_path)})
+    assert slow_query_logger.handlers
+    close_all_loggers()
+    assert not slow_query_logger.handlers
+    assert not any(isinstance(handler, RequestQueueHandler) for handler in app.logger.handlers)
+
+def test_log_records_are_written_as_json(app, tmp_path, test_log):
+    with app.test_request_context("/planner/companies"):
+        try:
+            raise ValueError("broken")
+        except ValueError as e:
+            app.logger.exception("Error during company %s editing: %s", 1, e)
+    close_logger(app, tmp_path, "test.log")
+    [record] = [json.loads(line) for line in (tmp_path / "test.log").read_text().splitlines()]
+    assert record["level"] == "ERROR"
+    assert record["message"] == "Error during company 1 editing: broken"
+    assert record["request"]["path"] == "/planner/companies"
+    assert "ValueError: broken" in record["exception"]
+
+def test_log_is_rotated_by_size_and_time(tmp_path):
+    path = tmp_path / "test.log"
+    handler = SizeAndTimeRotatingFileHandler(str(path), max_bytes=100, interval=60, backup_count=3)
+    record = logging.makeLogRecord({"msg": "x" * 60})
+    handler.emit(record)
+    handler.emit(record)
+    assert (tmp_path / "test.log.1").exists()
+    handler.rollover_at = time.time() - 1
+    handler.emit(logging.makeLogRecord({"msg": "y"}))
+    assert (tmp_path / "test.log.2").exists()
+    assert path.read_text() == "y\n"
+    handler.close()
+
+# INSTRUMENTATION
+
+def test_metrics_count_requests_and_queries(client, login_as, fleet):
+    login_as("planner")
+    client.get("/planner/transportation_orders")
+    client.get("/planner/transportation_orders")
+    metrics = client.get("/metrics").text
+    labels = 'endpoint="planner.transportation_orders",blueprint="planner"'
+    assert f"freighthub_requests_total{{{labels}}} 2" in metrics
+    assert f'freighthub_request_duration_seconds_bucket{{{labels},le="+Inf"}} 2' in metrics
+    [queries] = re.findall(rf"freighthub_sql_queries_total{{{labels}}} (\d+)", metrics)
+    assert int(queries) >= 2
+    assert 'freighthub_cache_hits_total{cache="identity_cache"}' in metrics
+
+def test_server_timing_header(app, client, login_as):
+    login_as("planner")
+    assert "Server-Timing" not in client.get("/planner/companies").headers
+    app.config["SERVER_TIMING"] = True
+    timing = client.get("/planner/companies").headers.get_all("Server-Timing")
+    assert timing[0].startswith("app;dur=")
+    assert timing[1].startswith("db;dur=") and "queries" in timing[1]
+
+def test_repeated_statements_are_flagged_as_n_plus_one(app, client, fleet, caplog):
+    def orders_one_by_one():
+        for order_id in range(10):
+            db.session.get(TransportationOrder, order_id)
+            db.session.expunge_all()
+        return ""
+
+    app.add_url_rule("/orders-one-by-one", "orders_one_by_one", orders_one_by_one)
+    with caplog.at_level(logging.WARNING, logger="app"):
+        client.get("/orders-one-by-one")
+    assert "Possible N+1 query in orders_one_by_one" in caplog.text
+    assert 'freighthub_n_plus_one_total{endpoint="orders_one_by_one",blueprint=""} 1' in client.get("/metrics").text
+
+def test_metrics_are_off_by_default(tmp_path, monkeypatch):
+    monkeypatch.delenv("METRICS_ENABLED", raising=False)
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+                      "LOG_FOLDER": str(tmp_path)})
+    assert app.test_client().get("/metrics").status_code == 404
+
+def test_metrics_require_the_token(tmp_path, monkeypatch):
+    monkeypatch.setenv("METRICS_ENABLED", "true")
+    monkeypatch.setenv("METRICS_TOKEN", "s3cret")
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+                      "LOG_FOLDER": str(tmp_path)})
+    client = app.test_client()
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer wrong"}).status_code == 401
+    response = client.get("/metrics", headers={"Authorization": "Bearer s3cret"})
+    assert response.status_code == 200
+    assert "freighthub_requests_total" in response.text
+
+# SLOW QUERY LOG
+
+def slow_query_records(tmp_path, threshold, query):
+    app = create_app({"TESTING": True, "SQLALCHEMY_DATABASE_URI": "sqlite:///:memory:",
+                      "LOG_FOLDER": str(tmp_path), "SLOW_QUERY_THRESHOLD": threshold})
+    with app.app_context():
+        db.create_all()
+        with app.test_request_context("/planner/companies"):
+            query()
+    close_logger(app, str(tmp_path), "app.log")
+    close_logger(app, str(tmp_path), "slow_queries.log", logger=slow_query_logger)
+    path = tmp_path / "slow_queries.log"
+    # The file is only created when the first record is written.
+    return [json.loads(line) for line in path.read_text().splitlines()] if path.exists() else []
+
+def test_slow_queries_are_logged_with_plan(tmp_path):
+    records = slow_query_records(tmp_path, 0, lambda: Company.query.filter_by(town="Warsaw").all())
+    [record] = [record for record in records if "FROM company" in record["statement"]]
+    assert record["message"].startswith("Slow query")
+    assert record["endpoint"] == "planner.companies"
+    assert "Warsaw" in record["parameters"]
+    assert any("SCAN company" in row for row in record["plan"])
+
+def test_fast_queries_are_not_logged(tmp_path):
+    assert slow_query_records(tmp_path, 10, lambda: Company.query.all()) == []
+
+def test_failed_statements_leave_no_start_times(tmp_path):
+    def failing_query():
+        connection = db.session.connection()
+        with pytest.raises(OperationalError):
+            connection.exec_driver_sql("SELECT * FROM missing_table")
+        connection.exec_driver_sql("SELECT 1")
+        assert not connection.info.get("slow_query_start_times")
+        assert not connection.info.get("query_start_times")
+
+    slow_query_records(tmp_path, 10, failing_query)
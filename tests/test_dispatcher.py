@@ -1,5 +1,21 @@
+import io
+import json
 import pytest
+import threading
+from datetime import date
 from marshmallow import ValidationError
+from sqlalchemy import update
+from app import db
+from app.common import changes
+from app.common.changes import REFERENCE_DATA, bump_change_counters, get_order_changes, last_order_change
+from app.common.choices import trailer_type_choices
+from app.common.asset_status import AssetBusyError
+from app.common.models import AssetStatus, Trailer, TransportationOrder, User
+from app.dispatcher.models import TractorHead
+from app.planner.models import Company
+from app.dispatcher.assignment import NO_CREW, NO_TRAILER, plan_assignments
+from app.dispatcher.availability import get_fleet_availability
+from app.dispatcher.trailer_index import TrailerBuckets, get_trailer_index
 
 # SCHEMAS
 
@@ -63,3 +79,481 @@ def test_trailer_registration_number(tractor_head_schema):
     with pytest.raises(ValidationError) as excinfo:
         tractor_head_schema.load(data)
     assert "registration_number" in excinfo.value.messages
+
+# AVAILABILITY
+
+def test_fleet_availability_excludes_busy_assets(fleet, user):
+    availability = get_fleet_availability("Container", 15000)
+    assert {driver_id for driver_id, _ in availability.drivers} == {user.id, fleet["drivers"][1].id}
+    assert availability.tractor_heads == [(fleet["tractor_heads"][1].id, "MAN WGM12341")]
+    assert availability.trailers == [(fleet["trailers"][1].id, "WND0002")]
+
+def test_fleet_availability_releases_assets_of_completed_orders(fleet):
+    fleet["order"].completed = True
+    db.session.commit()
+    availability = get_fleet_availability("Container", 10000)
+    assert len(availability.drivers) == 3
+    assert len(availability.tractor_heads) == 2
+    assert [label for _, label in availability.trailers] == ["WND0001", "WND0002"]
+
+# BOARD API
+
+def test_board_json_returns_projected_orders(client, login_as, fleet, companies):
+    login_as("dispatcher")
+    response = client.get("/dispatcher/orders/active.json")
+    assert response.status_code == 200
+    assert response.headers["ETag"].startswith('"board-')
+    assert "Last-Modified" in response.headers
+    assert response.json["next"] is None
+    assert response.json["orders"] == [{
+        "id": fleet["order"].id,
+        "planned_delivery_date": "2222-01-01",
+        "trailer_type": "Container",
+        "load_weight": 10000,
+        "loading_company": {"id": companies[0].id, "name": "Loading Company"},
+        "delivery_company": {"id": companies[1].id, "name": "Delivery Company"},
+        "driver": {"id": fleet["drivers"][0].id, "name": "Driver No0"},
+        "tractor_head": {"id": fleet["tractor_heads"][0].id, "brand": "MAN", "registration_number": "WGM12340"},
+        "trailer": {"id": fleet["trailers"][0].id, "type": "Container", "registration_number": "WND0001"},
+        "version": 1
+    }]
+
+def test_board_json_not_modified_without_reading_orders(client, login_as, fleet, captured_queries):
+    login_as("dispatcher")
+    etag = client.get("/dispatcher/orders/active.json").headers["ETag"]
+    captured_queries.clear()
+    response = client.get("/dispatcher/orders/active.json", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert not any("FROM transportation_order" in statement for statement, _ in captured_queries)
+
+def test_board_json_etag_changes_with_orders_and_reference_data(client, login_as, fleet, companies):
+    login_as("dispatcher")
+    first = client.get("/dispatcher/orders/active.json").headers["ETag"]
+    fleet["order"].load_weight = 12000
+    db.session.commit()
+    second = client.get("/dispatcher/orders/active.json", headers={"If-None-Match": first})
+    assert second.status_code == 200
+    assert second.json["orders"][0]["load_weight"] == 12000
+    companies[0].company_name = "Renamed Company"
+    db.session.commit()
+    third = client.get("/dispatcher/orders/active.json", headers={"If-None-Match": second.headers["ETag"]})
+    assert third.status_code == 200
+    assert third.json["orders"][0]["loading_company"]["name"] == "Renamed Company"
+
+def test_board_json_reloads_labels_changed_by_another_process(client, login_as, fleet, companies):
+    login_as("dispatcher")
+    first = client.get("/dispatcher/orders/active.json")
+    # A bulk statement does not invalidate this process's cache, like a change made by another worker.
+    db.session.execute(update(Company).where(Company.id == companies[0].id).values(company_name="Renamed Company"))
+    bump_change_counters(db.session.connection(), REFERENCE_DATA)
+    db.session.commit()
+    second = client.get("/dispatcher/orders/active.json", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert second.json["orders"][0]["loading_company"]["name"] == "Renamed Company"
+
+def test_board_json_etag_depends_on_page(client, login_as, fleet):
+    login_as("dispatcher")
+    etag = client.get("/dispatcher/orders/active.json").headers["ETag"]
+    response = client.get("/dispatcher/orders/active.json?per_page=1", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+
+def test_board_json_if_modified_since(client, login_as, fleet):
+    login_as("dispatcher")
+    last_modified = client.get("/dispatcher/orders/active.json").headers["Last-Modified"]
+    response = client.get("/dispatcher/orders/active.json", headers={"If-Modified-Since": last_modified})
+    assert response.status_code == 304
+
+# ORDER FEED
+
+def test_order_feed_records_order_changes(app, fleet):
+    order = fleet["order"]
+    order.load_weight = 12000
+    db.session.commit()
+    order.completed = True
+    db.session.commit()
+    db.session.delete(order)
+    db.session.commit()
+    changes = [(change.order_id, change.action) for change in get_order_changes(0)]
+    assert changes == [(order.id, "created"), (order.id, "updated"), (order.id, "completed"), (order.id, "deleted")]
+
+def test_order_feed_ignores_unchanged_orders(app, fleet):
+    since = last_order_change()
+    fleet["order"].load_weight = fleet["order"].load_weight
+    fleet["drivers"][1].first_name = "Renamed"
+    db.session.commit()
+    assert get_order_changes(since) == []
+
+def test_order_changes_returns_position_without_since(client, login_as, fleet):
+    login_as("dispatcher")
+    response = client.get("/dispatcher/orders/changes")
+    assert response.json == {"last_seq": last_order_change(), "changes": []}
+
+def test_order_changes_returns_deltas_since_position(client, login_as, fleet):
+    login_as("dispatcher")
+    since = client.get("/dispatcher/orders/changes").json["last_seq"]
+    order_id = fleet["order"].id
+    fleet["order"].load_weight = 12000
+    db.session.commit()
+    fleet["order"].load_weight = 13000
+    db.session.commit()
+    response = client.get(f"/dispatcher/orders/changes?since={since}")
+    changes = response.json["changes"]
+    assert response.json["last_seq"] == since + 2
+    assert [(change["id"], change["action"], change["seq"]) for change in changes] == [(order_id, "updated", since + 2)]
+    assert changes[0]["order"]["load_weight"] == 13000
+
+    fleet["order"].completed = True
+    db.session.commit()
+    changes = client.get(f"/dispatcher/orders/changes?since={since + 2}").json["changes"]
+    assert [(change["action"], change["order"]) for change in changes] == [("completed", None)]
+
+def test_order_changes_times_out_without_changes(client, login_as, fleet):
+    login_as("dispatcher")
+    since = last_order_change()
+    response = client.get(f"/dispatcher/orders/changes?since={since}&wait=0.05")
+    assert response.json == {"last_seq": since, "changes": []}
+
+def test_order_changes_release_the_connection_while_waiting(client, login_as, fleet, monkeypatch):
+    in_transaction = []
+
+    class RecordingCondition(threading.Condition):
+        def wait(self, timeout=None):
+            in_transaction.append(db.session().in_transaction())
+            return super().wait(timeout)
+
+    monkeypatch.setattr(changes, "_order_feed_condition", RecordingCondition())
+    login_as("dispatcher")
+    since = last_order_change()
+    client.get(f"/dispatcher/orders/changes?since={since}&wait=0.05")
+    assert in_transaction and not any(in_transaction)
+
+def test_order_change_stream_sends_changes_after_last_event_id(app, client, login_as, fleet):
+    login_as("dispatcher")
+    app.config["ORDER_FEED_STREAM_DURATION"] = 0.1
+    app.config["ORDER_FEED_MAX_WAIT"] = 0.05
+    fleet["order"].load_weight = 12000
+    db.session.commit()
+    last_seq = last_order_change()
+    response = client.get("/dispatcher/orders/changes/stream", headers={"Last-Event-ID": str(last_seq - 1)})
+    assert response.mimetype == "text/event-stream"
+    body = response.get_data(as_text=True)
+    assert f"id: {last_seq}\nevent: changes\n" in body
+    assert '"load_weight": 12000' in body
+
+# BULK IMPORT
+
+def test_import_trailers_jsonl_rejects_duplicates_and_refreshes_choices(client, login_as, fleet):
+    login_as("dispatcher")
+    assert "Refrigerated" not in trailer_type_choices()
+    lines = [
+        json.dumps({"type": "Refrigerated", "max_load_capacity": 22000, "registration_number": "wnd1001"}),
+        json.dumps({"type": "Refrigerated", "max_load_capacity": 22000, "registration_number": "WND1001"}),
+        json.dumps({"type": "Tipper", "max_load_capacity": 22000, "registration_number": "WND0001"}),
+        "not json"
+    ]
+    response = client.post("/dispatcher/trailers/import",
+                           data={"file": (io.BytesIO("\n".join(lines).encode()), "trailers.jsonl")})
+    assert response.json["imported"] == 1
+    assert [(error["line"], list(error["errors"])) for error in response.json["errors"]] == [
+        (2, ["registration_number"]), (3, ["registration_number"]), (4, ["_row"])
+    ]
+    assert Trailer.query.filter_by(registration_number="WND1001").one().version == 1
+    assert "Refrigerated" in trailer_type_choices()
+
+def test_import_tractor_heads_command(runner, tmp_path):
+    path = tmp_path / "tractor_heads.csv"
+    path.write_text("brand,registration_number\nMAN,wgm00001\nVolvo,WGM0002\n")
+    result = runner.invoke(args=["dispatcher", "import-tractor-heads", str(path), "--chunk-size", "1"])
+    assert "Imported 1 rows, rejected 1." in result.output
+    assert "Line 3" in result.output
+    assert [tractor_head.registration_number for tractor_head in TractorHead.query] == ["WGM00001"]
+
+# ASSIGNMENT PLAN
+
+def test_plan_uses_smallest_sufficient_trailer():
+    orders = [(1, "Container", 10000), (2, "Container", 18000), (3, "Tipper", 5000)]
+    trailers = [(10, "Container", 24000), (11, "Container", 12000), (12, "Container", 20000), (13, "Tipper", 24000)]
+    plan = plan_assignments(orders, [100, 101, 102], [200, 201, 202], trailers)
+    assert plan.assignments == [(1, 100, 200, 11), (2, 101, 201, 12), (3, 102, 202, 13)]
+    assert plan.unassigned == {}
+
+def test_plan_serves_heaviest_loads_first_without_double_booking():
+    # Taken in list order, the light order would get the only trailer the heavy one fits.
+    orders = [(1, "Container", 5000), (2, "Container", 22000), (3, "Container", 23000)]
+    trailers = [(10, "Container", 24000), (11, "Container", 6000)]
+    plan = plan_assignments(orders, [100, 101, 102], [200, 201, 202], trailers)
+    assert plan.assignments == [(1, 100, 200, 11), (3, 101, 201, 10)]
+    assert plan.unassigned == {2: NO_TRAILER}
+    assets = [asset for assignment in plan.assignments for asset in assignment[1:]]
+    assert len(assets) == len(set(assets))
+
+def test_plan_leaves_out_orders_without_crew():
+    orders = [(1, "Tipper", 1000), (2, "Tipper", 2000)]
+    plan = plan_assignments(orders, [100, 101], [200], [(10, "Tipper", 5000), (11, "Tipper", 5000)])
+    assert plan.assignments == [(1, 100, 200, 11)]
+    assert plan.unassigned == {2: NO_CREW}
+
+def test_assignment_plan_endpoint_uses_free_fleet(client, login_as, fleet, user, companies):
+    orders = [
+        TransportationOrder(created_by=user.id, planned_delivery_date=date(2222, 1, 2 + i), trailer_type=trailer_type,
+                            load_weight=load_weight, loading_place=companies[0].id, delivery_place=companies[1].id)
+        for i, (trailer_type, load_weight) in enumerate([("Container", 15000), ("Tipper", 5000), ("Container", 30000)])
+    ]
+    db.session.add_all(orders)
+    db.session.commit()
+    login_as("dispatcher")
+    plan = client.get("/dispatcher/orders/assignment-plan").get_json()
+    assert plan["assignments"] == [{
+        "order": orders[0].id, "driver": plan["assignments"][0]["driver"],
+        "tractor_head": fleet["tractor_heads"][1].id, "trailer": fleet["trailers"][1].id
+    }]
+    assert plan["assignments"][0]["driver"] in {user.id, fleet["drivers"][1].id}
+    assert plan["unassigned"] == [{"order": orders[1].id, "reason": NO_CREW},
+                                  {"order": orders[2].id, "reason": NO_TRAILER}]
+
+    plan = client.get(f"/dispatcher/orders/assignment-plan?order={orders[1].id}").get_json()
+    assert [assignment["trailer"] for assignment in plan["assignments"]] == [fleet["trailers"][2].id]
+    assert plan["unassigned"] == []
+
+# BULK ASSIGNMENT
+
+@pytest.fixture
+def open_orders(fleet, user, companies):
+    orders = [
+        TransportationOrder(created_by=user.id, planned_delivery_date=date(2222, 1, 2), trailer_type=trailer_type,
+                            load_weight=load_weight, loading_place=companies[0].id, delivery_place=companies[1].id)
+        for trailer_type, load_weight in [("Container", 15000), ("Tipper", 5000)]
+    ]
+    db.session.add_all(orders)
+    db.session.commit()
+    return orders
+
+def test_bulk_assignment_applies_batch_in_one_update(client, login_as, fleet, user, open_orders, captured_queries):
+    login_as("dispatcher")
+    since = last_order_change()
+    updated_at = open_orders[0].updated_at
+    captured_queries.clear()
+    response = client.post("/dispatcher/orders/assign", json=[
+        {"order": open_orders[0].id, "driver": fleet["drivers"][1].id, "tractor_head": fleet["tractor_heads"][1].id,
+         "trailer": fleet["trailers"][1].id, "version": 1},
+        {"order": open_orders[1].id, "driver": user.id, "trailer": fleet["trailers"][2].id}
+    ])
+    assert response.status_code == 200
+    assert response.get_json()["orders"] == [{"order": open_orders[0].id, "version": 2},
+                                             {"order": open_orders[1].id, "version": 2}]
+    updates = [statement for statement, _ in captured_queries if statement.startswith("UPDATE transportation_order")]
+    assert len(updates) == 1
+
+    db.session.expire_all()
+    assert (open_orders[0].driver, open_orders[0].tractor_head, open_orders[0].trailer) == (
+        fleet["drivers"][1].id, fleet["tractor_heads"][1].id, fleet["trailers"][1].id)
+    assert (open_orders[1].driver, open_orders[1].tractor_head, open_orders[1].trailer) == (
+        user.id, None, fleet["trailers"][2].id)
+    assert open_orders[0].updated_at > updated_at
+    assert [(change.order_id, change.action) for change in get_order_changes(since)] == [
+        (open_orders[0].id, "updated"), (open_orders[1].id, "updated")]
+    assert get_fleet_availability("Container", 1000).drivers == []
+
+def test_bulk_assignment_rejects_whole_batch_on_conflicts(client, login_as, fleet, open_orders):
+    login_as("dispatcher")
+    since = last_order_change()
+    response = client.post("/dispatcher/orders/assign", json=[
+        {"order": open_orders[0].id, "driver": fleet["drivers"][0].id, "trailer": fleet["trailers"][1].id},
+        {"order": open_orders[1].id, "trailer": fleet["trailers"][1].id, "version": 7},
+        {"order": open_orders[0].id, "tractor_head": 999}
+    ])
+    assert response.status_code == 409
+    errors = response.get_json()["errors"]
+    assert [(error["index"], sorted(error["errors"])) for error in errors] == [
+        (0, ["driver"]), (1, ["trailer", "version"]), (2, ["order", "tractor_head"])]
+    assert f"assigned to order {fleet['order'].id}" in errors[0]["errors"]["driver"][0]
+    assert "already used by assignment 0" in errors[1]["errors"]["trailer"][0]
+    db.session.expire_all()
+    assert all(order.driver is None and order.trailer is None and order.version == 1 for order in open_orders)
+    assert get_order_changes(since) == []
+
+def test_bulk_assignment_checks_trailer_and_releases_assets_of_batch_orders(client, login_as, fleet, open_orders):
+    login_as("dispatcher")
+    response = client.post("/dispatcher/orders/assign", json=[
+        {"order": open_orders[1].id, "trailer": fleet["trailers"][1].id}
+    ])
+    assert response.status_code == 409
+    assert "not Tipper" in response.get_json()["errors"][0]["errors"]["trailer"][0]
+
+    # The order holding the driver gives it up in the same batch.
+    response = client.post("/dispatcher/orders/assign", json=[
+        {"order": fleet["order"].id, "driver": None, "tractor_head": fleet["tractor_heads"][0].id,
+         "trailer": fleet["trailers"][0].id},
+        {"order": open_orders[0].id, "driver": fleet["drivers"][0].id}
+    ])
+    assert response.status_code == 200
+    db.session.expire_all()
+    assert fleet["order"].driver is None
+    assert open_orders[0].driver == fleet["drivers"][0].id
+
+def test_bulk_assignment_rejects_malformed_input(client, login_as, fleet):
+    login_as("dispatcher")
+    assert client.post("/dispatcher/orders/assign", json={"order": 1}).status_code == 400
+    response = client.post("/dispatcher/orders/assign", json=[{"driver": "x"}])
+    assert response.status_code == 400
+    assert sorted(response.get_json()["errors"][0]["errors"]) == ["driver", "order"]
+
+# TRAILER INDEX
+
+def test_trailer_buckets_find_smallest_fitting_trailer():
+    buckets = TrailerBuckets([(1, "Tipper", 20000), (2, "Tipper", 10000), (3, "Tipper", 10000), (4, "Container", 5000)])
+    assert buckets.smallest("Tipper", 10000) == 2
+    assert buckets.take("Tipper", 9000) == 2
+    assert buckets.take("Tipper", 9000) == 3
+    buckets.remove(1, "Tipper", 20000)
+    assert buckets.smallest("Tipper", 1) is None
+    assert buckets.smallest("Container", 5001) is None
+    assert buckets.smallest("Refrigerated", 1) is None
+
+def test_trailer_index_follows_committed_changes(fleet):
+    index = get_trailer_index()
+    assert index.smallest_free_trailer("Container", 15000) == fleet["trailers"][1].id
+    fleet["order"].completed = True
+    db.session.commit()
+    assert index.smallest_free_trailer("Container", 15000) == fleet["trailers"][0].id
+
+    trailer = Trailer(type="Container", max_load_capacity=16000, registration_number="WND0004")
+    db.session.add(trailer)
+    db.session.commit()
+    assert index.smallest_free_trailer("Container", 15000) == trailer.id
+    trailer.max_load_capacity = 30000
+    db.session.commit()
+    assert index.smallest_free_trailer("Container", 25000) == trailer.id
+    assert index.smallest_free_trailer("Container", 15000) == fleet["trailers"][0].id
+    db.session.delete(trailer)
+    db.session.commit()
+    assert index.smallest_free_trailer("Container", 25000) is None
+    assert index.loads == 1
+
+def test_trailer_index_ignores_rolled_back_changes(fleet):
+    index = get_trailer_index()
+    assert index.smallest_free_trailer("Container", 15000) == fleet["trailers"][1].id
+    fleet["order"].trailer = fleet["trailers"][1].id
+    db.session.flush()
+    assert index.smallest_free_trailer("Container", 15000) == fleet["trailers"][0].id
+    db.session.rollback()
+    assert index.smallest_free_trailer("Container", 15000) == fleet["trailers"][1].id
+    assert index.loads == 1
+
+def test_trailer_index_follows_bulk_assignment(client, login_as, fleet, open_orders):
+    index = get_trailer_index()
+    assert index.smallest_free_trailer("Container", 15000) == fleet["trailers"][1].id
+    login_as("dispatcher")
+    response = client.post("/dispatcher/orders/assign", json=[
+        {"order": fleet["order"].id, "driver": fleet["drivers"][0].id, "tractor_head": fleet["tractor_heads"][0].id},
+        {"order": open_orders[0].id, "trailer": fleet["trailers"][1].id},
+    ])
+    assert response.status_code == 200
+    assert index.smallest_free_trailer("Container", 15000) == fleet["trailers"][0].id
+    assert index.smallest_free_trailer("Container", 21000) is None
+    assert index.loads == 1
+
+def test_trailer_index_reloads_after_changes_of_other_processes(fleet):
+    index = get_trailer_index()
+    assert index.smallest_free_trailer("Tipper", 1000) == fleet["trailers"][2].id
+    # A statement of another process, which only bumps the counter.
+    db.session.execute(Trailer.__table__.update().values(type="Container"))
+    bump_change_counters(db.session.connection(), REFERENCE_DATA)
+    db.session.commit()
+    assert index.smallest_free_trailer("Tipper", 1000) is None
+    assert index.loads == 2
+
+# ASSET STATUS
+
+def current_orders():
+    return {(status.kind, status.asset_id): status.current_order for status in AssetStatus.query}
+
+def test_asset_status_follows_order_lifecycle(fleet, user, companies):
+    order = fleet["order"]
+    statuses = current_orders()
+    assert statuses == {
+        ("driver", user.id): None, ("driver", fleet["drivers"][0].id): order.id, ("driver", fleet["drivers"][1].id): None,
+        ("tractor_head", fleet["tractor_heads"][0].id): order.id, ("tractor_head", fleet["tractor_heads"][1].id): None,
+        ("trailer", fleet["trailers"][0].id): order.id, ("trailer", fleet["trailers"][1].id): None,
+        ("trailer", fleet["trailers"][2].id): None
+    }
+    order.driver = fleet["drivers"][1].id
+    order.trailer = None
+    db.session.commit()
+    statuses = current_orders()
+    assert statuses[("driver", fleet["drivers"][0].id)] is None
+    assert statuses[("driver", fleet["drivers"][1].id)] == order.id
+    assert statuses[("trailer", fleet["trailers"][0].id)] is None
+
+    order.completed = True
+    db.session.commit()
+    assert set(current_orders().values()) == {None}
+
+    order.completed = False
+    db.session.commit()
+    db.session.delete(order)
+    db.session.commit()
+    assert set(current_orders().values()) == {None}
+
+def test_asset_status_rows_follow_assets(fleet, user):
+    trailer = fleet["trailers"][2]
+    user = db.session.get(User, user.id)
+    db.session.delete(trailer)
+    user.role = "planner"
+    db.session.commit()
+    statuses = current_orders()
+    assert ("trailer", trailer.id) not in statuses
+    assert ("driver", user.id) not in statuses
+    user.role = "driver"
+    db.session.commit()
+    assert current_orders()[("driver", user.id)] is None
+
+def test_asset_status_prevents_double_assignment(fleet, user, companies):
+    order = TransportationOrder(created_by=user.id, planned_delivery_date=date(2222, 1, 2), trailer_type="Container",
+                                load_weight=1000, loading_place=companies[0].id, delivery_place=companies[1].id,
+                                trailer=fleet["trailers"][0].id)
+    db.session.add(order)
+    with pytest.raises(AssetBusyError) as error:
+        db.session.commit()
+    db.session.rollback()
+    assert (error.value.kind, error.value.asset_id) == ("trailer", fleet["trailers"][0].id)
+    assert TransportationOrder.query.count() == 1
+
+def test_complete_order_with_taken_asset_is_a_conflict(client, login_as, fleet, open_orders):
+    login_as("dispatcher")
+    response = client.post(f"/dispatcher/orders/complete/{open_orders[0].id}", data={
+        "driver": fleet["drivers"][0].id, "tractor_head": 0, "trailer": 0, "version": open_orders[0].version
+    })
+    assert response.status_code == 409
+    db.session.expire_all()
+    assert open_orders[0].driver is None
+    assert current_orders()[("driver", fleet["drivers"][0].id)] == fleet["order"].id
+
+def test_bulk_assignment_updates_asset_status(client, login_as, fleet, open_orders):
+    login_as("dispatcher")
+    response = client.post("/dispatcher/orders/assign", json=[
+        {"order": fleet["order"].id, "driver": fleet["drivers"][1].id},
+        {"order": open_orders[1].id, "driver": fleet["drivers"][0].id, "trailer": fleet["trailers"][2].id}
+    ])
+    assert response.status_code == 200
+    statuses = current_orders()
+    assert statuses[("driver", fleet["drivers"][1].id)] == fleet["order"].id
+    assert statuses[("driver", fleet["drivers"][0].id)] == open_orders[1].id
+    assert statuses[("tractor_head", fleet["tractor_heads"][0].id)] is None
+    assert statuses[("trailer", fleet["trailers"][0].id)] is None
+    assert statuses[("trailer", fleet["trailers"][2].id)] == open_orders[1].id
+
+def test_bulk_assignment_swaps_drivers(client, login_as, fleet, open_orders):
+    open_orders[0].driver = fleet["drivers"][1].id
+    db.session.commit()
+    login_as("dispatcher")
+    response = client.post("/dispatcher/orders/assign", json=[
+        {"order": fleet["order"].id, "driver": fleet["drivers"][1].id, "tractor_head": fleet["tractor_heads"][0].id,
+         "trailer": fleet["trailers"][0].id},
+        {"order": open_orders[0].id, "driver": fleet["drivers"][0].id}
+    ])
+    assert response.status_code == 200
+    db.session.expire_all()
+    assert (fleet["order"].driver, open_orders[0].driver) == (fleet["drivers"][1].id, fleet["drivers"][0].id)
+    assert current_orders()[("driver", fleet["drivers"][0].id)] == open_orders[0].id
@@ -0,0 +1,103 @@
+import pytest
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.common.changes import REFERENCE_DATA, bump_change_counters
+from app.common.models import TransportationOrder
+from app.planner.models import Company
+
+# OPTIMISTIC CONCURRENCY
+
+def test_finish_order_with_current_version(client, login_as, fleet):
+    login_as("driver")
+    order = fleet["order"]
+    response = client.post(f"/driver/finish/{order.id}", data={"version": order.version})
+    assert response.status_code == 302
+    db.session.refresh(order)
+    assert order.completed
+
+def test_finish_order_with_stale_version_conflicts(client, login_as, fleet):
+    login_as("driver")
+    order = fleet["order"]
+    version = order.version
+    order.trailer = fleet["trailers"][1].id
+    db.session.commit()
+    response = client.post(f"/driver/finish/{order.id}", data={"version": version})
+    assert response.status_code == 409
+    assert f'name="version" value="{order.version}"'.encode() in response.data
+    db.session.refresh(order)
+    assert not order.completed
+
+# CURRENT ORDER JSON
+
+def login_driver(client, driver):
+    with client.session_transaction() as session:
+        session["_user_id"] = str(driver.id)
+        session["_fresh"] = True
+
+def test_current_order_json(client, fleet, companies):
+    login_driver(client, fleet["drivers"][0])
+    response = client.get("/driver/current-order.json")
+    assert response.status_code == 200
+    assert response.headers["ETag"]
+    order = response.json["order"]
+    assert order["id"] == fleet["order"].id
+    assert order["planned_delivery_date"] == "2222-01-01"
+    assert order["loading_company"]["id"] == companies[0].id
+    assert order["delivery_company"]["name"] == "Delivery Company"
+    assert order["tractor_head"]["registration_number"] == "WGM12340"
+    assert order["trailer"] == {"id": fleet["trailers"][0].id, "type": "Container", "registration_number": "WND0001"}
+    assert "driver" not in order
+
+def test_current_order_json_without_order(client, login_as):
+    login_as("driver")
+    response = client.get("/driver/current-order.json")
+    assert response.status_code == 200
+    assert response.json == {"order": None}
+
+def test_current_order_json_not_modified(client, fleet, captured_queries):
+    login_driver(client, fleet["drivers"][0])
+    etag = client.get("/driver/current-order.json").headers["ETag"]
+    captured_queries.clear()
+    response = client.get("/driver/current-order.json", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+    assert not any("FROM company" in statement or "FROM trailer" in statement for statement, _ in captured_queries)
+
+def test_current_order_json_etag_changes_with_order_and_reference_data(client, fleet, companies):
+    login_driver(client, fleet["drivers"][0])
+    first = client.get("/driver/current-order.json").headers["ETag"]
+    fleet["order"].load_weight = 12000
+    db.session.commit()
+    second = client.get("/driver/current-order.json", headers={"If-None-Match": first})
+    assert second.status_code == 200
+    assert second.json["order"]["load_weight"] == 12000
+    companies[0].company_name = "Renamed Company"
+    db.session.commit()
+    third = client.get("/driver/current-order.json", headers={"If-None-Match": second.headers["ETag"]})
+    assert third.status_code == 200
+    assert third.json["order"]["loading_company"]["name"] == "Renamed Company"
+    fleet["order"].completed = True
+    db.session.commit()
+    fourth = client.get("/driver/current-order.json", headers={"If-None-Match": third.headers["ETag"]})
+    assert fourth.json == {"order": None}
+
+def test_current_order_json_reloads_labels_changed_by_another_process(client, fleet, companies):
+    login_driver(client, fleet["drivers"][0])
+    first = client.get("/driver/current-order.json")
+    # A bulk statement does not invalidate this process's cache, like a change made by another worker.
+    db.session.execute(update(Company).where(Company.id == companies[0].id).values(phone_number="987654321"))
+    bump_change_counters(db.session.connection(), REFERENCE_DATA)
+    db.session.commit()
+    second = client.get("/driver/current-order.json", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert second.json["order"]["loading_company"]["phone_number"] == "987654321"
+
+def test_driver_has_at_most_one_active_order(fleet):
+    order = fleet["order"]
+    db.session.add(TransportationOrder(created_by=order.created_by, planned_delivery_date=order.planned_delivery_date,
+                                       trailer_type="Tipper", load_weight=1000, loading_place=order.loading_place,
+                                       delivery_place=order.delivery_place, driver=order.driver))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
@@ -1,5 +1,14 @@
+import csv
+import gzip
+import io
 import pytest
+from datetime import date
 from marshmallow import ValidationError
+from app import db
+from app.common.changes import get_order_changes, last_order_change
+from app.common.models import TransportationOrder
+from app.planner.models import Company
+from app.planner.search import search_companies
 
 # SCHEMAS
 
@@ -41,3 +50,272 @@ def test_phone_number(company_schema):
     with pytest.raises(ValidationError) as excinfo:
         company_schema.load(data)
     assert "phone_number" in excinfo.value.messages
+
+# ARCHIVE FILTERS
+
+@pytest.fixture
+def archived_orders(fleet, user, companies):
+    fleet["order"].completed = True
+    db.session.add(TransportationOrder(
+        created_by=user.id, planned_delivery_date=date(2223, 6, 1), trailer_type="Tipper", load_weight=5000,
+        loading_place=companies[1].id, delivery_place=companies[0].id, completed=True
+    ))
+    db.session.commit()
+
+def test_archived_orders_without_filters(client, login_as, archived_orders):
+    login_as("planner")
+    response = client.get("/planner/transportation_orders/archived")
+    assert b"Container 10.0t" in response.data
+    assert b"Tipper 5.0t" in response.data
+
+@pytest.mark.parametrize("query", [
+    "trailer_type=Tipper",
+    "min_weight=1000&max_weight=6000",
+    "date_from=2223-01-01",
+    "date_to=2223-12-31&date_from=2223-06-01",
+])
+def test_archived_orders_filters(client, login_as, archived_orders, query):
+    login_as("planner")
+    response = client.get(f"/planner/transportation_orders/archived?{query}")
+    assert b"Tipper 5.0t" in response.data
+    assert b"Container 10.0t" not in response.data
+
+def test_archived_orders_filter_by_company_and_driver(client, login_as, archived_orders, fleet, companies):
+    login_as("planner")
+    response = client.get(f"/planner/transportation_orders/archived?loading_place={companies[0].id}"
+                          f"&driver={fleet['drivers'][0].id}")
+    assert b"Container 10.0t" in response.data
+    assert b"Tipper 5.0t" not in response.data
+
+def test_archived_orders_invalid_filters(client, login_as, archived_orders):
+    login_as("planner")
+    response = client.get("/planner/transportation_orders/archived?min_weight=6000&max_weight=1000")
+    assert response.status_code == 200
+    assert b"The minimal weight must not be greater than the maximal weight." in response.data
+
+# COMPANY SEARCH
+
+def test_search_companies_by_prefix(companies):
+    assert [id for id, _ in search_companies("Deliv")] == [companies[1].id]
+    assert [id for id, _ in search_companies("warsaw")] == [companies[0].id]
+    assert [id for id, _ in search_companies("30-0")] == [companies[1].id]
+    assert {id for id, _ in search_companies("Company")} == {companies[0].id, companies[1].id}
+    assert search_companies("***") == []
+
+def test_search_ranks_company_name_first(companies):
+    db.session.add(Company(company_name="Krakow Foods", country="Poland", town="Gdansk", postal_code="80-001",
+                           street="Krakowska", street_number=3, phone_number="123456789"))
+    db.session.commit()
+    results = search_companies("krak")
+    assert results[0][1] == "Krakow Foods, 80-001 Gdansk, Krakowska"
+    assert len(results) == 2
+
+def test_search_index_follows_company_changes(companies):
+    companies[0].company_name = "Renamed Company"
+    db.session.delete(companies[1])
+    db.session.commit()
+    assert search_companies("Loading") == []
+    assert search_companies("Delivery") == []
+    assert [id for id, _ in search_companies("Renamed")] == [companies[0].id]
+
+def test_company_search_endpoint(client, login_as, companies):
+    login_as("planner")
+    response = client.get("/planner/companies/search?q=load")
+    assert response.status_code == 200
+    assert response.json == [{"id": companies[0].id, "label": "Loading Company, 00-001 Warsaw, First Street"}]
+
+# FORMS
+
+def test_submit_transportation_order_form(client, login_as, companies, fleet):
+    login_as("planner")
+    response = client.post("/planner/transportation_orders/new", data={
+        "planned_delivery_date": "2222-02-02",
+        "trailer_type": "Tipper",
+        "load_weight": 12000,
+        "loading_place": companies[1].id,
+        "delivery_place": companies[0].id
+    })
+    assert response.status_code == 302
+    order = TransportationOrder.query.filter_by(trailer_type="Tipper").one()
+    assert order.loading_place == companies[1].id
+    assert order.delivery_place == companies[0].id
+
+def test_edit_transportation_order_form_shows_selected_companies(client, login_as, fleet):
+    login_as("planner")
+    response = client.get(f"/planner/transportation_orders/edit/{fleet['order'].id}")
+    assert b'value="Loading Company, 00-001 Warsaw, First Street"' in response.data
+    assert b'value="Delivery Company, 30-001 Krakow, Second Street"' in response.data
+
+@pytest.mark.parametrize("url", ["/planner/transportation_orders/new", "/planner/transportation_orders/edit/{id}"])
+def test_transportation_order_form_renders_company_fields_once(client, login_as, fleet, url):
+    login_as("planner")
+    response = client.get(url.format(id=fleet["order"].id))
+    for name in ("csrf_token", "loading_place", "delivery_place", "version"):
+        assert response.text.count(f'name="{name}"') == 1
+
+# OPTIMISTIC CONCURRENCY
+
+def edit_order_data(order, **changes):
+    return {
+        "planned_delivery_date": str(order.planned_delivery_date),
+        "trailer_type": order.trailer_type,
+        "load_weight": order.load_weight,
+        "loading_place": order.loading_place,
+        "delivery_place": order.delivery_place,
+        "version": order.version,
+        **changes
+    }
+
+def test_edit_transportation_order_increments_version(client, login_as, fleet):
+    login_as("planner")
+    order = fleet["order"]
+    assert order.version == 1
+    created_at = order.updated_at
+    response = client.post(f"/planner/transportation_orders/edit/{order.id}",
+                           data=edit_order_data(order, load_weight=12000))
+    assert response.status_code == 302
+    db.session.refresh(order)
+    assert (order.load_weight, order.version) == (12000, 2)
+    assert order.updated_at >= created_at
+
+def test_edit_transportation_order_with_stale_version_conflicts(client, login_as, fleet):
+    login_as("planner")
+    order = fleet["order"]
+    stale = edit_order_data(order, load_weight=12000)
+    order.load_weight = 11000
+    db.session.commit()
+    response = client.post(f"/planner/transportation_orders/edit/{order.id}", data=stale)
+    assert response.status_code == 409
+    assert b'name="version" type="hidden" value="2"' in response.data
+    db.session.refresh(order)
+    assert (order.load_weight, order.version) == (11000, 2)
+
+def test_edit_company_with_stale_version_conflicts(client, login_as, companies):
+    login_as("planner")
+    company = companies[0]
+    response = client.post(f"/planner/companies/edit/{company.id}", data={
+        "company_name": "Renamed Company", "country": company.country, "town": company.town,
+        "postal_code": company.postal_code, "street": company.street, "street_number": company.street_number,
+        "phone_number": company.phone_number, "version": company.version - 1
+    })
+    assert response.status_code == 409
+    db.session.refresh(company)
+    assert company.company_name == "Loading Company"
+
+# BULK IMPORT
+
+def test_import_companies_csv_reports_invalid_rows(client, login_as):
+    login_as("planner")
+    data = (
+        "company_name,country,town,postal_code,street,street_number,phone_number\n"
+        "First,Poland,Warsaw,00-001,Street,1,123456789\n"
+        "Second,Poland,Krakow,30-001,Street,two,123456789\n"
+        "Third,Poland,Gdansk,80-001,Street,3,123456789\n"
+    )
+    response = client.post("/planner/companies/import", data={"file": (io.BytesIO(data.encode()), "companies.csv")})
+    assert response.status_code == 200
+    companies = Company.query.order_by(Company.id).all()
+    assert response.json == {
+        "imported": 2, "ids": [company.id for company in companies], "failed": 1,
+        "errors": [{"line": 3, "errors": {"street_number": ["Not a valid integer."]}}]
+    }
+    assert [company.company_name for company in companies] == ["First", "Third"]
+    assert {company.version for company in Company.query} == {1}
+
+def test_import_companies_rejects_unknown_format(client, login_as):
+    login_as("planner")
+    response = client.post("/planner/companies/import", data={"file": (io.BytesIO(b""), "companies.xlsx")})
+    assert response.status_code == 400
+
+def manifest_row(companies, **changes):
+    return {"planned_delivery_date": "2222-03-03", "trailer_type": "Container", "load_weight": 10000,
+            "loading_place": companies[0].id, "delivery_place": companies[1].id, **changes}
+
+def test_import_transportation_orders_json(client, login_as, companies):
+    planner = login_as("planner")
+    since = last_order_change()
+    response = client.post("/planner/transportation_orders/import", json=[
+        manifest_row(companies),
+        manifest_row(companies, delivery_place=999),
+        manifest_row(companies, load_weight=30000),
+        manifest_row(companies, driver=planner.id),
+        manifest_row(companies, created_by=999, creation_date="2000-01-01")
+    ])
+    assert response.status_code == 200
+    assert response.json["imported"] == 2
+    assert [(error["line"], list(error["errors"])) for error in response.json["errors"]] == [
+        (2, ["delivery_place"]), (3, ["load_weight"]), (4, ["driver"])
+    ]
+    orders = TransportationOrder.query.filter(TransportationOrder.id.in_(response.json["ids"])).all()
+    assert {(order.created_by, order.creation_date, order.completed, order.version) for order in orders} == {
+        (planner.id, date.today(), False, 1)
+    }
+    assert [(change.order_id, change.action) for change in get_order_changes(since)] == [
+        (id, "created") for id in response.json["ids"]
+    ]
+
+def test_import_transportation_orders_csv_in_chunks(app, client, login_as, companies):
+    login_as("planner")
+    app.config["IMPORT_CHUNK_SIZE"] = 2
+    rows = [manifest_row(companies, load_weight=1000 + i) for i in range(5)]
+    data = "\n".join([",".join(rows[0])] + [",".join(str(value) for value in row.values()) for row in rows])
+    response = client.post("/planner/transportation_orders/import",
+                           data={"file": (io.BytesIO(data.encode()), "manifest.csv")})
+    assert (response.json["imported"], response.json["failed"]) == (5, 0)
+    assert sorted(order.load_weight for order in TransportationOrder.query) == [1000, 1001, 1002, 1003, 1004]
+
+def test_import_transportation_orders_requires_array(client, login_as):
+    login_as("planner")
+    response = client.post("/planner/transportation_orders/import", json={"orders": []})
+    assert response.status_code == 400
+
+# ARCHIVE EXPORT
+
+@pytest.fixture
+def archive(fleet, companies):
+    orders = [fleet["order"]] + [
+        TransportationOrder(created_by=fleet["order"].created_by, planned_delivery_date=date(2222, 1, 2 + i),
+                            trailer_type="Tipper", load_weight=5000 + i, loading_place=companies[1].id,
+                            delivery_place=companies[0].id, completed=True)
+        for i in range(3)
+    ]
+    fleet["order"].completed = True
+    db.session.add_all(orders)
+    db.session.commit()
+    return orders
+
+def test_export_archive_csv_joins_names(client, login_as, archive, captured_queries):
+    login_as("planner")
+    captured_queries.clear()
+    response = client.get("/planner/transportation_orders/archived/export?trailer_type=Container")
+    order_queries = [statement for statement, _ in captured_queries if "transportation_order" in statement]
+    assert len(order_queries) == 1
+    assert response.mimetype == "text/csv"
+    assert response.headers["Content-Disposition"] == 'attachment; filename="archived_orders.csv"'
+    rows = list(csv.reader(io.StringIO(response.get_data(as_text=True))))
+    assert rows[0][:3] == ["id", "creation_date", "planned_delivery_date"]
+    assert rows[1:] == [[
+        str(archive[0].id), str(date.today()), "2222-01-01", "Container", "10000",
+        "Loading Company", "Warsaw", "Delivery Company", "Krakow", "Driver No0", "WGM12340", "WND0001"
+    ]]
+
+def test_export_archive_gzip(client, login_as, archive):
+    login_as("planner")
+    response = client.get("/planner/transportation_orders/archived/export?gzip=1")
+    assert response.mimetype == "application/gzip"
+    rows = list(csv.reader(io.StringIO(gzip.decompress(response.data).decode("utf-8"))))
+    assert [int(row[0]) for row in rows[1:]] == [order.id for order in archive]
+    assert rows[2][9:] == ["", "", ""]
+
+def test_export_archive_rejects_invalid_filters(client, login_as, archive):
+    login_as("planner")
+    response = client.get("/planner/transportation_orders/archived/export?min_weight=-1")
+    assert response.status_code == 400
+
+def test_export_archive_command(runner, archive, tmp_path):
+    path = tmp_path / "archive.csv.gz"
+    result = runner.invoke(args=["planner", "export-archive", "--gzip", "--output", str(path),
+                                 "--filter", "trailer_type=Tipper", "--batch-size", "2"])
+    assert result.exit_code == 0, result.output
+    rows = list(csv.reader(io.StringIO(gzip.decompress(path.read_bytes()).decode("utf-8"))))
+    assert [row[4] for row in rows[1:]] == ["5000", "5001", "5002"]
@@ -1,5 +1,9 @@
+import re
 import pytest
 from marshmallow import ValidationError
+from app import db
+from app.common.models import User
+from app.user.passwords import hash_password, check_password, hash_log_rounds
 
 #PAGES
 
@@ -124,3 +128,69 @@ def test_invalid_role(user_schema):
     with pytest.raises(ValidationError) as excinfo:
         user_schema.load(data)
     assert "role" in excinfo.value.messages
+
+# PASSWORDS
+
+def login(app, client, email, password):
+    app.config["WTF_CSRF_ENABLED"] = False
+    return client.post("/user/login", data={"email": email, "password": password})
+
+def test_login_rehashes_password_with_changed_cost(app, client, user):
+    app.config["BCRYPT_LOG_ROUNDS"] = 5
+    response = login(app, client, user.email, "test_password")
+    assert response.status_code == 302
+    password_hash = db.session.get(User, user.id).password_hash
+    assert hash_log_rounds(password_hash) == 5
+    assert check_password(password_hash, "test_password")
+
+def test_login_keeps_hash_with_current_cost(app, client, user):
+    password_hash = user.password_hash
+    assert login(app, client, user.email, "test_password").status_code == 302
+    assert db.session.get(User, user.id).password_hash == password_hash
+
+def test_login_rejects_wrong_password_without_rehashing(app, client, user):
+    app.config["BCRYPT_LOG_ROUNDS"] = 5
+    password_hash = user.password_hash
+    assert login(app, client, user.email, "wrong_password").status_code == 200
+    assert db.session.get(User, user.id).password_hash == password_hash
+
+@pytest.mark.parametrize("workers", [0, 2])
+def test_passwords_are_hashed_with_and_without_pool(app, workers):
+    app.config["PASSWORD_HASHING_WORKERS"] = workers
+    password_hash = hash_password("test_password")
+    assert hash_log_rounds(password_hash) == 4
+    assert check_password(password_hash, "test_password")
+    assert not check_password(password_hash, "wrong_password")
+
+# IDENTITY CACHE
+
+def get_in_new_context(app, client, url):
+    # Requests made inside the fixture's app context share flask.g, where
+    # Flask-Login keeps the loaded user; real requests each get their own.
+    with app.app_context():
+        return client.get(url)
+
+def test_authenticated_requests_do_not_load_user(app, client, login_as, captured_queries):
+    login_as("planner")
+    get_in_new_context(app, client, "/planner/companies")
+    captured_queries.clear()
+    response = get_in_new_context(app, client, "/planner/companies")
+    assert response.status_code == 200
+    assert not any(re.search(r"\bFROM user\b", statement) for statement, _ in captured_queries)
+
+def test_editing_user_data_refreshes_identity(app, client, login_as):
+    user = login_as("planner")
+    assert get_in_new_context(app, client, "/planner/companies").status_code == 200
+    with app.app_context():
+        response = client.post(f"/user/change_data/{user.id}", data={
+            "username": user.username,
+            "first_name": user.first_name,
+            "last_name": user.last_name,
+            "phone_number": user.phone_number,
+            "email": user.email,
+            "password": "new_password",
+            "role": "dispatcher"
+        })
+    assert response.status_code == 302
+    assert get_in_new_context(app, client, "/planner/companies").status_code == 302
+    assert get_in_new_context(app, client, "/dispatcher/tractor_heads").status_code == 200